@@ -1,6 +1,5 @@
 import asyncio
 import base64
-import io
 import json
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
@@ -8,12 +7,19 @@ from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any
 import pandas as pd
-import openpyxl
-from pypdf import PdfReader
 from bs4 import BeautifulSoup
 
 # Importa os casos de uso da sua aplicação, que contêm a lógica de negócio
 from app import use_cases
+from app.bula_extractor import extract_bula_text_async
+from app.concurrency import run_bounded_streams, tag_sse_event
+from app.excel_export import XLSX_MEDIA_TYPE, build_filtered_workbook, build_updated_workbook, iter_file_chunks, update_workbook_in_place
+from app.job_engine import get_job_engine
+from app.job_routes import jobs_router
+from app.metrics import emits_metrics_summary
+from app.metrics_routes import metrics_router
+from app.sku_index import SkuIndex, normalize_sku
+from config import settings
 
 app = FastAPI(
     title="Gemini Application API",
@@ -30,6 +36,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.include_router(jobs_router)
+app.include_router(metrics_router)
 
 # --- Modelos Pydantic (sem alterações) ---
 class ApprovedItem(BaseModel):
@@ -48,65 +56,52 @@ class OptimizationRequest(BaseModel):
     product_name: str
     product_info: Dict[str, Any]
 
-# --- Endpoints da API ---
+# --- Geradores de eventos ---
 
-@app.post("/process-for-review", tags=["Processador de Planilha com Otimização de IA"])
-async def process_for_review(
-    spreadsheet: UploadFile = File(...),
-    bulas: List[UploadFile] = File(...),
-    skus_json: str = Form(...)
-):
+@emits_metrics_summary
+async def review_event_stream(spreadsheet_bytes: bytes, bulas_data: List[tuple], sku_list: List[int]):
     """
-    Recebe uma planilha e múltiplos arquivos de bula para processamento em lote.
-    Este endpoint gera e OTIMIZA o conteúdo usando o SeoOptimizerAgent.
+    Gerador de eventos SSE do processamento para revisão. É usado tanto pelo
+    endpoint de streaming direto quanto pelos jobs em segundo plano.
     """
-    try:
-        spreadsheet_bytes = await spreadsheet.read()
-        bulas_data = [(bula.filename, await bula.read()) for bula in bulas]
-        sku_list = [int(s) for s in json.loads(skus_json)]
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Erro ao ler os arquivos: {e}")
-
-    async def event_stream():
-        async def send_event(event_type: str, data: dict):
-            return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+    async def send_event(event_type: str, data: dict):
+        return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
 
-        try:
-            yield await send_event("log", {"message": "Lendo o arquivo da planilha...", "type": "info"})
-            df = pd.read_excel(io.BytesIO(spreadsheet_bytes))
-            yield await send_event("log", {"message": "Planilha carregada com sucesso.", "type": "success"})
+    try:
+        COLUNA_ID_SKU = "_IDSKU (Não alterável)"
+        COLUNA_NOME_PRODUTO = "_NomeProduto (Obrigatório)"
+        COLUNA_PALAVRAS_CHAVE = "_PalavrasChave"
 
-            if len(sku_list) != len(bulas_data):
-                raise ValueError("A quantidade de SKUs não corresponde à de bulas.")
+        yield await send_event("log", {"message": "Lendo o arquivo da planilha...", "type": "info"})
+        # Índice SKU -> linha montado em uma única passada: cada SKU é localizado em O(1).
+        sku_index = await asyncio.to_thread(SkuIndex.from_excel_bytes, spreadsheet_bytes, COLUNA_ID_SKU, [COLUNA_NOME_PRODUTO, COLUNA_PALAVRAS_CHAVE])
+        yield await send_event("log", {"message": "Planilha carregada com sucesso.", "type": "success"})
 
-            total_bulas = len(bulas_data)
-            yield await send_event("log", {"message": f"Iniciando processamento e otimização de {total_bulas} SKUs...", "type": "info"})
+        if len(sku_list) != len(bulas_data):
+            raise ValueError("A quantidade de SKUs não corresponde à de bulas.")
 
-            COLUNA_ID_SKU = "_IDSKU (Não alterável)"
-            COLUNA_NOME_PRODUTO = "_NomeProduto (Obrigatório)"
-            COLUNA_PALAVRAS_CHAVE = "_PalavrasChave"
+        total_bulas = len(bulas_data)
+        yield await send_event("log", {"message": f"Iniciando processamento e otimização de {total_bulas} SKUs ({settings.MAX_CONCURRENT_SKUS} em paralelo)...", "type": "info"})
 
-            for i, ((bula_filename, bula_bytes), sku) in enumerate(zip(bulas_data, sku_list)):
+        def make_sku_stream(i: int, bula_bytes: bytes, sku: int):
+            async def sku_stream():
                 progress = f"({i+1}/{total_bulas})"
                 log_prefix = f"<b>[SKU: {sku}]</b> {progress}"
 
-                linha_produto = df[df[COLUNA_ID_SKU] == sku]
-                if linha_produto.empty:
+                linha_produto = sku_index.get(sku)
+                if linha_produto is None:
                     yield await send_event("log", {"message": f"{log_prefix} Não encontrado. Pulando.", "type": "warning"})
-                    continue
+                    return
 
-                nome_produto = linha_produto.iloc[0][COLUNA_NOME_PRODUTO]
-                palavras_chave = ""
-                if COLUNA_PALAVRAS_CHAVE in linha_produto.columns:
-                    palavras_chave = linha_produto.iloc[0][COLUNA_PALAVRAS_CHAVE]
-                if pd.isna(palavras_chave) or not palavras_chave:
+                nome_produto = linha_produto.fields.get(COLUNA_NOME_PRODUTO)
+                palavras_chave = linha_produto.fields.get(COLUNA_PALAVRAS_CHAVE)
+                if not palavras_chave:
                     palavras_chave = "bula, para que serve, como usar"
 
                 yield await send_event("log", {"message": f"{log_prefix} Processando '{nome_produto}'...", "type": "info"})
 
                 try:
-                    reader = PdfReader(io.BytesIO(bula_bytes))
-                    texto_da_bula = "".join(page.extract_text() + "\n" for page in reader.pages)
+                    texto_da_bula = await extract_bula_text_async(bula_bytes)
 
                     if not texto_da_bula.strip():
                         raise ValueError("Texto do PDF está vazio.")
@@ -121,7 +116,8 @@ async def process_for_review(
                     optimization_generator = use_cases.run_seo_pipeline_stream(
                         product_type="medicine",
                         product_name=nome_produto,
-                        product_info=product_info_simulado
+                        product_info=product_info_simulado,
+                        speculative_candidates=settings.SPECULATIVE_CANDIDATES,
                     )
 
                     final_content_data = None
@@ -154,62 +150,122 @@ async def process_for_review(
                 except Exception as e:
                     yield await send_event("log", {"message": f"{log_prefix} ERRO: {e}", "type": "error"})
 
-                await asyncio.sleep(0.5)
+            # Marca cada evento com o SKU, pois os fluxos de vários SKUs são intercalados.
+            async def tagged_sku_stream():
+                async for event_chunk in sku_stream():
+                    yield tag_sse_event(event_chunk, sku=sku)
+
+            return tagged_sku_stream
 
-        except Exception as e:
-            yield await send_event("error", {"message": f"Erro crítico no processamento: {str(e)}", "type": "error"})
+        stream_factories = (
+            make_sku_stream(i, bula_bytes, sku)
+            for i, ((_, bula_bytes), sku) in enumerate(zip(bulas_data, sku_list))
+        )
+        async for event_chunk in run_bounded_streams(stream_factories, settings.MAX_CONCURRENT_SKUS):
+            yield event_chunk
 
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+    except Exception as e:
+        yield await send_event("error", {"message": f"Erro crítico no processamento: {str(e)}", "type": "error"})
+
+
+# --- Endpoints da API ---
+
+@app.post("/process-for-review", tags=["Processador de Planilha com Otimização de IA"])
+async def process_for_review(
+    spreadsheet: UploadFile = File(...),
+    bulas: List[UploadFile] = File(...),
+    skus_json: str = Form(...)
+):
+    """
+    Recebe uma planilha e múltiplos arquivos de bula para processamento em lote.
+    Este endpoint gera e OTIMIZA o conteúdo usando o SeoOptimizerAgent.
+    """
+    try:
+        spreadsheet_bytes = await spreadsheet.read()
+        bulas_data = [(bula.filename, await bula.read()) for bula in bulas]
+        sku_list = [int(s) for s in json.loads(skus_json)]
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao ler os arquivos: {e}")
+
+    return StreamingResponse(review_event_stream(spreadsheet_bytes, bulas_data, sku_list), media_type="text/event-stream")
+
+@app.post("/jobs/process-for-review", tags=["Processador de Planilha com Otimização de IA"])
+async def submit_process_for_review_job(
+    spreadsheet: UploadFile = File(...),
+    bulas: List[UploadFile] = File(...),
+    skus_json: str = Form(...)
+):
+    """
+    Igual a /process-for-review, mas executado em segundo plano: devolve o id do job,
+    cujos eventos podem ser acompanhados (e retomados) em /jobs/{job_id}/events.
+    """
+    try:
+        spreadsheet_bytes = await spreadsheet.read()
+        bulas_data = [(bula.filename, await bula.read()) for bula in bulas]
+        sku_list = [int(s) for s in json.loads(skus_json)]
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao ler os arquivos: {e}")
+
+    job_id = get_job_engine().submit("process-for-review", lambda: review_event_stream(spreadsheet_bytes, bulas_data, sku_list))
+    return {"job_id": job_id, "status": "queued"}
 
 @app.post("/finalize-spreadsheet", tags=["Processador de Planilha com Otimização de IA"])
 async def finalize_spreadsheet(
     spreadsheet: UploadFile = File(...),
-    approved_data_json: str = Form(...)
+    approved_data_json: str = Form(...),
+    output_format: str = Form("json")
 ):
     """
     Recebe a planilha original e os dados aprovados para montar e retornar o arquivo Excel final.
+
+    Com `output_format="binary"` o arquivo é gerado em streaming (leitura read_only
+    e escrita write_only, apenas com a aba ativa e sem a formatação) e devolvido como
+    download em blocos. O padrão `"json"` atualiza a planilha completa no lugar e
+    mantém o envelope com o arquivo em base64. Outros valores são rejeitados (400).
     """
+    if output_format not in ("json", "binary"):
+        raise HTTPException(status_code=400, detail=f"output_format inválido: '{output_format}'. Use 'json' ou 'binary'.")
     try:
         spreadsheet_bytes = await spreadsheet.read()
         approved_data = json.loads(approved_data_json)
 
-        df_for_lookup = pd.read_excel(io.BytesIO(spreadsheet_bytes))
-        workbook = openpyxl.load_workbook(io.BytesIO(spreadsheet_bytes))
-        sheet = workbook.active
-
         COLUNA_ID_SKU = "_IDSKU (Não alterável)"
         COLUNA_V_HTML = "_DescricaoProduto"
         COLUNA_AD_TITULO = "_TituloSite"
         COLUNA_AE_META_DESC = "_DescricaoMetaTag"
 
-        header = [cell.value for cell in sheet[1]]
+        updates = {
+            normalize_sku(item['sku']): {
+                COLUNA_V_HTML: item['html_content'],
+                COLUNA_AD_TITULO: item['seo_title'],
+                COLUNA_AE_META_DESC: item['meta_description'],
+            }
+            for item in approved_data
+        }
+        # O download binário é gerado em streaming; o envelope JSON atualiza a planilha no
+        # lugar, preservando as outras abas e a formatação (como antes do streaming).
+        build_workbook = build_updated_workbook if output_format == "binary" else update_workbook_in_place
         try:
-            sku_col_idx = header.index(COLUNA_ID_SKU) + 1
-            html_col_idx = header.index(COLUNA_V_HTML) + 1
-            title_col_idx = header.index(COLUNA_AD_TITULO) + 1
-            meta_col_idx = header.index(COLUNA_AE_META_DESC) + 1
+            output_file = await asyncio.to_thread(build_workbook, spreadsheet_bytes, updates, COLUNA_ID_SKU)
         except ValueError as e:
             raise HTTPException(status_code=400, detail=f"Erro Crítico: A coluna obrigatória '{e.args[0]}' não foi encontrada na planilha.")
 
-        for item in approved_data:
-            sku = item['sku']
-            index_linha_pd = df_for_lookup.index[df_for_lookup[COLUNA_ID_SKU] == sku].tolist()
-
-            if index_linha_pd:
-                excel_row_num = index_linha_pd[0] + 2
-                sheet.cell(row=excel_row_num, column=html_col_idx).value = item['html_content']
-                sheet.cell(row=excel_row_num, column=title_col_idx).value = item['seo_title']
-                sheet.cell(row=excel_row_num, column=meta_col_idx).value = item['meta_description']
-
-        output_buffer = io.BytesIO()
-        workbook.save(output_buffer)
-        output_buffer.seek(0)
-        excel_base64 = base64.b64encode(output_buffer.read()).decode('utf-8')
+        filename = f"planilha_final_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        if output_format == "binary":
+            return StreamingResponse(
+                iter_file_chunks(output_file),
+                media_type=XLSX_MEDIA_TYPE,
+                headers={"Content-Disposition": f"attachment; filename={filename}"}
+            )
 
+        with output_file:
+            excel_base64 = base64.b64encode(output_file.read()).decode('utf-8')
         return JSONResponse(content={
-            "filename": f"planilha_final_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+            "filename": filename,
             "file_data": excel_base64
         })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao finalizar a planilha: {str(e)}")
 
@@ -238,19 +294,13 @@ async def finalize_disapproved_spreadsheet(
     """
     try:
         spreadsheet_bytes = await spreadsheet.read()
-        df_original = pd.read_excel(io.BytesIO(spreadsheet_bytes))
 
         disapproved_data = json.loads(disapproved_data_json)
-        disapproved_skus = [item['sku'] for item in disapproved_data]
-        
-        df_disapproved = df_original[df_original['_IDSKU (Não alterável)'].isin(disapproved_skus)].copy()
-
-        output_buffer = io.BytesIO()
-        with pd.ExcelWriter(output_buffer, engine='openpyxl') as writer:
-            df_disapproved.to_excel(writer, index=False, sheet_name='Reprovados')
-        
-        output_buffer.seek(0)
-        excel_base64 = base64.b64encode(output_buffer.read()).decode('utf-8')
+        disapproved_skus = [normalize_sku(item['sku']) for item in disapproved_data]
+
+        output_file = await asyncio.to_thread(build_filtered_workbook, spreadsheet_bytes, disapproved_skus, '_IDSKU (Não alterável)', 'Reprovados')
+        with output_file:
+            excel_base64 = base64.b64encode(output_file.read()).decode('utf-8')
 
         return JSONResponse(content={
             "filename": f"planilha_reprovados_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
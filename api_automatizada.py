@@ -3,6 +3,8 @@ import asyncio
 import io
 import json
 import os
+import tempfile
+import time
 import traceback
 import gdown
 import pandas as pd
@@ -10,10 +12,19 @@ import base64
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, Response
-from pypdf import PdfReader
 from typing import List, Iterator
 
 from app import use_cases
+from app.batch_runs import BatchRun
+from app.bula_extractor import extract_bula_text_async, get_bula_text_cache
+from app.concurrency import tag_sse_event
+from app.gemini_batch import OfflineBatchRunner
+from app.job_engine import get_job_engine
+from app.job_routes import jobs_router
+from app.metrics import emits_metrics_summary
+from app.metrics_routes import metrics_router
+from app.spreadsheet_stream import iter_spreadsheet_batches
+from config import settings
 
 app = FastAPI(
     title="PharmaBoost Automation API",
@@ -22,6 +33,8 @@ app = FastAPI(
 )
 
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+app.include_router(jobs_router)
+app.include_router(metrics_router)
 
 # --- Constantes ---
 COLUNA_EAN_SKU = '_EANSKU'
@@ -35,18 +48,20 @@ COLUNA_HTML = '_DescricaoProduto'
 CHUNK_SIZE = 500
 
 async def get_bula_text(ean_sku: str, link_bula: str) -> str:
-    os.makedirs('bulas_temp', exist_ok=True)
-    output_path = f"bulas_temp/{ean_sku}.pdf"
-    try:
-        if not os.path.exists(output_path):
-            await asyncio.to_thread(gdown.download, str(link_bula), output_path, quiet=True, fuzzy=True)
+    # Bulas já extraídas (mesmo link ou mesmo PDF) saem do cache sem novo download.
+    bula_cache = get_bula_text_cache()
+    cached_text = bula_cache.get_by_link(str(link_bula))
+    if cached_text is not None:
+        return cached_text
 
+    os.makedirs('bulas_temp', exist_ok=True)
+    # Um diretório temporário por chamada: EANs repetidos baixados ao mesmo tempo não disputam o mesmo arquivo.
+    with tempfile.TemporaryDirectory(prefix=f"{ean_sku}-", dir='bulas_temp') as download_dir:
+        output_path = os.path.join(download_dir, "bula.pdf")
+        await asyncio.to_thread(gdown.download, str(link_bula), output_path, quiet=True, fuzzy=True)
         with open(output_path, 'rb') as f:
             file_bytes = f.read()
-            return "".join(page.extract_text() for page in PdfReader(io.BytesIO(file_bytes)).pages if page.extract_text())
-    finally:
-        if os.path.exists(output_path):
-            os.remove(output_path)
+    return await extract_bula_text_async(file_bytes, link=str(link_bula))
 
 def safe_update_and_preserve_data(df_original: pd.DataFrame, df_updates: pd.DataFrame, key_column: str) -> pd.DataFrame:
     df_original[key_column] = df_original[key_column].astype(str)
@@ -60,103 +75,411 @@ def safe_update_and_preserve_data(df_original: pd.DataFrame, df_updates: pd.Data
     df_final.reset_index(inplace=True)
     return df_final
 
-def read_spreadsheet(file_bytes: bytes, filename: str) -> pd.DataFrame:
-    if filename.lower().endswith('.csv'):
-        # Para CSV, a leitura em lote é mais direta, mas vamos manter a simplicidade por enquanto
-        return pd.read_csv(io.BytesIO(file_bytes), sep=',', encoding='utf-8-sig')
-    else:
-        return pd.read_excel(io.BytesIO(file_bytes), engine='openpyxl')
+def build_updated_dataframe(file_bytes: bytes, filename: str, df_updates: pd.DataFrame, key_column: str) -> pd.DataFrame:
+    """
+    Relê a planilha original em lotes e aplica as atualizações em cada um deles,
+    preservando todas as demais colunas e linhas.
+    """
+    updated_batches = [
+        safe_update_and_preserve_data(df_batch, df_updates, key_column)
+        for df_batch in iter_spreadsheet_batches(file_bytes, filename, CHUNK_SIZE)
+    ]
+    return pd.concat(updated_batches, ignore_index=True) if updated_batches else pd.DataFrame()
+
+def load_catalog(catalog_bytes: bytes, catalog_filename: str) -> pd.DataFrame:
+    """
+    Lê o catálogo em lotes e mantém apenas as linhas com link de bula validado,
+    as únicas que select_valid_rows aproveita: o catálogo inteiro nunca fica em memória.
+    """
+    valid_batches = []
+    for df_batch in iter_spreadsheet_batches(catalog_bytes, catalog_filename, CHUNK_SIZE):
+        df_batch.columns = df_batch.columns.str.strip()
+        df_batch = df_batch[df_batch[COLUNA_LINK_VALIDO].astype(str).str.strip().str.lower() == 'sim']
+        valid_batches.append(df_batch.astype({COLUNA_CODIGO_BARRAS: str}))
+    return pd.concat(valid_batches, ignore_index=True) if valid_batches else pd.DataFrame(columns=[COLUNA_CODIGO_BARRAS, COLUNA_LINK_VALIDO])
+
+def build_draft_workbook(items_bytes: bytes, items_filename: str, resultados: List[dict]) -> bytes:
+    """Monta o .xlsx do rascunho aplicando os resultados gerados sobre a planilha de itens."""
+    df_resultados = pd.DataFrame(resultados)[[COLUNA_EAN_SKU, COLUNA_TITULO_SEO, COLUNA_META_DESC, COLUNA_HTML]]
+    df_final = build_updated_dataframe(items_bytes, items_filename, df_resultados, COLUNA_EAN_SKU)
+
+    output_buffer = io.BytesIO()
+    with pd.ExcelWriter(output_buffer, engine='openpyxl') as writer:
+        df_final.to_excel(writer, index=False, sheet_name='Rascunho_IA')
+    return output_buffer.getvalue()
+
+def build_result_record(ean_sku: str, final_data: dict) -> dict:
+    """
+    Registro do checkpoint de um SKU a partir do evento 'done'. Só conta como
+    concluído (e é pulado ao retomar) quando a geração principal teve sucesso; o
+    conteúdo do Agente Essencial e os campos ausentes ("Erro") entram no rascunho,
+    mas são processados de novo na próxima tentativa.
+    """
+    fields = {
+        COLUNA_TITULO_SEO: final_data.get("seo_title"),
+        COLUNA_META_DESC: final_data.get("meta_description"),
+        COLUNA_HTML: final_data.get("final_content"),
+    }
+    status = final_data.get("status", BatchRun.STATUS_OK) if all(fields.values()) else "erro"
+    return {COLUNA_EAN_SKU: ean_sku, **{column: value or "Erro" for column, value in fields.items()}, "status": status}
+
+def select_valid_rows(df_chunk: pd.DataFrame, df_catalogo: pd.DataFrame) -> pd.DataFrame:
+    """Cruza um lote da planilha de itens com o catálogo e mantém só os itens com link de bula validado."""
+    df_chunk.columns = df_chunk.columns.str.strip()
+    df_chunk[COLUNA_EAN_SKU] = df_chunk[COLUNA_EAN_SKU].astype(str)
+
+    df_merged = pd.merge(df_chunk, df_catalogo, left_on=COLUNA_EAN_SKU, right_on=COLUNA_CODIGO_BARRAS, how='left')
+    return df_merged[df_merged[COLUNA_LINK_VALIDO].astype(str).str.strip().str.lower() == 'sim'].copy()
+
+@emits_metrics_summary
+async def batch_event_stream(catalog_bytes: bytes, catalog_filename: str, items_bytes: bytes, items_filename: str, run_id: str | None = None):
+    """
+    Gerador de eventos SSE do processamento em lote. É usado tanto pelo endpoint
+    de streaming direto quanto pelos jobs em segundo plano.
+
+    Cada SKU concluído é gravado no log da execução (`run_id`). Ao reenviar um
+    run_id existente, os SKUs já concluídos são pulados e o rascunho final
+    reúne os resultados de todas as tentativas.
+    """
+    async def _send_event(event_type: str, data: dict):
+        await asyncio.sleep(0.01)
+        return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
 
-@app.post("/batch-process-and-generate-draft")
-async def batch_process_stream(catalog_file: UploadFile = File(...), items_file: UploadFile = File(...)):
     try:
-        catalog_bytes = await catalog_file.read()
-        items_bytes = await items_file.read()
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Erro ao ler os arquivos enviados: {e}")
-
-    async def event_stream():
-        async def _send_event(event_type: str, data: dict):
-            await asyncio.sleep(0.01)
-            return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
-
-        try:
-            df_catalogo = read_spreadsheet(catalog_bytes, catalog_file.filename)
-            df_catalogo.columns = df_catalogo.columns.str.strip()
-            df_catalogo[COLUNA_CODIGO_BARRAS] = df_catalogo[COLUNA_CODIGO_BARRAS].astype(str)
-
-            df_processar_full = read_spreadsheet(items_bytes, items_file.filename)
-            total_items = len(df_processar_full)
-            yield await _send_event("log", {"message": f"Planilhas carregadas. Total de {total_items} itens para verificar.", "type": "info"})
-
-            resultados_finais = []
-            
-            # --- CORREÇÃO NO PROCESSAMENTO EM LOTES ---
-            # Itera sobre a planilha grande em pedaços (chunks)
-            for i in range(0, total_items, CHUNK_SIZE):
-                df_processar_chunk = df_processar_full.iloc[i:i + CHUNK_SIZE]
-                
-                processed_count = min(i + CHUNK_SIZE, total_items)
-
-                df_processar_chunk.columns = df_processar_chunk.columns.str.strip()
-                df_processar_chunk[COLUNA_EAN_SKU] = df_processar_chunk[COLUNA_EAN_SKU].astype(str)
-
-                df_merged = pd.merge(df_processar_chunk, df_catalogo, left_on=COLUNA_EAN_SKU, right_on=COLUNA_CODIGO_BARRAS, how='left')
-                df_validos = df_merged[df_merged[COLUNA_LINK_VALIDO].astype(str).str.strip().str.lower() == 'sim'].copy()
+        df_catalogo = await asyncio.to_thread(load_catalog, catalog_bytes, catalog_filename)
+
+        # A planilha de itens é lida em streaming: o primeiro lote começa a ser
+        # processado sem esperar a leitura do arquivo inteiro.
+        yield await _send_event("log", {"message": "Catálogo carregado. Lendo a planilha de itens em lotes...", "type": "info"})
+
+        batch_run = await asyncio.to_thread(BatchRun.start, settings.BATCH_RUNS_DIR, items_bytes, items_filename, run_id)
+        concluidos = await asyncio.to_thread(batch_run.completed_keys, COLUNA_EAN_SKU)
+        yield await _send_event("run", {"run_id": batch_run.run_id, "completed": len(concluidos)})
+        if concluidos:
+            yield await _send_event("log", {"message": f"Retomando a execução {batch_run.run_id}: {len(concluidos)} itens já concluídos serão pulados.", "type": "info"})
+
+        # --- PIPELINE EM ESTÁGIOS ---
+        # produtor (linhas válidas) -> download/extração da bula -> geração com IA.
+        # As filas limitadas fazem o download das próximas bulas acontecer enquanto
+        # os itens atuais aguardam o Gemini, sem acumular trabalho sem limite.
+        event_queue: asyncio.Queue = asyncio.Queue(maxsize=200)
+        fetch_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.BATCH_PREFETCH_DEPTH)
+        generate_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.BATCH_PREFETCH_DEPTH)
+        stage_timings = {"download_extracao": [0.0, 0], "geracao": [0.0, 0]}
+
+        def record_timing(stage: str, elapsed: float):
+            stage_timings[stage][0] += elapsed
+            stage_timings[stage][1] += 1
+
+        def queue_status() -> str:
+            return f"Filas: download {fetch_queue.qsize()}/{fetch_queue.maxsize}, geração {generate_queue.qsize()}/{generate_queue.maxsize}."
+
+        async def produce_rows():
+            # Itera sobre a planilha grande em pedaços (chunks), lidos sob demanda
+            item_batches = iter_spreadsheet_batches(items_bytes, items_filename, CHUNK_SIZE)
+            processed_count = 0
+            while (df_processar_chunk := await asyncio.to_thread(next, item_batches, None)) is not None:
+                processed_count += len(df_processar_chunk)
+
+                df_validos = select_valid_rows(df_processar_chunk, df_catalogo)
 
                 if df_validos.empty:
-                    yield await _send_event("log", {"message": f"Lote {processed_count}/{total_items}: Nenhum item validado encontrado. Pulando.", "type": "info"})
+                    await event_queue.put(await _send_event("log", {"message": f"Lote até o item {processed_count}: Nenhum item validado encontrado. Pulando.", "type": "info"}))
                     continue
 
-                yield await _send_event("log", {"message": f"Processando lote de {len(df_validos)} itens válidos (Total verificado: {processed_count}/{total_items})...", "type": "success"})
+                await event_queue.put(await _send_event("log", {"message": f"Processando lote de {len(df_validos)} itens válidos (Total verificado: {processed_count})...", "type": "success"}))
 
-                for index, row in df_validos.iterrows():
+                for _, row in df_validos.iterrows():
                     ean_sku = str(row.get(COLUNA_EAN_SKU))
+                    if ean_sku in concluidos:
+                        continue
                     nome_produto = row.get(COLUNA_NOME_PRODUTO)
                     link_bula = row.get(COLUNA_LINK_BULA)
 
                     if not link_bula or pd.isna(link_bula):
-                        yield await _send_event("log", {"message": f"<b>[SKU: {ean_sku}]</b> Link da bula ausente. Pulando.", "type": "warning"})
+                        await event_queue.put(await _send_event("log", {"message": f"<b>[SKU: {ean_sku}]</b> Link da bula ausente. Pulando.", "type": "warning", "sku": ean_sku}))
                         continue
 
+                    await fetch_queue.put((ean_sku, nome_produto, link_bula))
+
+        async def fetch_worker():
+            while (item := await fetch_queue.get()) is not None:
+                ean_sku, nome_produto, link_bula = item
+                started_at = time.perf_counter()
+                try:
                     bula_text = await get_bula_text(ean_sku, link_bula)
-                    if not bula_text.strip():
-                        yield await _send_event("log", {"message": f"<b>[SKU: {ean_sku}]</b> Falha ao ler o PDF da bula.", "type": "error"})
-                        continue
+                except Exception as e:
+                    await event_queue.put(await _send_event("log", {"message": f"<b>[SKU: {ean_sku}]</b> Falha ao baixar a bula: {e}", "type": "error", "sku": ean_sku}))
+                    continue
+                elapsed = time.perf_counter() - started_at
+                record_timing("download_extracao", elapsed)
+
+                if not bula_text.strip():
+                    await event_queue.put(await _send_event("log", {"message": f"<b>[SKU: {ean_sku}]</b> Falha ao ler o PDF da bula.", "type": "error", "sku": ean_sku}))
+                    continue
 
+                await generate_queue.put((ean_sku, nome_produto, bula_text))
+                await event_queue.put(await _send_event("log", {"message": f"<b>[SKU: {ean_sku}]</b> Bula pronta em {elapsed:.1f}s. {queue_status()}", "type": "info", "sku": ean_sku}))
+
+        async def generate_worker():
+            while (item := await generate_queue.get()) is not None:
+                ean_sku, nome_produto, bula_text = item
+                started_at = time.perf_counter()
+                try:
                     async for chunk in use_cases.run_seo_pipeline_stream("medicine", nome_produto, {"bula_text": bula_text}):
-                        yield chunk
+                        # Os fluxos de vários itens são intercalados: cada evento leva o seu SKU.
+                        await event_queue.put(tag_sse_event(chunk, sku=ean_sku))
                         if "event: done" in chunk:
                             final_data = json.loads(chunk.split('data: ')[1])
-                            resultados_finais.append({
-                                COLUNA_EAN_SKU: ean_sku,
-                                COLUNA_TITULO_SEO: final_data.get("seo_title", "Erro"),
-                                COLUNA_META_DESC: final_data.get("meta_description", "Erro"),
-                                COLUNA_HTML: final_data.get("final_content", "Erro")
-                            })
-
-                    if index != df_validos.index[-1]:
-                        yield await _send_event("log", {"message": "Aguardando 2S segundos para evitar o limite de requisições da API...", "type": "info"})
-                        await asyncio.sleep(2)
-
-            if resultados_finais:
-                df_resultados = pd.DataFrame(resultados_finais)
-                df_final = safe_update_and_preserve_data(df_processar_full, df_resultados, COLUNA_EAN_SKU)
-
-                output_buffer = io.BytesIO()
-                with pd.ExcelWriter(output_buffer, engine='openpyxl') as writer:
-                    df_final.to_excel(writer, index=False, sheet_name='Rascunho_IA')
-
-                file_data_b64 = base64.b64encode(output_buffer.getvalue()).decode('utf-8')
-                yield await _send_event("finished", {"filename": "rascunho_para_revisao.xlsx", "file_data": file_data_b64})
-            else:
-                 yield await _send_event("log", {"message": "<b>AVISO:</b> Nenhum produto válido foi processado com sucesso. O processo será finalizado.", "type": "warning"})
-
-        except Exception as e:
-            traceback.print_exc()
-            yield await _send_event("log", {"message": f"ERRO FATAL: {e}", "type": "error"})
-
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+                            # Checkpoint: o resultado vai para o disco assim que o SKU termina.
+                            await asyncio.to_thread(batch_run.append_result, build_result_record(ean_sku, final_data))
+                except Exception as e:
+                    # Uma falha em um SKU não pode derrubar o worker: sem consumidores, as filas travariam o pipeline.
+                    traceback.print_exc()
+                    await event_queue.put(await _send_event("log", {"message": f"<b>[SKU: {ean_sku}]</b> Falha ao gerar ou salvar o conteúdo: {e}", "type": "error", "sku": ean_sku}))
+                    continue
+                record_timing("geracao", time.perf_counter() - started_at)
+
+        async def run_stages():
+            producer = asyncio.create_task(produce_rows())
+            fetchers = [asyncio.create_task(fetch_worker()) for _ in range(settings.BATCH_FETCH_CONCURRENCY)]
+            generators = [asyncio.create_task(generate_worker()) for _ in range(settings.BATCH_GENERATE_CONCURRENCY)]
+            stage_tasks.extend([producer, *fetchers, *generators])
+
+            async def drain_stages():
+                await producer
+                for _ in fetchers:
+                    await fetch_queue.put(None)
+                await asyncio.gather(*fetchers)
+                for _ in generators:
+                    await generate_queue.put(None)
+                await asyncio.gather(*generators)
+
+            try:
+                # A primeira etapa que falhar encerra as demais: sem ela, as outras ficariam
+                # presas nas filas e o fluxo nunca terminaria.
+                drain = asyncio.create_task(drain_stages())
+                done, pending = await asyncio.wait([drain, *stage_tasks], return_when=asyncio.FIRST_EXCEPTION)
+                failed = next((task for task in done if not task.cancelled() and task.exception() is not None), None)
+                if failed is not None:
+                    for task in pending:
+                        task.cancel()
+                    raise failed.exception()
+            finally:
+                await event_queue.put(None)
+
+        stage_tasks = []
+        yield await _send_event("log", {"message": f"Pipeline iniciado: {settings.BATCH_FETCH_CONCURRENCY} downloads e {settings.BATCH_GENERATE_CONCURRENCY} gerações em paralelo (pré-carga de até {settings.BATCH_PREFETCH_DEPTH} bulas).", "type": "info"})
+        supervisor = asyncio.create_task(run_stages())
+        try:
+            while (chunk := await event_queue.get()) is not None:
+                yield chunk
+            await supervisor
+        finally:
+            for task in [supervisor, *stage_tasks]:
+                if not task.done():
+                    task.cancel()
+
+        timing_summary = ", ".join(
+            f"{stage.replace('_', '/')}: {total / count:.1f}s em média ({count} itens)"
+            for stage, (total, count) in stage_timings.items() if count
+        )
+        if timing_summary:
+            yield await _send_event("log", {"message": f"Tempos por etapa: {timing_summary}.", "type": "info"})
+
+        # O rascunho é montado a partir do log, incluindo os SKUs de execuções anteriores.
+        resultados_finais = await asyncio.to_thread(batch_run.load_results, COLUNA_EAN_SKU)
+        if resultados_finais:
+            draft_bytes = await asyncio.to_thread(build_draft_workbook, items_bytes, items_filename, resultados_finais)
+            file_data_b64 = base64.b64encode(draft_bytes).decode('utf-8')
+            yield await _send_event("finished", {"filename": "rascunho_para_revisao.xlsx", "file_data": file_data_b64})
+        else:
+             yield await _send_event("log", {"message": "<b>AVISO:</b> Nenhum produto válido foi processado com sucesso. O processo será finalizado.", "type": "warning"})
+
+    except Exception as e:
+        traceback.print_exc()
+        yield await _send_event("log", {"message": f"ERRO FATAL: {e}", "type": "error"})
+
+@app.post("/batch-process-and-generate-draft")
+async def batch_process_stream(catalog_file: UploadFile = File(...), items_file: UploadFile = File(...), run_id: str | None = Form(None)):
+    try:
+        catalog_bytes = await catalog_file.read()
+        items_bytes = await items_file.read()
+        if run_id:
+            BatchRun.validate_run_id(run_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao ler os arquivos enviados: {e}")
+
+    return StreamingResponse(
+        batch_event_stream(catalog_bytes, catalog_file.filename, items_bytes, items_file.filename, run_id),
+        media_type="text/event-stream",
+    )
+
+@app.post("/jobs/batch-process-and-generate-draft")
+async def submit_batch_process_job(catalog_file: UploadFile = File(...), items_file: UploadFile = File(...), run_id: str | None = Form(None)):
+    """Inicia o processamento em lote em segundo plano e devolve o id do job."""
+    try:
+        catalog_bytes = await catalog_file.read()
+        items_bytes = await items_file.read()
+        if run_id:
+            BatchRun.validate_run_id(run_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao ler os arquivos enviados: {e}")
+
+    job_id = get_job_engine().submit(
+        "batch-process",
+        lambda: batch_event_stream(catalog_bytes, catalog_file.filename, items_bytes, items_file.filename, run_id),
+    )
+    return {"job_id": job_id, "status": "queued"}
+
+@emits_metrics_summary
+async def offline_batch_event_stream(catalog_bytes: bytes, catalog_filename: str, items_bytes: bytes, items_filename: str, run_id: str | None = None):
+    """
+    Gerador de eventos SSE do processamento em lote offline, para catálogos que
+    não precisam de resposta interativa: as bulas são baixadas primeiro e a
+    pipeline roda com um job da Batch API por etapa (use_cases.run_offline_seo_pipeline).
+
+    Usa o mesmo log de execução (`run_id`) e o mesmo rascunho final do
+    processamento em lote online. Ao retomar um run_id, as etapas já enviadas
+    se reconectam aos seus jobs em vez de reenviá-los.
+    """
+    async def _send_event(event_type: str, data: dict):
+        await asyncio.sleep(0.01)
+        return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+    try:
+        df_catalogo = await asyncio.to_thread(load_catalog, catalog_bytes, catalog_filename)
+
+        batch_run = await asyncio.to_thread(BatchRun.start, settings.BATCH_RUNS_DIR, items_bytes, items_filename, run_id)
+        concluidos = await asyncio.to_thread(batch_run.completed_keys, COLUNA_EAN_SKU)
+        yield await _send_event("run", {"run_id": batch_run.run_id, "completed": len(concluidos)})
+        if concluidos:
+            yield await _send_event("log", {"message": f"Retomando a execução {batch_run.run_id}: {len(concluidos)} itens já concluídos serão pulados.", "type": "info"})
+
+        produtos = {}
+        links_bula = {}
+        item_batches = iter_spreadsheet_batches(items_bytes, items_filename, CHUNK_SIZE)
+        while (df_processar_chunk := await asyncio.to_thread(next, item_batches, None)) is not None:
+            for _, row in select_valid_rows(df_processar_chunk, df_catalogo).iterrows():
+                ean_sku = str(row.get(COLUNA_EAN_SKU))
+                if ean_sku in concluidos:
+                    continue
+                link_bula = row.get(COLUNA_LINK_BULA)
+                if not link_bula or pd.isna(link_bula):
+                    yield await _send_event("log", {"message": f"<b>[SKU: {ean_sku}]</b> Link da bula ausente. Pulando.", "type": "warning", "sku": ean_sku})
+                    continue
+                produtos[ean_sku] = row.get(COLUNA_NOME_PRODUTO)
+                links_bula[ean_sku] = link_bula
+
+        # As bulas são baixadas antes de montar os lotes; os textos são gravados no
+        # diretório da execução e relidos dele a cada etapa, sem manter o catálogo em
+        # memória e sem depender do cache de bulas (que tem tamanho limitado).
+        yield await _send_event("log", {"message": f"{len(produtos)} itens válidos. Baixando as bulas ({settings.BATCH_FETCH_CONCURRENCY} em paralelo)...", "type": "info"})
+        download_slots = asyncio.Semaphore(settings.BATCH_FETCH_CONCURRENCY)
+
+        async def fetch_bula(ean_sku: str) -> tuple[str, str | None]:
+            async with download_slots:
+                if await asyncio.to_thread(batch_run.load_bula_text, ean_sku):
+                    return ean_sku, None
+                try:
+                    bula_text = await get_bula_text(ean_sku, links_bula[ean_sku])
+                except Exception as e:
+                    return ean_sku, f"Falha ao baixar a bula: {e}"
+            if not bula_text.strip():
+                return ean_sku, "Falha ao ler o PDF da bula."
+            await asyncio.to_thread(batch_run.save_bula_text, ean_sku, bula_text)
+            return ean_sku, None
+
+        for next_download in asyncio.as_completed([fetch_bula(ean_sku) for ean_sku in produtos]):
+            ean_sku, erro = await next_download
+            if erro:
+                produtos.pop(ean_sku)
+                yield await _send_event("log", {"message": f"<b>[SKU: {ean_sku}]</b> {erro}", "type": "error", "sku": ean_sku})
+
+        async def load_product_info(ean_sku: str) -> dict:
+            bula_text = await asyncio.to_thread(batch_run.load_bula_text, ean_sku)
+            if bula_text is None:
+                bula_text = await get_bula_text(ean_sku, links_bula[ean_sku])
+            return {"bula_text": bula_text}
+
+        if produtos:
+            runner = OfflineBatchRunner(
+                use_cases.get_offline_batch_service(), batch_run.run_dir / "offline",
+                poll_interval=settings.OFFLINE_BATCH_POLL_SECONDS, timeout=settings.OFFLINE_BATCH_TIMEOUT_SECONDS,
+            )
+            async for chunk in use_cases.run_offline_seo_pipeline(produtos, load_product_info, runner):
+                if "event: done" in chunk:
+                    final_data = json.loads(chunk.split('data: ')[1])
+                    ean_sku = final_data["key"]
+                    await asyncio.to_thread(batch_run.append_result, build_result_record(ean_sku, final_data))
+                    chunk = tag_sse_event(chunk, sku=ean_sku)
+                yield chunk
+
+        resultados_finais = await asyncio.to_thread(batch_run.load_results, COLUNA_EAN_SKU)
+        if resultados_finais:
+            draft_bytes = await asyncio.to_thread(build_draft_workbook, items_bytes, items_filename, resultados_finais)
+            file_data_b64 = base64.b64encode(draft_bytes).decode('utf-8')
+            yield await _send_event("finished", {"filename": "rascunho_para_revisao.xlsx", "file_data": file_data_b64})
+        else:
+            yield await _send_event("log", {"message": "<b>AVISO:</b> Nenhum produto válido foi processado com sucesso. O processo será finalizado.", "type": "warning"})
+
+    except Exception as e:
+        traceback.print_exc()
+        yield await _send_event("log", {"message": f"ERRO FATAL: {e}", "type": "error"})
+
+@app.post("/offline/batch-process-and-generate-draft")
+async def offline_batch_process_stream(catalog_file: UploadFile = File(...), items_file: UploadFile = File(...), run_id: str | None = Form(None)):
+    try:
+        catalog_bytes = await catalog_file.read()
+        items_bytes = await items_file.read()
+        if run_id:
+            BatchRun.validate_run_id(run_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao ler os arquivos enviados: {e}")
+
+    return StreamingResponse(
+        offline_batch_event_stream(catalog_bytes, catalog_file.filename, items_bytes, items_file.filename, run_id),
+        media_type="text/event-stream",
+    )
+
+@app.post("/jobs/offline/batch-process-and-generate-draft")
+async def submit_offline_batch_process_job(catalog_file: UploadFile = File(...), items_file: UploadFile = File(...), run_id: str | None = Form(None)):
+    """Inicia o processamento em lote offline (Batch API) em segundo plano e devolve o id do job."""
+    try:
+        catalog_bytes = await catalog_file.read()
+        items_bytes = await items_file.read()
+        if run_id:
+            BatchRun.validate_run_id(run_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao ler os arquivos enviados: {e}")
+
+    job_id = get_job_engine().submit(
+        "offline-batch-process",
+        lambda: offline_batch_event_stream(catalog_bytes, catalog_file.filename, items_bytes, items_file.filename, run_id),
+    )
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/batch-runs/{run_id}/draft")
+async def download_partial_draft(run_id: str):
+    """Monta o rascunho com os SKUs concluídos até agora na execução, mesmo que ela ainda esteja em andamento."""
+    try:
+        batch_run = BatchRun.open(settings.BATCH_RUNS_DIR, run_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if batch_run is None:
+        raise HTTPException(status_code=404, detail="Execução não encontrada.")
+
+    resultados = await asyncio.to_thread(batch_run.load_results, COLUNA_EAN_SKU)
+    if not resultados:
+        raise HTTPException(status_code=404, detail="Nenhum SKU foi concluído nesta execução ainda.")
+
+    items_bytes = await asyncio.to_thread(batch_run.read_items)
+    draft_bytes = await asyncio.to_thread(build_draft_workbook, items_bytes, batch_run.items_filename, resultados)
+    return Response(
+        content=draft_bytes,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f"attachment; filename=rascunho_parcial_{batch_run.run_id}.xlsx", "X-Completed-Items": str(len(resultados))},
+    )
 
 @app.post("/finalize-spreadsheet")
 async def finalize_spreadsheet(spreadsheet: UploadFile = File(...), approved_data_json: str = Form(...)):
@@ -0,0 +1,56 @@
+# app/agent_profiles.py
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+
+from google.genai import types as genai_types
+
+from config import settings
+
+
+@dataclass(frozen=True)
+class AgentProfile:
+    """
+    Modelo e parâmetros de geração de um agente (chave: nome do prompt).
+    Campos None usam o padrão do modelo.
+    """
+    prompt_name: str
+    model: str
+    max_output_tokens: int | None = None
+    thinking_budget: int | None = None  # 0 desativa o raciocínio (thinking) nos modelos que permitem.
+    temperature: float | None = None
+    timeout_seconds: float | None = None
+
+    def generation_config(self) -> dict:
+        """Campos do GenerateContentConfig definidos pelo perfil."""
+        config = {}
+        if self.max_output_tokens is not None:
+            config["max_output_tokens"] = self.max_output_tokens
+        if self.temperature is not None:
+            config["temperature"] = self.temperature
+        if self.thinking_budget is not None:
+            config["thinking_config"] = genai_types.ThinkingConfig(thinking_budget=self.thinking_budget)
+        if self.timeout_seconds is not None:
+            config["http_options"] = genai_types.HttpOptions(timeout=int(self.timeout_seconds * 1000))
+        return config
+
+    def batch_generation_config(self) -> dict:
+        """Os mesmos campos no formato JSON das requisições da Batch API (sem o timeout, que é da chamada HTTP)."""
+        config = {}
+        if self.max_output_tokens is not None:
+            config["max_output_tokens"] = self.max_output_tokens
+        if self.temperature is not None:
+            config["temperature"] = self.temperature
+        if self.thinking_budget is not None:
+            config["thinking_config"] = {"thinking_budget": self.thinking_budget}
+        return config
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@lru_cache(maxsize=None)
+def get_agent_profile(prompt_name: str) -> AgentProfile:
+    """Perfil do agente em settings.AGENT_PROFILES; sem entrada, o modelo padrão com o timeout padrão."""
+    fields = {"model": settings.DEFAULT_MODEL, "timeout_seconds": settings.REQUEST_TIMEOUT}
+    fields.update(settings.AGENT_PROFILES.get(prompt_name, {}))
+    return AgentProfile(prompt_name=prompt_name, **fields)
@@ -134,11 +134,6 @@ async def batch_process_stream(catalog_file: UploadFile = File(...), items_file:
                                 COLUNA_HTML: final_data.get("final_content", "Erro")
                             })
 
-                    if index != df_validos.index[-1]:
-                        # CORREÇÃO: Aumentado o tempo de espera para 60 segundos para evitar o limite de requisições da API.
-                        yield await _send_event("log", {"message": "Aguardando 60 segundos para evitar o limite de requisições da API...", "type": "info"})
-                        await asyncio.sleep(2)
-
             if resultados_finais:
                 df_resultados = pd.DataFrame(resultados_finais)
                 df_final = safe_update_and_preserve_data(df_processar_full, df_resultados, COLUNA_EAN_SKU)
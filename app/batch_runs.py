@@ -0,0 +1,140 @@
+# app/batch_runs.py
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List
+
+_RUN_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class BatchRun:
+    """
+    Checkpoint de uma execução em lote, gravado em disco à medida que os SKUs terminam.
+
+    Cada execução tem um diretório com a planilha de itens enviada e um log
+    append-only (JSON Lines) com um registro por SKU concluído. Uma execução
+    interrompida pode ser retomada pulando os SKUs já concluídos com sucesso, e o
+    rascunho parcial pode ser montado a qualquer momento a partir do log.
+
+    Cada registro leva um `status` (STATUS_OK, ou outro valor como "fallback" e
+    "erro"): registros sem sucesso entram no rascunho, mas o SKU é processado de
+    novo ao retomar a execução.
+
+    Os textos de bula usados pela execução também podem ser guardados no
+    diretório (comprimidos com zlib), para serem relidos a cada etapa sem novo
+    download.
+    """
+    STATUS_OK = "ok"
+    RESULTS_FILE = "results.jsonl"
+    META_FILE = "meta.json"
+    ITEMS_FILE = "items.bin"
+    BULAS_DIR = "bulas"
+
+    def __init__(self, run_dir: Path):
+        self.run_dir = Path(run_dir)
+        self.run_id = self.run_dir.name
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def validate_run_id(run_id: str) -> str:
+        if not _RUN_ID_PATTERN.match(run_id or ""):
+            raise ValueError("run_id inválido: use apenas letras, números, '-' e '_' (até 64 caracteres).")
+        return run_id
+
+    @classmethod
+    def start(cls, base_dir: Path, items_bytes: bytes, items_filename: str, run_id: str | None = None) -> "BatchRun":
+        """
+        Cria uma execução nova ou reabre uma existente com o mesmo run_id.
+        A planilha de itens salva é sempre a do envio mais recente.
+        """
+        run_id = cls.validate_run_id(run_id) if run_id else uuid.uuid4().hex
+        run = cls(Path(base_dir) / run_id)
+        run.run_dir.mkdir(parents=True, exist_ok=True)
+        (run.run_dir / cls.ITEMS_FILE).write_bytes(items_bytes)
+        meta = {"run_id": run_id, "items_filename": items_filename, "updated_at": time.time()}
+        (run.run_dir / cls.META_FILE).write_text(json.dumps(meta), encoding="utf-8")
+        run._discard_partial_line()
+        return run
+
+    @classmethod
+    def open(cls, base_dir: Path, run_id: str) -> "BatchRun | None":
+        run = cls(Path(base_dir) / cls.validate_run_id(run_id))
+        if not (run.run_dir / cls.META_FILE).exists():
+            return None
+        return run
+
+    @property
+    def items_filename(self) -> str:
+        meta = json.loads((self.run_dir / self.META_FILE).read_text(encoding="utf-8"))
+        return meta["items_filename"]
+
+    def read_items(self) -> bytes:
+        return (self.run_dir / self.ITEMS_FILE).read_bytes()
+
+    def _discard_partial_line(self):
+        """Remove uma última linha incompleta, para que a próxima gravação comece em linha nova."""
+        path = self.run_dir / self.RESULTS_FILE
+        if not path.exists():
+            return
+        with open(path, "r+b") as f:
+            content = f.read()
+            if content and not content.endswith(b"\n"):
+                f.truncate(content.rfind(b"\n") + 1)
+
+    def append_result(self, record: Dict[str, Any]):
+        """Acrescenta o resultado de um SKU ao log e força a gravação em disco (fsync)."""
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.run_dir / self.RESULTS_FILE, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def load_results(self, key_column: str) -> List[Dict[str, Any]]:
+        """
+        Lê o log de resultados. Se um SKU aparecer mais de uma vez, vale o registro
+        mais recente. Uma última linha incompleta (queda durante a escrita) é ignorada.
+        """
+        path = self.run_dir / self.RESULTS_FILE
+        if not path.exists():
+            return []
+        results = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                results[str(record[key_column])] = record
+        return list(results.values())
+
+    def completed_keys(self, key_column: str) -> set:
+        """SKUs concluídos com sucesso (registros sem `status`, de versões anteriores, contam como concluídos)."""
+        return {
+            str(record[key_column]) for record in self.load_results(key_column)
+            if record.get("status", self.STATUS_OK) == self.STATUS_OK
+        }
+
+    def _bula_path(self, key: str) -> Path:
+        # O nome do arquivo é o hash da chave: SKUs podem conter caracteres inválidos em nomes de arquivo.
+        return self.run_dir / self.BULAS_DIR / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.txt.z"
+
+    def save_bula_text(self, key: str, text: str):
+        """Grava o texto da bula de um SKU (escrita atômica: arquivo temporário + rename)."""
+        path = self._bula_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(zlib.compress(text.encode("utf-8")))
+        os.replace(tmp_path, path)
+
+    def load_bula_text(self, key: str) -> str | None:
+        path = self._bula_path(key)
+        if not path.exists():
+            return None
+        return zlib.decompress(path.read_bytes()).decode("utf-8")
@@ -0,0 +1,286 @@
+# app/bula_extractor.py
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from pypdf import PdfReader
+
+from config import settings
+from .cache_store import SqliteLRUCache
+
+_bula_text_cache = None
+_extraction_service = None
+_cache_lock = threading.Lock()
+
+
+def extract_text_from_pdf_bytes(pdf_bytes: bytes) -> str:
+    """Extrai o texto de todas as páginas de um PDF de bula, uma página por linha."""
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    page_texts = (page.extract_text() for page in reader.pages)
+    return "".join(text + "\n" for text in page_texts if text)
+
+
+def _init_extraction_worker(memory_limit_mb: int):
+    """Inicializador dos processos de extração: aplica o limite de memória (apenas POSIX)."""
+    if memory_limit_mb <= 0:
+        return
+    try:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def _extract_pages(pdf_bytes: bytes, max_pages: int) -> tuple[str, int]:
+    """
+    Extrai as primeiras `max_pages` páginas do PDF, lendo o documento uma única vez.
+
+    Returns:
+        O texto das páginas e o total de páginas do documento.
+    """
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    total_pages = len(reader.pages)
+    texts = []
+    for page_number in range(min(max_pages, total_pages)):
+        text = reader.pages[page_number].extract_text()
+        if text:
+            texts.append(text + "\n")
+    return "".join(texts), total_pages
+
+
+def _extraction_worker_main(conn, memory_limit_mb: int):
+    """Laço dos processos de extração: recebe (pdf_bytes, max_pages) e responde ("ok", resultado) ou ("error", mensagem)."""
+    _init_extraction_worker(memory_limit_mb)
+    conn.send(("ready", None))
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        pdf_bytes, max_pages = request
+        try:
+            conn.send(("ok", _extract_pages(pdf_bytes, max_pages)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class _ExtractionWorker:
+    """Um processo de extração dedicado, que atende um documento por vez."""
+    def __init__(self, context, memory_limit_mb: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_extraction_worker_main, args=(child_conn, memory_limit_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+        # A inicialização do processo (spawn e imports) não entra no tempo limite dos documentos.
+        try:
+            self.conn.recv()
+        except EOFError as e:
+            self.terminate()
+            raise ValueError("O processo de extração do PDF não iniciou.") from e
+
+    def run(self, pdf_bytes: bytes, max_pages: int, timeout_seconds: float) -> tuple[str, int]:
+        """
+        Raises:
+            TimeoutError: Se o documento não terminar em `timeout_seconds`.
+            ValueError: Se a extração falhar ou o processo morrer (ex: limite de memória).
+        """
+        try:
+            self.conn.send((pdf_bytes, max_pages))
+            finished = self.conn.poll(timeout_seconds)
+            status, payload = self.conn.recv() if finished else (None, None)
+        except (EOFError, OSError) as e:
+            raise ValueError(f"O processo de extração do PDF foi encerrado: {e!r}") from e
+        if not finished:
+            raise TimeoutError
+        if status != "ok":
+            raise ValueError(f"Falha na extração do PDF: {payload}")
+        return payload
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def terminate(self):
+        self.process.terminate()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class PdfExtractionService:
+    """
+    Serviço de extração de PDFs fora do event loop, em processos dedicados.
+
+    Cada documento é extraído inteiro por um único processo, que lê o PDF uma vez;
+    o paralelismo é entre documentos, até `max_workers` ao mesmo tempo. O tempo
+    limite conta apenas a extração em andamento (não a espera por um processo
+    livre) e, se estourar, somente o processo daquele documento é encerrado: as
+    extrações dos demais documentos continuam normalmente.
+    """
+    def __init__(self, max_workers: int, timeout_seconds: float, max_pages: int,
+                 max_pdf_bytes: int, memory_limit_mb: int = 0):
+        self.max_workers = max(1, int(max_workers))
+        self.timeout_seconds = timeout_seconds
+        self.max_pages = max(1, int(max_pages))
+        self.max_pdf_bytes = int(max_pdf_bytes)
+        self.memory_limit_mb = int(memory_limit_mb)
+        self._context = multiprocessing.get_context("spawn")
+        # Cada thread do despachante conduz um documento em um processo; a fila do
+        # executor é a espera por um processo livre, que não entra no tempo limite.
+        self._dispatcher = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pdf-extraction")
+        self._idle_workers: list[_ExtractionWorker] = []
+        self._workers_lock = threading.Lock()
+
+    def _take_worker(self) -> _ExtractionWorker:
+        with self._workers_lock:
+            while self._idle_workers:
+                worker = self._idle_workers.pop()
+                if worker.is_alive():
+                    return worker
+                worker.terminate()
+        return _ExtractionWorker(self._context, self.memory_limit_mb)
+
+    def _return_worker(self, worker: _ExtractionWorker):
+        with self._workers_lock:
+            self._idle_workers.append(worker)
+
+    def _extract_blocking(self, pdf_bytes: bytes) -> str:
+        worker = self._take_worker()
+        try:
+            text, total_pages = worker.run(pdf_bytes, self.max_pages, self.timeout_seconds)
+        except TimeoutError:
+            # Apenas o processo preso neste documento é encerrado.
+            worker.terminate()
+            raise ValueError(f"A extração do PDF excedeu o tempo limite de {self.timeout_seconds}s.")
+        except ValueError:
+            worker.terminate()
+            raise
+        self._return_worker(worker)
+        if total_pages > self.max_pages:
+            print(f"AVISO: PDF com {total_pages} páginas. Apenas as primeiras {self.max_pages} foram extraídas.")
+        return text
+
+    async def extract(self, pdf_bytes: bytes) -> str:
+        """
+        Extrai o texto do PDF sem bloquear o event loop.
+
+        Raises:
+            ValueError: Se o PDF exceder o tamanho máximo ou o tempo limite de extração,
+                ou se a extração falhar.
+        """
+        if len(pdf_bytes) > self.max_pdf_bytes:
+            raise ValueError(f"PDF com {len(pdf_bytes) // (1024 * 1024)} MB excede o limite de {self.max_pdf_bytes // (1024 * 1024)} MB.")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._dispatcher, self._extract_blocking, pdf_bytes)
+
+
+class BulaTextCache:
+    """
+    Cache do texto extraído das bulas, endereçado pelo SHA-256 dos bytes do PDF.
+
+    O texto é gravado comprimido com zlib. Também guarda um apelido do link de
+    download para o hash do PDF, permitindo que reprocessamentos pulem o download.
+    O apelido vale por `link_ttl_seconds` (bem menos que o texto): depois disso o
+    PDF é baixado de novo, para que uma bula atualizada no mesmo link seja percebida.
+    """
+    COMPRESSION_LEVEL = 6
+
+    def __init__(self, store: SqliteLRUCache, link_ttl_seconds: float | None = None):
+        self.store = store
+        self.link_ttl_seconds = link_ttl_seconds
+
+    @staticmethod
+    def pdf_hash(pdf_bytes: bytes) -> str:
+        return hashlib.sha256(pdf_bytes).hexdigest()
+
+    def get_by_hash(self, pdf_hash: str) -> str | None:
+        compressed = self.store.get(f"pdf:{pdf_hash}")
+        if compressed is None:
+            return None
+        return zlib.decompress(compressed).decode("utf-8")
+
+    def put_by_hash(self, pdf_hash: str, text: str):
+        self.store.put(f"pdf:{pdf_hash}", zlib.compress(text.encode("utf-8"), self.COMPRESSION_LEVEL))
+
+    def get_by_link(self, link: str) -> str | None:
+        alias = self.store.get(f"link:{link}")
+        if alias is None:
+            return None
+        # Formato "hash:momento da gravação"; apelidos sem o momento são tratados como expirados.
+        pdf_hash, _, remembered_at = alias.decode("ascii").partition(":")
+        if self.link_ttl_seconds is not None and (not remembered_at or time.time() - float(remembered_at) > self.link_ttl_seconds):
+            return None
+        return self.get_by_hash(pdf_hash)
+
+    def remember_link(self, link: str, pdf_hash: str):
+        self.store.put(f"link:{link}", f"{pdf_hash}:{time.time():.0f}".encode("ascii"))
+
+    async def get_or_extract_async(self, pdf_bytes: bytes, service: PdfExtractionService, link: str | None = None) -> str:
+        """Igual a get_or_extract, mas extrai nos processos do serviço informado."""
+        pdf_hash = self.pdf_hash(pdf_bytes)
+        text = self.get_by_hash(pdf_hash)
+        if text is None:
+            text = await service.extract(pdf_bytes)
+            if text.strip():
+                self.put_by_hash(pdf_hash, text)
+        if link and text.strip():
+            self.remember_link(link, pdf_hash)
+        return text
+
+    def get_or_extract(self, pdf_bytes: bytes, link: str | None = None) -> str:
+        """
+        Retorna o texto da bula a partir do cache ou, se ausente, extrai do PDF e armazena.
+
+        Args:
+            pdf_bytes: Conteúdo do arquivo PDF.
+            link: Link de origem do PDF, registrado como apelido para o hash.
+        """
+        pdf_hash = self.pdf_hash(pdf_bytes)
+        text = self.get_by_hash(pdf_hash)
+        if text is None:
+            text = extract_text_from_pdf_bytes(pdf_bytes)
+            if text.strip():
+                self.put_by_hash(pdf_hash, text)
+        if link and text.strip():
+            self.remember_link(link, pdf_hash)
+        return text
+
+
+def get_bula_text_cache() -> BulaTextCache:
+    global _bula_text_cache
+    if _bula_text_cache is None:
+        with _cache_lock:
+            if _bula_text_cache is None:
+                store = SqliteLRUCache(
+                    settings.BULA_TEXT_CACHE_PATH,
+                    max_bytes=settings.BULA_TEXT_CACHE_MAX_BYTES,
+                    ttl_seconds=settings.BULA_TEXT_CACHE_TTL_SECONDS,
+                )
+                _bula_text_cache = BulaTextCache(store, link_ttl_seconds=settings.BULA_LINK_ALIAS_TTL_SECONDS)
+    return _bula_text_cache
+
+
+def get_extraction_service() -> PdfExtractionService:
+    global _extraction_service
+    if _extraction_service is None:
+        with _cache_lock:
+            if _extraction_service is None:
+                _extraction_service = PdfExtractionService(
+                    max_workers=settings.PDF_EXTRACTION_WORKERS,
+                    timeout_seconds=settings.PDF_EXTRACTION_TIMEOUT_SECONDS,
+                    max_pages=settings.PDF_MAX_PAGES,
+                    max_pdf_bytes=settings.PDF_MAX_BYTES,
+                    memory_limit_mb=settings.PDF_WORKER_MEMORY_LIMIT_MB,
+                )
+    return _extraction_service
+
+
+async def extract_bula_text_async(pdf_bytes: bytes, link: str | None = None) -> str:
+    """Extrai o texto da bula nos processos de extração, reaproveitando o cache quando possível."""
+    return await get_bula_text_cache().get_or_extract_async(pdf_bytes, get_extraction_service(), link)
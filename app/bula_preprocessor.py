@@ -0,0 +1,201 @@
+# app/bula_preprocessor.py
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List
+
+from .rate_limiter import AdaptiveRateLimiter
+
+# Seções das bulas no padrão da ANVISA (versões para o paciente e para o profissional),
+# reconhecidas pelo título sem acentos e em minúsculas. A ordem define a saída.
+SECTION_PATTERNS = [
+    ("identificacao", "IDENTIFICAÇÃO DO MEDICAMENTO", r"identificacao do (medicamento|produto)"),
+    ("apresentacoes", "APRESENTAÇÕES", r"apresentac(oes|ao)"),
+    ("composicao", "COMPOSIÇÃO", r"composicao"),
+    ("indicacoes", "INDICAÇÕES", r"(para que (este|esse) medicamento e indicado|indicac(oes|ao))"),
+    ("resultados_eficacia", "RESULTADOS DE EFICÁCIA", r"resultados de eficacia"),
+    ("funcionamento", "COMO FUNCIONA", r"(como (este|esse) medicamento funciona|caracteristicas farmacologicas)"),
+    ("contraindicacoes", "CONTRAINDICAÇÕES", r"(quando nao devo usar (este|esse) medicamento|contraindicac(oes|ao))"),
+    ("advertencias", "ADVERTÊNCIAS E PRECAUÇÕES", r"(o que devo saber antes de usar (este|esse) medicamento|advertencias e precaucoes)"),
+    ("interacoes", "INTERAÇÕES MEDICAMENTOSAS", r"interacoes medicamentosas"),
+    ("armazenamento", "ARMAZENAMENTO", r"(onde,? como e por quanto tempo posso guardar|cuidados de armazenamento)"),
+    ("posologia", "POSOLOGIA E MODO DE USAR", r"(como devo usar (este|esse) medicamento|posologia e modo de usar)"),
+    ("esquecimento", "ESQUECIMENTO DE DOSE", r"o que devo fazer quando eu me esquecer"),
+    ("reacoes_adversas", "REAÇÕES ADVERSAS", r"(quais os males que (este|esse) medicamento pode me causar|reacoes adversas)"),
+    ("superdose", "SUPERDOSE", r"(o que fazer se alguem usar uma quantidade maior|superdose)"),
+    ("dizeres_legais", "DIZERES LEGAIS", r"dizeres legais"),
+    ("historico", "HISTÓRICO DE ALTERAÇÃO", r"historico de alterac(ao|oes) (da|de) bula"),
+]
+_HEADING_REGEXES = [(key, title, re.compile(rf"^(\d+\s*[.)\-–]?\s*)?{pattern}\b")) for key, title, pattern in SECTION_PATTERNS]
+SECTION_TITLES = {key: title for key, title, _ in SECTION_PATTERNS}
+
+# Seções descartadas por não ajudarem na geração do conteúdo.
+BOILERPLATE_SECTIONS = {"resultados_eficacia", "historico"}
+# Dos dizeres legais, apenas as linhas com registro e fabricante são mantidas.
+_LEGAL_LINE_PATTERN = re.compile(r"(reg(istro|\.)?\s*m\.?\s*s|m\.s\.|fabricad|registrad|farm\.? resp|cnpj|importad|embalad)", re.IGNORECASE)
+_PAGE_NUMBER_PATTERN = re.compile(r"^\s*(p[aá]g(ina)?\.?\s*)?\d{1,3}(\s*(de|/)\s*\d{1,3})?\s*$", re.IGNORECASE)
+_MAX_HEADING_LENGTH = 120
+_MIN_SECTION_TOKENS = 32
+
+# Ordem de prioridade das seções quando o orçamento de tokens não comporta todas.
+SECTION_PRIORITY = [
+    "indicacoes", "posologia", "contraindicacoes", "funcionamento", "composicao", "apresentacoes",
+    "identificacao", "dizeres_legais", "advertencias", "reacoes_adversas", "interacoes",
+    "armazenamento", "superdose", "esquecimento",
+]
+
+
+estimate_tokens = AdaptiveRateLimiter.estimate_tokens
+
+
+def _normalize_heading(line: str) -> str:
+    line = unicodedata.normalize("NFKD", line)
+    line = "".join(char for char in line if not unicodedata.combining(char))
+    return " ".join(line.lower().split())
+
+
+def normalize_bula_text(text: str) -> str:
+    """
+    Limpa o texto extraído do PDF: junta palavras hifenizadas na quebra de linha,
+    remove números de página e cabeçalhos/rodapés repetidos, e colapsa espaços.
+    """
+    text = text.replace("\r\n", "\n").replace("\r", "\n").replace("­", "")
+    text = re.sub(r"(\w)-\n\s*(\w)", r"\1\2", text)
+    lines = [" ".join(line.split()) for line in text.split("\n")]
+
+    # Linhas curtas que se repetem muitas vezes são cabeçalhos ou rodapés de página.
+    counts = Counter(line for line in lines if line and len(line) <= 80)
+    repeated = {line for line, count in counts.items() if count >= 3 and not _is_heading(line)}
+
+    cleaned = []
+    for line in lines:
+        if not line or line in repeated or _PAGE_NUMBER_PATTERN.match(line):
+            continue
+        # Continuação de frase quebrada pela diagramação do PDF.
+        if cleaned and line[0].islower() and not _is_heading(cleaned[-1]):
+            cleaned[-1] = f"{cleaned[-1]} {line}"
+        else:
+            cleaned.append(line)
+    return "\n".join(cleaned)
+
+
+def _split_after_normalized(line: str, normalized_length: int) -> tuple[str, str]:
+    """Divide a linha original no ponto que corresponde a `normalized_length` caracteres de _normalize_heading(line)."""
+    consumed = 0
+    for index, char in enumerate(line):
+        if consumed >= normalized_length:
+            return line[:index], line[index:]
+        consumed += len(_normalize_heading(char)) or (1 if char.isspace() else 0)
+    return line, ""
+
+
+def _match_section(line: str) -> tuple[str, str] | None:
+    """
+    Reconhece a linha que abre uma seção da bula. Só contam linhas com forma de
+    título: numeradas, em maiúsculas, em forma de pergunta ou apenas com o título;
+    frases que começam com o nome de uma seção ("Superdose pode causar...") são conteúdo.
+
+    Returns:
+        (chave da seção, texto que segue o título na mesma linha), ou None.
+    """
+    if len(line) > _MAX_HEADING_LENGTH:
+        return None
+    normalized = _normalize_heading(line)
+    for key, _, regex in _HEADING_REGEXES:
+        match = regex.match(normalized)
+        if not match:
+            continue
+        heading, rest = _split_after_normalized(line, match.end())
+        numbered = match.group(1) is not None
+        upper_case = any(char.isalpha() for char in heading) and heading == heading.upper()
+        question = rest.lstrip().startswith("?")
+        content = rest.lstrip(" ?:.-–")
+        if numbered or upper_case or question or not content:
+            return key, content
+        return None
+    return None
+
+
+def _is_heading(line: str) -> bool:
+    return _match_section(line) is not None
+
+
+@dataclass
+class PreparedBula:
+    """Bula normalizada e segmentada nas seções padrão da ANVISA."""
+    original_tokens: int
+    preamble: str = ""
+    sections: Dict[str, str] = field(default_factory=dict)
+
+    def fit(self, token_budget: int, priority: List[str] | None = None) -> str:
+        """
+        Monta o texto da bula dentro do orçamento de tokens: as seções entram por
+        ordem de prioridade (a última que não couber é cortada no fim de uma frase)
+        e são apresentadas na ordem padrão da bula.
+
+        Args:
+            token_budget: Máximo de tokens estimados; 0 ou negativo desativa o limite.
+            priority: Ordem de prioridade das seções (padrão: SECTION_PRIORITY).
+        """
+        if not self.sections:
+            return _truncate(self.preamble, token_budget)
+
+        chosen: Dict[str, str] = {}
+        remaining = token_budget if token_budget > 0 else float("inf")
+        for key in priority or SECTION_PRIORITY:
+            content = self.sections.get(key)
+            if not content or remaining <= 0:
+                continue
+            block = f"## {SECTION_TITLES[key]}\n{content}"
+            if estimate_tokens(block) > remaining:
+                # Um trecho muito curto da seção não acrescenta informação útil.
+                if remaining < _MIN_SECTION_TOKENS:
+                    continue
+                block = _truncate(block, int(remaining))
+            chosen[key] = block
+            remaining -= estimate_tokens(block) + 1
+        return "\n\n".join(chosen[key] for key, _, _ in SECTION_PATTERNS if key in chosen)
+
+
+def _truncate(text: str, token_budget: int) -> str:
+    if token_budget <= 0 or estimate_tokens(text) <= token_budget:
+        return text
+    cut = text[:token_budget * AdaptiveRateLimiter.CHARS_PER_TOKEN]
+    sentence_end = max(cut.rfind(". "), cut.rfind(".\n"))
+    return cut[:sentence_end + 1] if sentence_end > len(cut) // 2 else cut
+
+
+@lru_cache(maxsize=128)
+def preprocess_bula(text: str) -> PreparedBula:
+    """
+    Normaliza e segmenta o texto da bula. O resultado é memorizado, pois a mesma
+    bula é usada pelo gerador, pelo refinador e pelo fallback de um mesmo produto.
+    """
+    normalized = normalize_bula_text(text or "")
+    prepared = PreparedBula(original_tokens=estimate_tokens(text or ""))
+    preamble, current_key, buffers = [], None, {}
+    for line in normalized.split("\n"):
+        section = _match_section(line)
+        if section is not None:
+            current_key, line = section
+            buffers.setdefault(current_key, [])
+            if not line:
+                continue
+        (buffers[current_key] if current_key else preamble).append(line)
+
+    prepared.preamble = "\n".join(preamble)
+    for key, lines in buffers.items():
+        if key in BOILERPLATE_SECTIONS:
+            continue
+        if key == "dizeres_legais":
+            lines = [line for line in lines if _LEGAL_LINE_PATTERN.search(line)]
+        # Bulas com as versões do paciente e do profissional repetem parágrafos.
+        content = "\n".join(dict.fromkeys(line for line in lines if line))
+        if content:
+            prepared.sections[key] = content
+    # O preâmbulo (nome, fabricante) só é útil quando não há identificação própria.
+    if prepared.sections and prepared.preamble and "identificacao" not in prepared.sections:
+        prepared.sections["identificacao"] = prepared.preamble
+    return prepared
@@ -0,0 +1,117 @@
+# app/cache_store.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+class SqliteLRUCache:
+    """
+    Cache persistente chave/valor em SQLite, com expiração por TTL e
+    despejo LRU (menos recentemente usado) quando o tamanho total ultrapassa o limite.
+
+    Pode ser compartilhado entre threads; cada instância mantém contadores de
+    acertos (hits) e faltas (misses) desde a sua criação.
+    """
+    def __init__(self, db_path: str, max_bytes: int, ttl_seconds: float | None = None):
+        """
+        Args:
+            db_path: Caminho do arquivo SQLite (o diretório é criado se não existir).
+            max_bytes: Tamanho máximo somado dos valores armazenados.
+            ttl_seconds: Tempo de vida de cada entrada. None desativa a expiração.
+        """
+        self.db_path = str(db_path)
+        self.max_bytes = int(max_bytes)
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+
+    def get(self, key: str) -> bytes | None:
+        """Retorna o valor armazenado para a chave, ou None se ausente/expirado."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            value, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return bytes(value)
+
+    def put(self, key: str, value: bytes):
+        """Armazena o valor e despeja as entradas mais antigas se o limite de tamanho for excedido."""
+        size = len(value)
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), size, now, now),
+            )
+            self._evict()
+
+    def _evict(self):
+        """Remove entradas expiradas e, depois, as menos usadas até caber no limite. Requer o lock."""
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+
+        total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+
+        bytes_to_free = total_size - self.max_bytes
+        keys_to_delete = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_access ASC"):
+            keys_to_delete.append((key,))
+            bytes_to_free -= size
+            if bytes_to_free <= 0:
+                break
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", keys_to_delete)
+
+    def stats(self) -> dict:
+        """Contadores de uso e ocupação atual do cache."""
+        with self._lock:
+            entries, total_size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": total_size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+def make_response_cache_key(model_name: str, prompt_name: str, prompt_version: str, prompt_text: str) -> str:
+    """
+    Chave endereçada por conteúdo para respostas do LLM: modelo + nome/versão do
+    template + hash do prompt renderizado.
+    """
+    prompt_hash = hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()
+    return f"{model_name}:{prompt_name}:{prompt_version}:{prompt_hash}"
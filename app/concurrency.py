@@ -0,0 +1,85 @@
+# app/concurrency.py
+import asyncio
+import json
+from typing import AsyncIterator, Callable, Iterable, AsyncGenerator
+
+# Sentinela interna usada para sinalizar que um worker terminou.
+_WORKER_DONE = object()
+
+
+def tag_sse_event(event_chunk: str, **tags) -> str:
+    """
+    Adiciona campos extras (ex: sku) ao payload JSON de um evento SSE já formatado.
+    Eventos cujo payload não é um objeto JSON são devolvidos sem alteração.
+    """
+    if "data: " not in event_chunk:
+        return event_chunk
+
+    header, data_str = event_chunk.split("data: ", 1)
+    try:
+        data = json.loads(data_str)
+    except json.JSONDecodeError:
+        return event_chunk
+    if not isinstance(data, dict):
+        return event_chunk
+
+    data.update(tags)
+    return f"{header}data: {json.dumps(data)}\n\n"
+
+
+async def run_bounded_streams(
+    stream_factories: Iterable[Callable[[], AsyncIterator[str]]],
+    max_concurrency: int,
+    queue_size: int = 100,
+) -> AsyncGenerator[str, None]:
+    """
+    Executa vários geradores assíncronos de eventos com um número máximo de
+    execuções simultâneas e intercala seus eventos em um único fluxo.
+
+    Args:
+        stream_factories: Funções que criam o gerador de eventos de cada item.
+            São consumidas sob demanda, na ordem, pelos workers.
+        max_concurrency: Quantidade máxima de geradores ativos ao mesmo tempo.
+        queue_size: Tamanho da fila de saída (aplica contrapressão aos workers).
+
+    Yields:
+        Os eventos de todos os geradores, na ordem em que forem produzidos.
+    """
+    factories = iter(stream_factories)
+    output_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    worker_count = max(1, int(max_concurrency))
+
+    async def _worker():
+        error = None
+        try:
+            # O iterador é compartilhado: cada worker pega o próximo item livre.
+            for factory in factories:
+                async for event_chunk in factory():
+                    await output_queue.put(event_chunk)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = e
+        await output_queue.put(_WORKER_DONE)
+        if error is not None:
+            raise error
+
+    workers = [asyncio.create_task(_worker()) for _ in range(worker_count)]
+    try:
+        finished_workers = 0
+        while finished_workers < worker_count:
+            event_chunk = await output_queue.get()
+            if event_chunk is _WORKER_DONE:
+                finished_workers += 1
+                continue
+            yield event_chunk
+
+        # Propaga exceções inesperadas levantadas por algum worker.
+        for worker in workers:
+            worker.result()
+    finally:
+        # Se o cliente desconectar, interrompe todos os pipelines em andamento.
+        for worker in workers:
+            if not worker.done():
+                worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
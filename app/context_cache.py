@@ -0,0 +1,215 @@
+# app/context_cache.py
+import itertools
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from google.genai import types as genai_types
+
+from .prompt_manager import PromptPrefix
+from .rate_limiter import AdaptiveRateLimiter
+
+DISPLAY_NAME_PREFIX = "pharmaboost"
+
+
+@dataclass
+class CachedPrefixHandle:
+    """Conteúdo em cache no Gemini correspondente a uma versão do prefixo de um prompt."""
+    name: str
+    prefix_version: str
+    expires_at: float  # time.time()
+
+
+def _expire_timestamp(cached_content, fallback_ttl_seconds: float) -> float:
+    expire_time = getattr(cached_content, "expire_time", None)
+    if isinstance(expire_time, datetime):
+        if expire_time.tzinfo is None:
+            expire_time = expire_time.replace(tzinfo=timezone.utc)
+        return expire_time.timestamp()
+    return time.time() + fallback_ttl_seconds
+
+
+class ContextCacheManager:
+    """
+    Mantém um conteúdo em cache (explicit context caching do Gemini) para o prefixo
+    fixo de cada prompt, para que as instruções não sejam reenviadas e cobradas
+    integralmente a cada chamada.
+
+    - Criação sob demanda, na primeira chamada do prompt; caches de outro processo
+      com o mesmo display_name (modelo, prompt e versão do prefixo) são reaproveitados.
+    - O TTL é renovado quando o prompt é usado perto da expiração: caches de prompts
+      que deixaram de ser usados expiram sozinhos.
+    - Quando o hash do prefixo muda (YAML alterado), o cache antigo é apagado e um
+      novo é criado.
+    - Prefixos menores que o mínimo aceito pela API não são cacheados, e uma falha
+      na criação suspende novas tentativas daquele prompt por `retry_after_failure` segundos.
+    Em todos os casos em que não há cache disponível, a chamada segue com o prompt completo.
+    """
+    def __init__(self, caches_api, model: str, ttl_seconds: float = 3600, refresh_margin_seconds: float = 300,
+                 min_tokens: int = 1024, retry_after_failure: float = 300):
+        """
+        Args:
+            caches_api: `client.caches` do SDK genai (ou InMemoryCachesApi, em testes).
+            model: Modelo das chamadas; o cache é vinculado a ele.
+        """
+        self.caches_api = caches_api
+        self.model = model
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = min(refresh_margin_seconds, ttl_seconds / 2)
+        self.min_tokens = min_tokens
+        self.retry_after_failure = retry_after_failure
+        self._handles: dict[str, CachedPrefixHandle] = {}
+        self._failed_until: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _display_name(self, prefix: PromptPrefix) -> str:
+        return f"{DISPLAY_NAME_PREFIX}:{self.model.split('/')[-1]}:{prefix.prompt_name}:{prefix.version}"
+
+    def _ttl(self) -> str:
+        return f"{int(self.ttl_seconds)}s"
+
+    def is_cacheable(self, prefix: PromptPrefix | None) -> bool:
+        return prefix is not None and AdaptiveRateLimiter.estimate_tokens(prefix.text) >= self.min_tokens
+
+    def peek(self, prefix: PromptPrefix) -> str | None:
+        """Nome do cache, se já existir e não precisar de renovação (sem chamadas à API)."""
+        handle = self._handles.get(prefix.prompt_name)
+        if handle and handle.prefix_version == prefix.version and time.time() < handle.expires_at - self.refresh_margin_seconds:
+            return handle.name
+        return None
+
+    def get_handle(self, prefix: PromptPrefix | None) -> str | None:
+        """Nome do conteúdo em cache para o prefixo (criando ou renovando se preciso), ou None."""
+        if not self.is_cacheable(prefix):
+            return None
+        name = self.peek(prefix)
+        if name is not None:
+            return name
+        with self._lock:
+            name = self.peek(prefix)
+            if name is not None:
+                return name
+            if time.time() < self._failed_until.get(prefix.prompt_name, 0):
+                return None
+            try:
+                return self._ensure_handle(prefix)
+            except Exception as e:
+                print(f"CONTEXT CACHE: Falha ao preparar o cache do prompt '{prefix.prompt_name}': {e}. Usando o prompt completo.")
+                self._handles.pop(prefix.prompt_name, None)
+                self._failed_until[prefix.prompt_name] = time.time() + self.retry_after_failure
+                return None
+
+    def _ensure_handle(self, prefix: PromptPrefix) -> str:
+        handle = self._handles.get(prefix.prompt_name)
+        now = time.time()
+        if handle is not None and handle.prefix_version != prefix.version:
+            print(f"CONTEXT CACHE: Prefixo do prompt '{prefix.prompt_name}' mudou ({handle.prefix_version} -> {prefix.version}). Recriando o cache.")
+            self._delete_quietly(handle.name)
+            handle = None
+        if handle is not None and now < handle.expires_at:
+            try:
+                updated = self.caches_api.update(name=handle.name, config=genai_types.UpdateCachedContentConfig(ttl=self._ttl()))
+                handle.expires_at = _expire_timestamp(updated, self.ttl_seconds)
+                return handle.name
+            except Exception as e:
+                # O cache pode ter sido apagado fora da aplicação: cria outro.
+                print(f"CONTEXT CACHE: Não foi possível renovar o cache {handle.name}: {e}")
+
+        cached = self._find_existing(prefix) or self.caches_api.create(
+            model=self.model,
+            config=genai_types.CreateCachedContentConfig(
+                display_name=self._display_name(prefix),
+                contents=[genai_types.Content(role="user", parts=[genai_types.Part(text=prefix.text)])],
+                ttl=self._ttl(),
+            ),
+        )
+        handle = CachedPrefixHandle(cached.name, prefix.version, _expire_timestamp(cached, self.ttl_seconds))
+        if handle.expires_at - time.time() <= self.refresh_margin_seconds:
+            updated = self.caches_api.update(name=handle.name, config=genai_types.UpdateCachedContentConfig(ttl=self._ttl()))
+            handle.expires_at = _expire_timestamp(updated, self.ttl_seconds)
+        self._handles[prefix.prompt_name] = handle
+        print(f"CONTEXT CACHE: Prefixo do prompt '{prefix.prompt_name}' (versão {prefix.version}) em cache: {handle.name}.")
+        return handle.name
+
+    def _find_existing(self, prefix: PromptPrefix):
+        """Cache do mesmo prefixo criado por outro processo (ou antes de um reinício)."""
+        display_name = self._display_name(prefix)
+        try:
+            for cached in self.caches_api.list():
+                if cached.display_name == display_name and _expire_timestamp(cached, 0) > time.time():
+                    return cached
+        except Exception as e:
+            print(f"CONTEXT CACHE: Não foi possível listar os caches existentes: {e}")
+        return None
+
+    def _delete_quietly(self, name: str):
+        try:
+            self.caches_api.delete(name=name)
+        except Exception as e:
+            print(f"CONTEXT CACHE: Não foi possível apagar o cache {name}: {e}")
+
+    def invalidate(self, prompt_name: str):
+        """Descarta o cache do prompt (ex: a API informou que ele não existe mais)."""
+        with self._lock:
+            handle = self._handles.pop(prompt_name, None)
+        if handle is not None:
+            print(f"CONTEXT CACHE: Cache do prompt '{prompt_name}' invalidado ({handle.name}).")
+
+
+class InMemoryCachesApi:
+    """
+    Substituto local de `client.caches` (create/update/delete/list/get), com
+    expiração pelo TTL. Permite exercitar o ContextCacheManager sem a API real.
+    """
+    def __init__(self):
+        self._items: dict[str, genai_types.CachedContent] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.calls = {"create": 0, "update": 0, "delete": 0, "list": 0}
+
+    @staticmethod
+    def _expire_time(ttl: str | None) -> datetime:
+        seconds = float((ttl or "3600s").rstrip("s"))
+        return datetime.now(timezone.utc) + timedelta(seconds=seconds)
+
+    def _purge(self):
+        now = datetime.now(timezone.utc)
+        for name in [name for name, item in self._items.items() if item.expire_time <= now]:
+            del self._items[name]
+
+    def create(self, *, model: str, config: genai_types.CreateCachedContentConfig):
+        with self._lock:
+            self.calls["create"] += 1
+            name = f"cachedContents/local-{next(self._ids)}"
+            self._items[name] = genai_types.CachedContent(
+                name=name, display_name=config.display_name, model=model, expire_time=self._expire_time(config.ttl),
+            )
+            return self._items[name]
+
+    def get(self, *, name: str):
+        with self._lock:
+            self._purge()
+            if name not in self._items:
+                raise KeyError(f"Cache {name} não encontrado.")
+            return self._items[name]
+
+    def update(self, *, name: str, config: genai_types.UpdateCachedContentConfig):
+        with self._lock:
+            self.calls["update"] += 1
+            self._purge()
+            if name not in self._items:
+                raise KeyError(f"Cache {name} não encontrado.")
+            self._items[name].expire_time = self._expire_time(config.ttl)
+            return self._items[name]
+
+    def delete(self, *, name: str):
+        with self._lock:
+            self.calls["delete"] += 1
+            self._items.pop(name, None)
+
+    def list(self, **kwargs):
+        with self._lock:
+            self.calls["list"] += 1
+            self._purge()
+            return list(self._items.values())
@@ -0,0 +1,120 @@
+# app/credential_pool.py
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, List
+
+from .context_cache import ContextCacheManager
+from .rate_limiter import AdaptiveRateLimiter
+
+
+@dataclass
+class PooledCredential:
+    """Uma chave da API com o seu cliente, o seu limitador de cota e o seu cache de contexto."""
+    key_id: str  # Rótulo para logs e métricas (a chave em si nunca é exibida).
+    client: Any  # genai.Client
+    rate_limiter: AdaptiveRateLimiter
+    # Conteúdos em cache pertencem ao projeto da chave que os criou.
+    context_cache: ContextCacheManager | None = None
+    quarantined_until: float = 0.0  # time.monotonic()
+    quarantines: int = 0
+
+
+class CredentialPool:
+    """
+    Distribui as chamadas entre várias chaves (ou projetos) do Gemini, cada uma com
+    a sua própria cota, para que a vazão total cresça com o número de chaves.
+
+    Cada chamada vai para a chave com mais folga no limitador (AdaptiveRateLimiter.headroom).
+    Uma chave que responde 429 (ResourceExhausted) fica de quarentena, fora do
+    rodízio, até o prazo terminar; se todas estiverem em quarentena, a chamada
+    espera a primeira sair da quarentena. Com uma única chave, o comportamento é o
+    do limitador sozinho (que já pausa após um 429).
+    """
+    # Sem notificação entre limitadores diferentes, a espera por uma vaga é feita em fatias curtas.
+    POLL_INTERVAL = 0.25
+
+    def __init__(self, credentials: List[PooledCredential], quarantine_seconds: float = 60.0):
+        if not credentials:
+            raise ValueError("O pool de credenciais precisa de pelo menos uma chave.")
+        self.credentials = credentials
+        self.quarantine_seconds = quarantine_seconds
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.credentials)
+
+    def _quarantine_wait(self) -> float:
+        """Segundos até alguma chave sair da quarentena (0 se já houver uma disponível)."""
+        now = time.monotonic()
+        with self._lock:
+            return max(0.0, min(credential.quarantined_until for credential in self.credentials) - now)
+
+    def _candidates(self) -> List[PooledCredential]:
+        """Chaves fora de quarentena, da maior para a menor folga."""
+        now = time.monotonic()
+        with self._lock:
+            available = [credential for credential in self.credentials if credential.quarantined_until <= now]
+        return sorted(available, key=lambda credential: credential.rate_limiter.headroom(), reverse=True)
+
+    def _try_acquire(self, tokens: int) -> tuple[PooledCredential | None, float]:
+        wait_time = float("inf")
+        for credential in self._candidates():
+            credential_wait = credential.rate_limiter.try_acquire(tokens)
+            if credential_wait <= 0:
+                return credential, 0.0
+            wait_time = min(wait_time, credential_wait)
+        return None, wait_time
+
+    def acquire(self, tokens: int = 1) -> PooledCredential:
+        """Bloqueia até reservar uma vaga em alguma chave e devolve a chave escolhida."""
+        if len(self.credentials) == 1:
+            self.credentials[0].rate_limiter.acquire(tokens)
+            return self.credentials[0]
+        while True:
+            quarantine_wait = self._quarantine_wait()
+            if quarantine_wait > 0:
+                time.sleep(quarantine_wait)
+                continue
+            credential, wait_time = self._try_acquire(tokens)
+            if credential is not None:
+                return credential
+            time.sleep(min(wait_time, self.POLL_INTERVAL))
+
+    async def acquire_async(self, tokens: int = 1) -> PooledCredential:
+        """Versão não bloqueante de acquire()."""
+        if len(self.credentials) == 1:
+            await self.credentials[0].rate_limiter.acquire_async(tokens)
+            return self.credentials[0]
+        while True:
+            quarantine_wait = self._quarantine_wait()
+            if quarantine_wait > 0:
+                await asyncio.sleep(quarantine_wait)
+                continue
+            credential, wait_time = self._try_acquire(tokens)
+            if credential is not None:
+                return credential
+            await asyncio.sleep(min(wait_time, self.POLL_INTERVAL))
+
+    def quarantine(self, credential: PooledCredential, retry_after: float | None = None):
+        """Tira a chave do rodízio por `quarantine_seconds` (ou pela dica do servidor, se for maior)."""
+        duration = max(self.quarantine_seconds, retry_after or 0.0)
+        with self._lock:
+            credential.quarantined_until = max(credential.quarantined_until, time.monotonic() + duration)
+            credential.quarantines += 1
+        if len(self.credentials) > 1:
+            print(f"CREDENTIAL POOL: Chave {credential.key_id} em quarentena por {duration:.0f}s após 429.")
+
+    def snapshot(self) -> dict:
+        """Estado do limitador de cada chave, com a folga e o tempo restante de quarentena."""
+        now = time.monotonic()
+        return {
+            credential.key_id: {
+                **credential.rate_limiter.snapshot(),
+                "headroom": round(credential.rate_limiter.headroom(), 3),
+                "quarantined_for_seconds": round(max(0.0, credential.quarantined_until - now), 2),
+                "quarantines": credential.quarantines,
+            }
+            for credential in self.credentials
+        }
@@ -0,0 +1,142 @@
+# app/excel_export.py
+import io
+import tempfile
+from typing import Any, Callable, Dict, Iterable, Iterator, IO
+
+import openpyxl
+
+from .sku_index import column_positions, normalize_sku
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# Arquivos até este tamanho ficam em memória; acima disso vão para um arquivo temporário.
+SPOOL_MAX_MEMORY_BYTES = 16 * 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _rewrite_workbook(source_bytes: bytes, key_column: str, required_columns: Iterable[str],
+                      process_row: Callable[[list, str, Dict[Any, int]], list | None], sheet_title: str | None = None) -> IO[bytes]:
+    """
+    Copia a planilha linha a linha de um leitor read_only para um workbook
+    write_only do openpyxl, sem manter as duas planilhas inteiras em memória.
+
+    Args:
+        source_bytes: Planilha original (.xlsx).
+        key_column: Nome da coluna com o SKU de cada linha.
+        required_columns: Colunas que precisam existir no cabeçalho.
+        process_row: Recebe (linha, SKU normalizado, mapa coluna -> índice, montado
+            uma vez por planilha) e devolve a linha a ser escrita, ou None para descartá-la.
+        sheet_title: Nome da aba gerada (padrão: o da aba original).
+
+    Returns:
+        Um arquivo temporário (posicionado no início) com o .xlsx gerado.
+
+    Raises:
+        ValueError: Se a coluna-chave ou alguma coluna obrigatória não existir.
+    """
+    source = openpyxl.load_workbook(io.BytesIO(source_bytes), read_only=True)
+    try:
+        source_sheet = source.active
+        rows = source_sheet.iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        positions = column_positions(header)
+        for column in [key_column, *required_columns]:
+            if column not in positions:
+                raise ValueError(column)
+        key_idx = positions[key_column]
+
+        target = openpyxl.Workbook(write_only=True)
+        target_sheet = target.create_sheet(title=sheet_title or source_sheet.title)
+        target_sheet.append(header)
+        for row in rows:
+            row = list(row) + [None] * (len(header) - len(row))
+            row = process_row(row, normalize_sku(row[key_idx]), positions)
+            if row is not None:
+                target_sheet.append(row)
+    finally:
+        source.close()
+
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY_BYTES)
+    target.save(output)
+    output.seek(0)
+    return output
+
+
+def build_updated_workbook(source_bytes: bytes, updates: Dict[str, Dict[str, Any]], key_column: str) -> IO[bytes]:
+    """
+    Gera, em streaming, uma cópia da planilha com as células atualizadas.
+
+    Args:
+        source_bytes: Planilha original (.xlsx).
+        updates: Mapa de SKU normalizado -> {nome da coluna: novo valor}.
+        key_column: Nome da coluna usada para localizar as linhas.
+
+    Raises:
+        ValueError: Se a coluna-chave ou alguma coluna a ser atualizada não existir.
+    """
+    update_columns = sorted({column for values in updates.values() for column in values})
+    pending = dict(updates)
+
+    def apply_updates(row: list, sku: str, positions: Dict[Any, int]) -> list:
+        # Apenas a primeira linha de cada SKU é atualizada, como em update_workbook_in_place.
+        for column, value in pending.pop(sku, {}).items():
+            row[positions[column]] = value
+        return row
+
+    return _rewrite_workbook(source_bytes, key_column, update_columns, apply_updates)
+
+
+def update_workbook_in_place(source_bytes: bytes, updates: Dict[str, Dict[str, Any]], key_column: str) -> IO[bytes]:
+    """
+    Atualiza as células no próprio workbook carregado por completo, preservando as
+    demais abas, estilos, larguras de coluna e formatos numéricos. Usado quando o
+    arquivo volta inteiro na resposta (base64); o streaming de build_updated_workbook
+    fica para os downloads binários.
+
+    Raises:
+        ValueError: Se a coluna-chave ou alguma coluna a ser atualizada não existir.
+    """
+    workbook = openpyxl.load_workbook(io.BytesIO(source_bytes))
+    sheet = workbook.active
+    positions = column_positions(cell.value for cell in sheet[1])
+    update_columns = sorted({column for values in updates.values() for column in values})
+    for column in [key_column, *update_columns]:
+        if column not in positions:
+            raise ValueError(column)
+    # Colunas do openpyxl começam em 1.
+    column_numbers = {column: positions[column] + 1 for column in update_columns}
+    key_column_number = positions[key_column] + 1
+
+    pending = dict(updates)
+    for (key_cell,) in sheet.iter_rows(min_row=2, min_col=key_column_number, max_col=key_column_number):
+        # Apenas a primeira linha de cada SKU é atualizada.
+        values = pending.pop(normalize_sku(key_cell.value), None)
+        if values is None:
+            continue
+        for column, value in values.items():
+            sheet.cell(row=key_cell.row, column=column_numbers[column]).value = value
+        if not pending:
+            break
+
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY_BYTES)
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def build_filtered_workbook(source_bytes: bytes, skus: Iterable[str], key_column: str, sheet_title: str) -> IO[bytes]:
+    """Gera, em streaming, uma planilha apenas com as linhas dos SKUs informados (já normalizados)."""
+    selected = set(skus)
+    return _rewrite_workbook(
+        source_bytes, key_column, [],
+        lambda row, sku, positions: row if sku in selected else None,
+        sheet_title=sheet_title,
+    )
+
+
+def iter_file_chunks(file_obj: IO[bytes], chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Lê o arquivo em blocos para uma StreamingResponse e o fecha ao final."""
+    try:
+        while chunk := file_obj.read(chunk_size):
+            yield chunk
+    finally:
+        file_obj.close()
@@ -0,0 +1,249 @@
+# app/gemini_batch.py
+import abc
+import asyncio
+import itertools
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterable, Callable, Dict, Iterator
+
+from google.genai import types as genai_types
+
+from config import settings
+from .agent_profiles import AgentProfile
+
+JOB_SUCCEEDED = "JOB_STATE_SUCCEEDED"
+JOB_PARTIALLY_SUCCEEDED = "JOB_STATE_PARTIALLY_SUCCEEDED"
+JOB_FAILED_STATES = {"JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+
+def build_batch_request(key: str, prompt_text: str, response_schema=None, profile: AgentProfile | None = None) -> Dict[str, Any]:
+    """Linha do arquivo de requisições da Batch API (uma chamada generateContent por linha)."""
+    request: Dict[str, Any] = {"contents": [{"role": "user", "parts": [{"text": prompt_text}]}]}
+    generation_config = profile.batch_generation_config() if profile is not None else {}
+    if response_schema is not None and settings.GEMINI_STRUCTURED_OUTPUT:
+        generation_config.update(
+            response_mime_type="application/json",
+            response_json_schema=response_schema.model_json_schema(),
+        )
+    if generation_config:
+        request["generation_config"] = generation_config
+    return {"key": key, "request": request}
+
+
+def extract_response_text(result: Dict[str, Any]) -> str | None:
+    """Texto da resposta de uma linha de resultado (None se a requisição falhou)."""
+    response = result.get("response")
+    if not isinstance(response, dict):
+        return None
+    for candidate in response.get("candidates") or []:
+        parts = (candidate.get("content") or {}).get("parts") or []
+        text = "".join(part.get("text", "") for part in parts if not part.get("thought"))
+        if text:
+            return text
+    return None
+
+
+class BatchService(abc.ABC):
+    """Interface do serviço de lotes: envia um arquivo de requisições e devolve os resultados."""
+
+    @abc.abstractmethod
+    def submit(self, requests_path: Path, display_name: str, model: str | None = None) -> str:
+        """Envia o arquivo JSONL de requisições (todas para o mesmo modelo) e retorna o nome do job."""
+
+    @abc.abstractmethod
+    def get_state(self, job_name: str) -> str:
+        """Estado do job (valores de google.genai.types.JobState)."""
+
+    @abc.abstractmethod
+    def iter_results(self, job_name: str) -> Iterator[Dict[str, Any]]:
+        """Linhas de resultado do job concluído: {"key", "response"} ou {"key", "error"}."""
+
+
+class GeminiBatchService(BatchService):
+    """Batch API do Gemini: o arquivo é enviado pela Files API e os resultados baixados ao final."""
+
+    def __init__(self, client, model: str = settings.DEFAULT_MODEL):
+        """
+        Args:
+            client: genai.Client já autenticado.
+        """
+        self.client = client
+        self.model = model
+
+    def submit(self, requests_path: Path, display_name: str, model: str | None = None) -> str:
+        uploaded = self.client.files.upload(
+            file=str(requests_path),
+            config=genai_types.UploadFileConfig(display_name=display_name, mime_type="jsonl"),
+        )
+        job = self.client.batches.create(
+            model=model or self.model,
+            src=uploaded.name,
+            config=genai_types.CreateBatchJobConfig(display_name=display_name),
+        )
+        return job.name
+
+    def get_state(self, job_name: str) -> str:
+        job = self.client.batches.get(name=job_name)
+        return job.state.name if hasattr(job.state, "name") else str(job.state)
+
+    def iter_results(self, job_name: str) -> Iterator[Dict[str, Any]]:
+        job = self.client.batches.get(name=job_name)
+        dest = job.dest
+        if dest is not None and dest.file_name:
+            content = self.client.files.download(file=dest.file_name)
+            for line in content.splitlines():
+                if line.strip():
+                    yield json.loads(line)
+        elif dest is not None and dest.inlined_responses:
+            for index, inlined in enumerate(dest.inlined_responses):
+                key = (inlined.metadata or {}).get("key", str(index))
+                if inlined.error is not None:
+                    yield {"key": key, "error": inlined.error.model_dump(mode="json")}
+                else:
+                    yield {"key": key, "response": inlined.response.model_dump(mode="json", exclude_none=True)}
+
+
+class LocalBatchService(BatchService):
+    """
+    Substituto local da Batch API: guarda os jobs em memória, fica "em execução"
+    por `completion_delay_seconds` e responde cada linha com `responder`.
+
+    Args:
+        responder: Função (texto do prompt, requisição) -> texto da resposta, ou None
+            para simular uma falha na linha. Ex: a chamada online do GeminiClient,
+            para rodar o modo offline sem acesso à Batch API, ou respostas fixas em testes.
+    """
+    def __init__(self, responder: Callable[[str, Dict[str, Any]], str | None], completion_delay_seconds: float = 0.0):
+        self.responder = responder
+        self.completion_delay_seconds = completion_delay_seconds
+        self._jobs: Dict[str, tuple[Path, float]] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, requests_path: Path, display_name: str, model: str | None = None) -> str:
+        with self._lock:
+            job_name = f"batches/local-{next(self._ids)}"
+            self._jobs[job_name] = (Path(requests_path), time.monotonic())
+        return job_name
+
+    def get_state(self, job_name: str) -> str:
+        if job_name not in self._jobs:
+            return "JOB_STATE_FAILED"
+        _, submitted_at = self._jobs[job_name]
+        return JOB_SUCCEEDED if time.monotonic() - submitted_at >= self.completion_delay_seconds else "JOB_STATE_RUNNING"
+
+    def iter_results(self, job_name: str) -> Iterator[Dict[str, Any]]:
+        requests_path, _ = self._jobs[job_name]
+        with open(requests_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                prompt_text = "".join(part.get("text", "") for part in entry["request"]["contents"][0]["parts"])
+                try:
+                    text = self.responder(prompt_text, entry["request"])
+                except Exception as e:
+                    yield {"key": entry["key"], "error": {"message": str(e)}}
+                    continue
+                if text is None:
+                    yield {"key": entry["key"], "error": {"message": "Sem resposta."}}
+                else:
+                    yield {"key": entry["key"], "response": {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}}
+
+
+class OfflineBatchRunner:
+    """
+    Executa etapas do pipeline como jobs da Batch API: grava o arquivo de
+    requisições no diretório de trabalho, envia, acompanha até a conclusão e
+    devolve o texto de cada resposta por chave.
+
+    O nome do job de cada etapa fica salvo no diretório; se o processo for
+    reiniciado no meio da espera, a mesma etapa se reconecta ao job já enviado
+    em vez de enviá-lo (e pagá-lo) de novo.
+    """
+    def __init__(self, service: BatchService, work_dir: Path, poll_interval: float = 60.0, timeout: float = 26 * 3600):
+        self.service = service
+        self.work_dir = Path(work_dir)
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+
+    def _job_file(self, stage: str) -> Path:
+        return self.work_dir / f"{stage}.job.json"
+
+    def _load_job(self, stage: str) -> str | None:
+        try:
+            job = json.loads(self._job_file(stage).read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return job.get("job_name")
+
+    async def _write_requests(self, stage: str, requests: AsyncIterable[tuple[str, str]], response_schema, profile: AgentProfile | None) -> tuple[Path, int]:
+        # As linhas vão direto para o disco: os prompts de um catálogo inteiro não ficam em memória.
+        path = self.work_dir / f"{stage}.requests.jsonl"
+        count = 0
+        with open(path, "w", encoding="utf-8") as f:
+            async for key, prompt_text in requests:
+                f.write(json.dumps(build_batch_request(key, prompt_text, response_schema, profile), ensure_ascii=False) + "\n")
+                count += 1
+        return path, count
+
+    async def run(self, stage: str, requests: AsyncIterable[tuple[str, str]], response_schema=None, on_status: Callable[[str], None] | None = None,
+                  profile: AgentProfile | None = None) -> Dict[str, str | None]:
+        """
+        Args:
+            stage: Nome da etapa (único dentro do diretório de trabalho).
+            requests: Pares (chave, prompt renderizado). O iterador é sempre consumido,
+                mesmo ao retomar um job já enviado.
+            response_schema: Modelo pydantic da saída estruturada, se houver.
+            on_status: Recebe mensagens de progresso (envio, estado do job).
+            profile: Perfil do agente (modelo do job e parâmetros de geração).
+
+        Returns:
+            {chave: texto da resposta, ou None se a linha falhou}.
+
+        Raises:
+            RuntimeError: Se o job terminar com falha.
+            TimeoutError: Se o job não terminar dentro de `timeout`.
+        """
+        notify = on_status or (lambda message: None)
+        job_name = self._load_job(stage)
+        if job_name is not None and await asyncio.to_thread(self.service.get_state, job_name) in JOB_FAILED_STATES:
+            job_name = None
+        if job_name is None:
+            requests_path, count = await self._write_requests(stage, requests, response_schema, profile)
+            if count == 0:
+                return {}
+            job_name = await asyncio.to_thread(self.service.submit, requests_path, f"pharmaboost-{self.work_dir.parent.name}-{stage}", profile.model if profile else None)
+            self._job_file(stage).write_text(json.dumps({"job_name": job_name, "requests": count}), encoding="utf-8")
+            notify(f"Etapa '{stage}': {count} requisições enviadas (job {job_name}).")
+        else:
+            async for _ in requests:
+                pass
+            notify(f"Etapa '{stage}': retomando o job já enviado {job_name}.")
+
+        started_at = time.monotonic()
+        while True:
+            state = await asyncio.to_thread(self.service.get_state, job_name)
+            if state in (JOB_SUCCEEDED, JOB_PARTIALLY_SUCCEEDED):
+                break
+            if state in JOB_FAILED_STATES:
+                self._job_file(stage).unlink(missing_ok=True)
+                raise RuntimeError(f"O job {job_name} da etapa '{stage}' terminou com estado {state}.")
+            if time.monotonic() - started_at > self.timeout:
+                raise TimeoutError(f"O job {job_name} da etapa '{stage}' não terminou em {self.timeout:.0f}s.")
+            notify(f"Etapa '{stage}': job {job_name} em andamento ({state}).")
+            await asyncio.sleep(self.poll_interval)
+
+        def collect() -> Dict[str, str | None]:
+            return {str(result.get("key")): extract_response_text(result) for result in self.service.iter_results(job_name)}
+        return await asyncio.to_thread(collect)
+
+    def clear(self):
+        """Apaga os arquivos das etapas (chamado quando a execução termina, para que uma nova não retome jobs antigos)."""
+        for path in self.work_dir.glob("*.job.json"):
+            path.unlink(missing_ok=True)
+        for path in self.work_dir.glob("*.requests.jsonl"):
+            path.unlink(missing_ok=True)
@@ -1,48 +1,253 @@
 # app/gemini_client.py (Versão Robusta)
+import asyncio
 import os
+import re
+import time
+import httpx
 from config import settings
 from google import genai
+from google.genai import errors as genai_errors
+from google.genai import types as genai_types
 from google.api_core import exceptions
 
+from .agent_profiles import AgentProfile
+from .context_cache import ContextCacheManager
+from .credential_pool import CredentialPool, PooledCredential
+from .metrics import AgentCallStats
+from .prompt_manager import PromptPrefix
+from .rate_limiter import AdaptiveRateLimiter
+
+def _extract_retry_delay(error: Exception) -> float | None:
+    """
+    Extrai a dica de espera enviada pelo servidor, seja pelo cabeçalho HTTP
+    Retry-After ou pelo detalhe google.rpc.RetryInfo (ex: "retryDelay": "23s").
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+
+    match = re.search(r"['\"]retryDelay['\"]\s*:\s*['\"](\d+(?:\.\d+)?)s['\"]", str(getattr(error, "details", "")))
+    if match:
+        return float(match.group(1))
+    return None
+
+def _is_missing_cache_error(error: Exception) -> bool:
+    """Erro da API indicando que o conteúdo em cache informado não existe mais (expirou ou foi apagado)."""
+    if not isinstance(error, genai_errors.APIError):
+        return False
+    return error.code == 404 or (error.code in (400, 403) and "cache" in str(error.message or error).lower())
+
+def _to_api_core_exception(error: genai_errors.APIError) -> Exception | None:
+    """Converte erros de cota/sobrecarga do SDK genai nas exceções tratadas pelos casos de uso."""
+    if error.code == 429:
+        return exceptions.ResourceExhausted(error.message or str(error))
+    if error.code == 503:
+        return exceptions.ServiceUnavailable(error.message or str(error))
+    return None
+
 class GeminiClient:
     """
     Uma classe wrapper para interagir com a API do Google Gemini,
     utilizando o padrão de cliente mais recente.
     """
-    def __init__(self):
+    def __init__(self, api_keys: list[str] | None = None):
         """
-        Inicializa o cliente Gemini. A API Key é carregada a partir
-        das configurações e passada diretamente para o cliente.
+        Inicializa o cliente Gemini. As chaves são carregadas a partir das
+        configurações (GEMINI_API_KEYS ou GEMINI_API_KEY); cada uma recebe o seu
+        próprio cliente, limitador de cota e cache de contexto (ver app/credential_pool.py).
         """
-        api_key = settings.API_KEY
-        if not api_key:
+        api_keys = api_keys or settings.API_KEYS
+        if not api_keys:
             raise ValueError("A variável de ambiente GEMINI_API_KEY não foi encontrada. Verifique seu arquivo .env.")
-        
-        self.client = genai.Client(api_key=api_key)
 
-    def execute_prompt(self, prompt_text: str, **kwargs) -> str:
+        self.pool = CredentialPool(
+            [self._build_credential(f"key-{index}", api_key) for index, api_key in enumerate(api_keys, start=1)],
+            quarantine_seconds=settings.GEMINI_KEY_QUARANTINE_SECONDS,
+        )
+        # Cliente da primeira chave, para as APIs que não passam pelo pool (ex: Batch API).
+        self.client = self.pool.credentials[0].client
+
+    @staticmethod
+    def _build_credential(key_id: str, api_key: str) -> PooledCredential:
+        client = genai.Client(api_key=api_key)
+        return PooledCredential(
+            key_id=key_id,
+            client=client,
+            rate_limiter=AdaptiveRateLimiter(
+                rpm_limit=settings.GEMINI_RPM_LIMIT,
+                tpm_limit=settings.GEMINI_TPM_LIMIT,
+                initial_concurrency=settings.GEMINI_INITIAL_CONCURRENCY,
+                max_concurrency=settings.GEMINI_MAX_CONCURRENCY,
+            ),
+            # Cache de contexto da parte fixa dos prompts (ver app/context_cache.py).
+            context_cache=ContextCacheManager(
+                client.caches,
+                model=settings.DEFAULT_MODEL,
+                ttl_seconds=settings.CONTEXT_CACHE_TTL_SECONDS,
+                refresh_margin_seconds=settings.CONTEXT_CACHE_REFRESH_MARGIN_SECONDS,
+                min_tokens=settings.CONTEXT_CACHE_MIN_TOKENS,
+            ) if settings.CONTEXT_CACHE_ENABLED else None,
+        )
+
+    def _generation_config(self, response_schema, cached_content: str | None = None, profile: AgentProfile | None = None) -> genai_types.GenerateContentConfig | None:
         """
-        Envia um prompt para a API Gemini e retorna a resposta de texto.
+        Saída estruturada: com um schema (modelo pydantic), o Gemini devolve JSON
+        puro e válido nesse formato, sem texto ou cercas de código ao redor.
+        Com `cached_content`, o prefixo do prompt vem do cache de contexto.
+        O perfil do agente define limite de saída, raciocínio, temperatura e timeout.
+        """
+        config = profile.generation_config() if profile is not None else {}
+        if response_schema is not None and settings.GEMINI_STRUCTURED_OUTPUT:
+            config.update(response_mime_type="application/json", response_schema=response_schema)
+        if cached_content is not None:
+            config["cached_content"] = cached_content
+        return genai_types.GenerateContentConfig(**config) if config else None
+
+    @staticmethod
+    def _model(kwargs: dict) -> str:
+        profile: AgentProfile | None = kwargs.get("profile")
+        return profile.model if profile is not None else settings.DEFAULT_MODEL
+
+    def _cacheable_prefix(self, credential: PooledCredential, prompt_text: str, kwargs: dict) -> PromptPrefix | None:
+        static_prefix: PromptPrefix | None = kwargs.get("static_prefix")
+        if credential.context_cache is None or static_prefix is None or not prompt_text.startswith(static_prefix.text):
+            return None
+        # O conteúdo em cache é vinculado a um modelo: agentes com perfil de outro modelo enviam o prompt completo.
+        if credential.context_cache.model != self._model(kwargs):
+            return None
+        return static_prefix if credential.context_cache.is_cacheable(static_prefix) else None
+
+    def _request_args(self, prompt_text: str, static_prefix: PromptPrefix | None, cached_content: str | None, kwargs: dict) -> dict:
+        # Com o prefixo em cache, apenas a parte variável do prompt é enviada.
+        contents = prompt_text[len(static_prefix.text):].lstrip("\n") if cached_content else prompt_text
+        return {
+            "model": self._model(kwargs),
+            "contents": contents,
+            "config": self._generation_config(kwargs.get("response_schema"), cached_content, kwargs.get("profile")),
+        }
+
+    def _response_text(self, response) -> str | None:
+        if response and hasattr(response, 'text') and response.text:
+            return response.text
+        print("API Gemini retornou uma resposta vazia.")
+        return None
+
+    def _record_throttle(self, credential: PooledCredential, api_exception: Exception, retry_after: float | None):
+        # 429/503: o limitador da chave reduz a concorrência e segura as próximas chamadas.
+        # Um 429 é a cota da chave esgotada: ela sai do rodízio e as chamadas vão para as outras.
+        credential.rate_limiter.record_throttle(retry_after)
+        if isinstance(api_exception, exceptions.ResourceExhausted):
+            self.pool.quarantine(credential, retry_after)
+
+    def _translate_api_error(self, error: Exception, credential: PooledCredential) -> Exception | None:
+        """
+        Registra 429/503 na chave usada e devolve a exceção a ser propagada para os
+        casos de uso, ou None para erros que não pertencem à API.
+        """
+        if isinstance(error, genai_errors.APIError):
+            print(f"Erro na API Gemini detectado no cliente: {error.message}")
+            api_exception = _to_api_core_exception(error)
+            if api_exception is None:
+                return error
+            self._record_throttle(credential, api_exception, _extract_retry_delay(error))
+            api_exception.__cause__ = error
+            return api_exception
+        if isinstance(error, exceptions.GoogleAPICallError):
+            if isinstance(error, (exceptions.ResourceExhausted, exceptions.ServiceUnavailable)):
+                self._record_throttle(credential, error, _extract_retry_delay(error))
+            print(f"Erro na API Gemini detectado no cliente: {error.message}")
+            return error
+        if isinstance(error, httpx.TimeoutException):
+            print(f"Timeout na chamada à API Gemini: {error!r}")
+            timeout_exception = exceptions.DeadlineExceeded(f"A chamada excedeu o timeout do perfil do agente: {error!r}")
+            timeout_exception.__cause__ = error
+            return timeout_exception
+        return None
+
+    def execute_prompt(self, prompt_text: str, **kwargs) -> str | None:
+        """
+        Envia um prompt para a API Gemini e retorna a resposta de texto, ou None se a
+        resposta vier vazia ou a chamada falhar por um erro que não é da API.
         Agora, propaga exceções da API para tratamento superior.
+        A chamada aguarda uma vaga no limitador da chave com mais folga do pool e é
+        enviada por ela.
+
+        Se `call_stats` (AgentCallStats) for informado, recebe a espera no limitador
+        e o uso de tokens da resposta. Com `response_schema`, a resposta é pedida em
+        modo de saída estruturada (ver _generation_config). Com `static_prefix`
+        (PromptPrefix), a parte fixa do prompt é enviada pelo cache de contexto.
+        Com `profile` (AgentProfile), o modelo e os parâmetros de geração são os do
+        perfil do agente; sem ele, DEFAULT_MODEL com os padrões do modelo.
+        """
+        call_stats: AgentCallStats | None = kwargs.get("call_stats")
+        wait_started_at = time.perf_counter()
+        credential = self.pool.acquire(AdaptiveRateLimiter.estimate_tokens(prompt_text))
+        if call_stats is not None:
+            call_stats.queue_wait_seconds += time.perf_counter() - wait_started_at
+        try:
+            static_prefix = self._cacheable_prefix(credential, prompt_text, kwargs)
+            cached_content = credential.context_cache.get_handle(static_prefix) if static_prefix else None
+            try:
+                response = credential.client.models.generate_content(**self._request_args(prompt_text, static_prefix, cached_content, kwargs))
+            except genai_errors.APIError as e:
+                if cached_content is None or not _is_missing_cache_error(e):
+                    raise
+                # O cache expirou ou foi apagado: descarta o handle e envia o prompt completo.
+                credential.context_cache.invalidate(static_prefix.prompt_name)
+                response = credential.client.models.generate_content(**self._request_args(prompt_text, static_prefix, None, kwargs))
+            credential.rate_limiter.record_success()
+            if call_stats is not None:
+                call_stats.record_usage(getattr(response, "usage_metadata", None))
+            return self._response_text(response)
+        except Exception as e:
+            api_exception = self._translate_api_error(e, credential)
+            if api_exception is not None:
+                # Propaga exceções da API para que a camada de use_cases possa tratá-las
+                raise api_exception
+            print(f"Erro inesperado no cliente Gemini: {e}")
+            # Sem resposta: um JSON de erro seria aceito pelos parsers e gravado no cache de respostas.
+            return None
+        finally:
+            credential.rate_limiter.release()
+
+    async def execute_prompt_async(self, prompt_text: str, **kwargs) -> str | None:
+        """
+        Versão assíncrona de execute_prompt, usando o cliente nativo asyncio do SDK
+        (client.aio). Nenhuma thread é bloqueada enquanto a chamada ou o limitador aguardam.
         """
+        call_stats: AgentCallStats | None = kwargs.get("call_stats")
+        wait_started_at = time.perf_counter()
+        credential = await self.pool.acquire_async(AdaptiveRateLimiter.estimate_tokens(prompt_text))
+        if call_stats is not None:
+            call_stats.queue_wait_seconds += time.perf_counter() - wait_started_at
         try:
-            model_name = settings.DEFAULT_MODEL
-            response = self.client.models.generate_content(
-                model=model_name,
-                contents=prompt_text,
-            )
-            
-            if response and hasattr(response, 'text') and response.text:
-                return response.text
-            else:
-                print("API Gemini retornou uma resposta vazia.")
-                return '{"error": "A API do Gemini retornou uma resposta vazia ou nula."}'
-
-        except exceptions.GoogleAPICallError as e:
-            # Propaga exceções da API para que a camada de use_cases possa tratá-las
-            print(f"Erro na API Gemini detectado no cliente: {e.message}")
-            raise e # Re-lança a exceção específica da API
+            static_prefix = self._cacheable_prefix(credential, prompt_text, kwargs)
+            cached_content = None
+            if static_prefix is not None:
+                # Criar ou renovar o cache é raro e usa a API síncrona: roda em uma thread.
+                cached_content = credential.context_cache.peek(static_prefix) or await asyncio.to_thread(credential.context_cache.get_handle, static_prefix)
+            try:
+                response = await credential.client.aio.models.generate_content(**self._request_args(prompt_text, static_prefix, cached_content, kwargs))
+            except genai_errors.APIError as e:
+                if cached_content is None or not _is_missing_cache_error(e):
+                    raise
+                credential.context_cache.invalidate(static_prefix.prompt_name)
+                response = await credential.client.aio.models.generate_content(**self._request_args(prompt_text, static_prefix, None, kwargs))
+            credential.rate_limiter.record_success()
+            if call_stats is not None:
+                call_stats.record_usage(getattr(response, "usage_metadata", None))
+            return self._response_text(response)
         except Exception as e:
+            api_exception = self._translate_api_error(e, credential)
+            if api_exception is not None:
+                raise api_exception
             print(f"Erro inesperado no cliente Gemini: {e}")
-            # Retorna um JSON de erro formatado para erros não relacionados à API
-            return f'{{"error": "Ocorreu um erro inesperado no cliente: {str(e)}"}}'
\ No newline at end of file
+            return None
+        finally:
+            credential.rate_limiter.release()
@@ -0,0 +1,291 @@
+# app/job_engine.py
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, Any
+
+from config import settings
+
+TERMINAL_STATUSES = {"completed", "failed", "interrupted"}
+
+_job_engine = None
+_engine_lock = threading.Lock()
+
+
+class JobStore:
+    """
+    Persistência dos jobs e do log de eventos SSE em SQLite (modo WAL).
+    Cada evento recebe um número sequencial por job, usado como `id:` no SSE.
+    """
+    def __init__(self, db_path: str):
+        self.db_path = str(db_path)
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " owner TEXT NOT NULL,"
+            " error TEXT,"
+            " event_count INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_events ("
+            " job_id TEXT NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (job_id, seq))"
+        )
+
+    def create_job(self, job_id: str, kind: str, owner: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, owner, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, owner, now, now),
+            )
+
+    def set_status(self, job_id: str, status: str, error: str | None = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = COALESCE(?, error), updated_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+
+    def append_event(self, job_id: str, payload: str) -> int:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self._conn.execute("SELECT event_count + 1 FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+                self._conn.execute(
+                    "INSERT INTO job_events (job_id, seq, payload, created_at) VALUES (?, ?, ?, ?)",
+                    (job_id, seq, payload, time.time()),
+                )
+                self._conn.execute("UPDATE jobs SET event_count = ?, updated_at = ? WHERE id = ?", (seq, time.time(), job_id))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return seq
+
+    def get_events(self, job_id: str, after_seq: int, limit: int = 500) -> list:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT seq, payload FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (job_id, after_seq, limit),
+            ).fetchall()
+
+    def get_job(self, job_id: str) -> Dict[str, Any] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, kind, status, owner, error, event_count, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ["job_id", "kind", "status", "owner", "error", "event_count", "created_at", "updated_at"]
+        return dict(zip(keys, row))
+
+    def purge_finished(self, older_than_seconds: float) -> int:
+        """
+        Apaga os jobs terminados há mais de `older_than_seconds` e os seus eventos
+        (que podem incluir planilhas inteiras em base64). Retorna quantos jobs foram apagados.
+        """
+        cutoff = time.time() - older_than_seconds
+        statuses = tuple(TERMINAL_STATUSES)
+        placeholders = ", ".join("?" for _ in statuses)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                job_ids = [row[0] for row in self._conn.execute(
+                    f"SELECT id FROM jobs WHERE status IN ({placeholders}) AND updated_at < ?", (*statuses, cutoff),
+                ).fetchall()]
+                self._conn.executemany("DELETE FROM job_events WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+                self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(job_ids)
+
+    def list_unfinished(self) -> list:
+        with self._lock:
+            return self._conn.execute("SELECT id, owner FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+
+
+def _process_is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class JobEngine:
+    """
+    Executa processamentos longos em segundo plano, desacoplados da conexão HTTP.
+
+    `submit` devolve um id de job imediatamente; um worker local (tarefa asyncio
+    neste processo) consome o gerador de eventos do job e grava cada evento no
+    SQLite. Clientes podem se conectar, desconectar e reconectar ao fluxo de
+    eventos a qualquer momento, retomando a partir do último id recebido.
+
+    Jobs terminados há mais de `retention_seconds` são apagados com os seus
+    eventos; a limpeza roda na criação do motor e, depois, no máximo uma vez por
+    `cleanup_interval_seconds`, a cada novo job. O acesso ao SQLite a partir do
+    event loop é feito em threads (asyncio.to_thread).
+    """
+    HEARTBEAT_SECONDS = 15.0
+
+    def __init__(self, store: JobStore, max_concurrent_jobs: int, retention_seconds: float | None = None,
+                 cleanup_interval_seconds: float = 3600.0):
+        self.store = store
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._semaphore = None
+        self._max_concurrent_jobs = max(1, int(max_concurrent_jobs))
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._new_event: Dict[str, asyncio.Event] = {}
+        self.retention_seconds = retention_seconds
+        self.cleanup_interval_seconds = cleanup_interval_seconds
+        self._last_cleanup = time.monotonic()
+        self._recover_orphaned_jobs()
+        if self.retention_seconds is not None:
+            self.store.purge_finished(self.retention_seconds)
+
+    def _recover_orphaned_jobs(self):
+        """
+        Marca como interrompidos os jobs cujo processo dono (nesta máquina) não existe mais.
+        Jobs com o mesmo dono deste motor também são órfãos: após reiniciar um container,
+        o novo processo costuma receber o mesmo hostname e PID, e um motor recém-criado
+        não executa nenhum job.
+        """
+        hostname = socket.gethostname()
+        for job_id, owner in self.store.list_unfinished():
+            owner_host, _, owner_pid = owner.rpartition(":")
+            if owner == self.owner or (owner_host == hostname and owner_pid.isdigit() and not _process_is_alive(int(owner_pid))):
+                self.store.set_status(job_id, "interrupted", "O processo que executava o job foi encerrado.")
+
+    def submit(self, kind: str, stream_factory: Callable[[], AsyncIterator[str]]) -> str:
+        """
+        Registra um novo job e inicia sua execução em segundo plano.
+
+        Args:
+            kind: Tipo do job (ex: 'batch-process'), apenas informativo.
+            stream_factory: Função que cria o gerador de eventos SSE do processamento.
+
+        Returns:
+            O id do job.
+        """
+        job_id = uuid.uuid4().hex
+        self.store.create_job(job_id, kind, self.owner)
+        self._schedule_cleanup()
+        self._new_event[job_id] = asyncio.Event()
+        task = asyncio.create_task(self._run_job(job_id, stream_factory))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        return job_id
+
+    def _schedule_cleanup(self):
+        if self.retention_seconds is None or time.monotonic() - self._last_cleanup < self.cleanup_interval_seconds:
+            return
+        self._last_cleanup = time.monotonic()
+        cleanup = asyncio.create_task(asyncio.to_thread(self.store.purge_finished, self.retention_seconds))
+        cleanup.add_done_callback(lambda task: task.cancelled() or task.exception() is None or print(f"JOBS: Falha na limpeza de jobs antigos: {task.exception()}"))
+
+    def _notify(self, job_id: str):
+        event = self._new_event.get(job_id)
+        if event is not None:
+            event.set()
+
+    async def _run_job(self, job_id: str, stream_factory: Callable[[], AsyncIterator[str]]):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrent_jobs)
+        async with self._semaphore:
+            await asyncio.to_thread(self.store.set_status, job_id, "running")
+            self._notify(job_id)
+            try:
+                async for event_chunk in stream_factory():
+                    await asyncio.to_thread(self.store.append_event, job_id, event_chunk)
+                    self._notify(job_id)
+                await asyncio.to_thread(self.store.set_status, job_id, "completed")
+            except asyncio.CancelledError:
+                # Gravação síncrona: a tarefa já está sendo cancelada.
+                self.store.set_status(job_id, "interrupted", "Job cancelado.")
+                raise
+            except Exception as e:
+                traceback.print_exc()
+                await asyncio.to_thread(self.store.set_status, job_id, "failed", str(e))
+            finally:
+                self._notify(job_id)
+                # Quem ainda acompanha o job já tem a referência do evento; a entrada não é mais necessária.
+                self._new_event.pop(job_id, None)
+
+    def get_job(self, job_id: str) -> Dict[str, Any] | None:
+        return self.store.get_job(job_id)
+
+    async def stream_events(self, job_id: str, last_event_id: int = 0) -> AsyncGenerator[str, None]:
+        """
+        Reproduz os eventos do job a partir de `last_event_id` e continua acompanhando
+        os novos até o job terminar. Cada evento é emitido com seu `id:` SSE.
+        """
+        last_seq = last_event_id
+        try:
+            async for chunk in self._follow_events(job_id, last_seq):
+                yield chunk
+        finally:
+            # Jobs de outro processo (ou já terminados) não têm quem remova a entrada.
+            if job_id not in self._tasks:
+                self._new_event.pop(job_id, None)
+
+    async def _follow_events(self, job_id: str, last_seq: int) -> AsyncGenerator[str, None]:
+        while True:
+            # O status é lido antes dos eventos: se o job já tinha terminado, nenhum evento falta.
+            job = await asyncio.to_thread(self.store.get_job, job_id)
+            if job is None:
+                return
+            events = await asyncio.to_thread(self.store.get_events, job_id, last_seq)
+            for seq, payload in events:
+                last_seq = seq
+                yield f"id: {seq}\n{payload}"
+            if events:
+                continue
+            if job["status"] in TERMINAL_STATUSES:
+                yield f"event: job_status\ndata: {json.dumps({'job_id': job_id, 'status': job['status'], 'error': job['error']})}\n\n"
+                return
+
+            new_event = self._new_event.setdefault(job_id, asyncio.Event())
+            new_event.clear()
+            try:
+                # O timeout também cobre jobs executados por outro processo (sem notificação local).
+                await asyncio.wait_for(new_event.wait(), timeout=min(1.0, self.HEARTBEAT_SECONDS))
+            except asyncio.TimeoutError:
+                if time.time() - job["updated_at"] >= self.HEARTBEAT_SECONDS:
+                    yield ": keep-alive\n\n"
+
+
+def get_job_engine() -> JobEngine:
+    global _job_engine
+    if _job_engine is None:
+        with _engine_lock:
+            if _job_engine is None:
+                _job_engine = JobEngine(
+                    JobStore(settings.JOBS_DB_PATH), settings.MAX_CONCURRENT_JOBS,
+                    retention_seconds=settings.JOBS_RETENTION_SECONDS,
+                    cleanup_interval_seconds=settings.JOBS_CLEANUP_INTERVAL_SECONDS,
+                )
+    return _job_engine
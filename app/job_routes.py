@@ -0,0 +1,33 @@
+# app/job_routes.py
+import asyncio
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
+
+from .job_engine import get_job_engine
+
+# Rotas de consulta de jobs, compartilhadas pelas duas APIs.
+jobs_router = APIRouter()
+
+
+@jobs_router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = await asyncio.to_thread(get_job_engine().get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    return job
+
+
+@jobs_router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, last_event_id: int = 0, last_event_id_header: str | None = Header(None, alias="Last-Event-ID")):
+    """
+    Acompanha os eventos de um job. Ao reconectar, o EventSource do navegador envia
+    o cabeçalho Last-Event-ID e o fluxo continua a partir do evento seguinte; o
+    parâmetro `last_event_id` permite o mesmo em clientes que não enviam o cabeçalho.
+    """
+    engine = get_job_engine()
+    if await asyncio.to_thread(engine.get_job, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    if last_event_id_header and last_event_id_header.strip().isdigit():
+        last_event_id = max(last_event_id, int(last_event_id_header.strip()))
+    return StreamingResponse(engine.stream_events(job_id, last_event_id), media_type="text/event-stream")
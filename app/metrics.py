@@ -0,0 +1,263 @@
+# app/metrics.py
+import contextvars
+import functools
+import json
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Callable, Dict, Tuple
+
+# Métricas por agente no formato de exposição de texto do Prometheus, sem dependências externas.
+METRIC_PREFIX = "pharmaboost"
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+TOKEN_KINDS = ("input", "output", "thinking", "cached")
+
+
+@dataclass
+class AgentCallStats:
+    """
+    Dados de uma chamada de agente. É preenchido ao longo da chamada: o GeminiClient
+    informa a espera no limitador e o uso de tokens; os casos de uso, as tentativas.
+    """
+    prompt_name: str
+    model: str
+    started_at: float = field(default_factory=time.perf_counter)
+    wall_seconds: float = 0.0
+    queue_wait_seconds: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    thinking_tokens: int = 0
+    cached_tokens: int = 0  # Parte dos tokens de entrada atendida pelo cache de contexto.
+    retries: int = 0
+    throttled_429: int = 0
+    throttled_503: int = 0
+    cache_hit: bool = False
+    success: bool = False
+    structured: bool = False  # Resposta pedida em modo de saída estruturada (response_schema).
+    parse_failed: bool = False  # A API respondeu, mas a resposta não pôde ser interpretada.
+    profile: Any = None  # AgentProfile usado na chamada (app/agent_profiles.py).
+    cancelled: bool = False  # Cancelada antes de terminar (ex: candidato especulativo descartado).
+
+    def record_usage(self, usage_metadata):
+        """Soma o uso de tokens de uma resposta (usage_metadata do SDK genai); campos ausentes valem 0."""
+        if usage_metadata is None:
+            return
+        self.input_tokens += getattr(usage_metadata, "prompt_token_count", None) or 0
+        self.output_tokens += getattr(usage_metadata, "candidates_token_count", None) or 0
+        self.thinking_tokens += getattr(usage_metadata, "thoughts_token_count", None) or 0
+        self.cached_tokens += getattr(usage_metadata, "cached_content_token_count", None) or 0
+
+    @property
+    def output_mode(self) -> str:
+        return "structured" if self.structured else "text"
+
+    @property
+    def outcome(self) -> str:
+        if self.cache_hit:
+            return "cache_hit"
+        if self.cancelled:
+            return "cancelled"
+        return "success" if self.success else "failure"
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.total += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class MetricsRegistry:
+    """Contadores e histogramas das chamadas de agentes, rotulados por prompt e modelo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[tuple, int] = {}
+        self._tokens: Dict[tuple, int] = {}
+        self._retries: Dict[tuple, int] = {}
+        self._throttled: Dict[tuple, int] = {}
+        self._responses: Dict[tuple, int] = {}
+        self._parse_failures: Dict[tuple, int] = {}
+        self._latency: Dict[tuple, _Histogram] = {}
+        self._queue_wait: Dict[tuple, _Histogram] = {}
+        self._profiles: Dict[str, dict] = {}
+
+    def record(self, call: AgentCallStats):
+        labels = (call.prompt_name, call.model)
+        with self._lock:
+            self._calls[labels + (call.outcome,)] = self._calls.get(labels + (call.outcome,), 0) + 1
+            for kind in TOKEN_KINDS:
+                value = getattr(call, f"{kind}_tokens")
+                if value:
+                    self._tokens[labels + (kind,)] = self._tokens.get(labels + (kind,), 0) + value
+            if call.retries:
+                self._retries[labels] = self._retries.get(labels, 0) + call.retries
+            for code, value in (("429", call.throttled_429), ("503", call.throttled_503)):
+                if value:
+                    self._throttled[labels + (code,)] = self._throttled.get(labels + (code,), 0) + value
+            if call.success or call.parse_failed:
+                mode_labels = labels + (call.output_mode,)
+                self._responses[mode_labels] = self._responses.get(mode_labels, 0) + 1
+                if call.parse_failed:
+                    self._parse_failures[mode_labels] = self._parse_failures.get(mode_labels, 0) + 1
+            if call.profile is not None:
+                self._profiles[call.prompt_name] = call.profile.as_dict()
+            if not call.cache_hit:
+                self._latency.setdefault(labels, _Histogram(LATENCY_BUCKETS)).observe(call.wall_seconds)
+                self._queue_wait.setdefault(labels, _Histogram(LATENCY_BUCKETS)).observe(call.queue_wait_seconds)
+
+    def render_prometheus(self, gauges: Dict[str, Tuple[str, Dict[tuple, float]]] | None = None) -> str:
+        """
+        Texto no formato de exposição do Prometheus.
+
+        Args:
+            gauges: Métricas instantâneas extras: nome -> (descrição, {rótulos: valor}),
+                onde os rótulos são tuplas de pares (nome, valor).
+        """
+        lines = []
+        with self._lock:
+            _append_counter(lines, "agent_calls_total", "Chamadas de agentes por resultado (success, failure, cache_hit, cancelled).",
+                            ("prompt", "model", "outcome"), self._calls)
+            _append_counter(lines, "agent_tokens_total", "Tokens consumidos pelos agentes, segundo o usage_metadata das respostas.",
+                            ("prompt", "model", "kind"), self._tokens)
+            _append_counter(lines, "agent_retries_total", "Novas tentativas após 429/503.", ("prompt", "model"), self._retries)
+            _append_counter(lines, "agent_throttled_total", "Respostas 429/503 recebidas pelos agentes.",
+                            ("prompt", "model", "code"), self._throttled)
+            _append_counter(lines, "agent_responses_total", "Respostas recebidas da API por modo de saída (structured, text).",
+                            ("prompt", "model", "mode"), self._responses)
+            _append_counter(lines, "agent_parse_failures_total", "Respostas que não puderam ser interpretadas (a taxa é este valor / agent_responses_total).",
+                            ("prompt", "model", "mode"), self._parse_failures)
+            _append_histogram(lines, "agent_call_seconds", "Duração total das chamadas de agentes (inclui espera e tentativas).", self._latency)
+            _append_histogram(lines, "agent_queue_wait_seconds", "Espera no limitador de cota antes do envio.", self._queue_wait)
+            lines.append(f"# HELP {METRIC_PREFIX}_agent_profile_info Perfil de modelo em uso por cada agente (valor sempre 1).")
+            lines.append(f"# TYPE {METRIC_PREFIX}_agent_profile_info gauge")
+            for prompt_name, profile in sorted(self._profiles.items()):
+                label_pairs = [("prompt", prompt_name)] + [(name, "" if value is None else value) for name, value in profile.items() if name != "prompt_name"]
+                lines.append(f"{METRIC_PREFIX}_agent_profile_info{_format_labels(label_pairs)} 1")
+        for name, (description, values) in (gauges or {}).items():
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {description}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+            for label_pairs, value in values.items():
+                lines.append(f"{METRIC_PREFIX}_{name}{_format_labels(label_pairs)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(label_pairs) -> str:
+    if not label_pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in label_pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _append_counter(lines: list, name: str, description: str, label_names: tuple, values: dict):
+    lines.append(f"# HELP {METRIC_PREFIX}_{name} {description}")
+    lines.append(f"# TYPE {METRIC_PREFIX}_{name} counter")
+    for labels, value in sorted(values.items()):
+        lines.append(f"{METRIC_PREFIX}_{name}{_format_labels(zip(label_names, labels))} {value}")
+
+
+def _append_histogram(lines: list, name: str, description: str, histograms: dict):
+    lines.append(f"# HELP {METRIC_PREFIX}_{name} {description}")
+    lines.append(f"# TYPE {METRIC_PREFIX}_{name} histogram")
+    for (prompt_name, model), histogram in sorted(histograms.items()):
+        base = [("prompt", prompt_name), ("model", model)]
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f"{METRIC_PREFIX}_{name}_bucket{_format_labels(base + [('le', bound)])} {count}")
+        lines.append(f"{METRIC_PREFIX}_{name}_bucket{_format_labels(base + [('le', '+Inf')])} {histogram.count}")
+        lines.append(f"{METRIC_PREFIX}_{name}_sum{_format_labels(base)} {_format_value(histogram.total)}")
+        lines.append(f"{METRIC_PREFIX}_{name}_count{_format_labels(base)} {histogram.count}")
+
+
+class JobMetricsSummary:
+    """Totais das chamadas de agentes de um único fluxo de eventos (um upload ou job)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.perf_counter()
+        self.by_prompt: Dict[str, dict] = {}
+
+    def record(self, call: AgentCallStats):
+        with self._lock:
+            totals = self.by_prompt.setdefault(call.prompt_name, {
+                "calls": 0, "cache_hits": 0, "failures": 0, "wall_seconds": 0.0, "queue_wait_seconds": 0.0,
+                "input_tokens": 0, "output_tokens": 0, "thinking_tokens": 0, "cached_tokens": 0, "retries": 0, "throttled": 0,
+                "parse_failures": 0, "cancelled": 0,
+            })
+            totals["calls"] += 1
+            if call.profile is not None:
+                # Perfil registrado com os totais, para comparar latência e custo entre modelos.
+                totals["profile"] = {name: value for name, value in call.profile.as_dict().items() if name != "prompt_name"}
+            totals["cache_hits"] += int(call.cache_hit)
+            totals["failures"] += int(call.outcome == "failure")
+            totals["wall_seconds"] += call.wall_seconds
+            totals["queue_wait_seconds"] += call.queue_wait_seconds
+            for kind in TOKEN_KINDS:
+                totals[f"{kind}_tokens"] += getattr(call, f"{kind}_tokens")
+            totals["retries"] += call.retries
+            totals["throttled"] += call.throttled_429 + call.throttled_503
+            totals["parse_failures"] += int(call.parse_failed)
+            totals["cancelled"] += int(call.cancelled)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            agents = {
+                name: {**totals, "wall_seconds": round(totals["wall_seconds"], 3), "queue_wait_seconds": round(totals["queue_wait_seconds"], 3)}
+                for name, totals in self.by_prompt.items()
+            }
+        totals = {key: sum(agent[key] for agent in agents.values()) for key in ("calls", "cache_hits", "failures", "input_tokens", "output_tokens", "thinking_tokens", "cached_tokens", "retries", "throttled", "parse_failures", "cancelled")}
+        return {"elapsed_seconds": round(time.perf_counter() - self.started_at, 3), "totals": totals, "agents": agents}
+
+
+_registry = MetricsRegistry()
+# Resumo do fluxo em andamento. As tarefas e threads criadas pelo fluxo herdam o contexto.
+_current_summary: contextvars.ContextVar[JobMetricsSummary | None] = contextvars.ContextVar("job_metrics_summary", default=None)
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    return _registry
+
+
+def record_agent_call(call: AgentCallStats):
+    """Finaliza a chamada e a registra nas métricas globais e no resumo do fluxo atual."""
+    call.wall_seconds = time.perf_counter() - call.started_at
+    _registry.record(call)
+    summary = _current_summary.get()
+    if summary is not None:
+        summary.record(call)
+
+
+def emits_metrics_summary(stream_function: Callable[..., AsyncGenerator[str, None]]):
+    """
+    Decorador de geradores de eventos SSE: ao fim do fluxo, emite um evento
+    `metrics_summary` com os totais das chamadas de agentes feitas por ele.
+    """
+    @functools.wraps(stream_function)
+    async def wrapper(*args, **kwargs):
+        summary = JobMetricsSummary()
+        previous = _current_summary.get()
+        _current_summary.set(summary)
+        try:
+            async for event_chunk in stream_function(*args, **kwargs):
+                yield event_chunk
+            yield f"event: metrics_summary\ndata: {json.dumps(summary.as_dict())}\n\n"
+        finally:
+            _current_summary.set(previous)
+    return wrapper
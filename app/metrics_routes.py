@@ -0,0 +1,30 @@
+# app/metrics_routes.py
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from . import use_cases
+from .metrics import get_metrics_registry
+
+# Rota de métricas no formato do Prometheus, compartilhada pelas duas APIs.
+metrics_router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _runtime_gauges() -> dict:
+    snapshot = use_cases.get_runtime_snapshot()
+    gauges = {}
+    for key_id, limiter_state in snapshot["rate_limiter"].items():
+        for name, value in limiter_state.items():
+            gauges.setdefault(f"rate_limiter_{name}", (f"Limitador de cota de cada chave do Gemini: {name}.", {}))[1][(("key", key_id),)] = value
+    prompt_stats = snapshot["prompts"]
+    if prompt_stats:
+        gauges["prompt_renders"] = ("Renderizações de cada prompt.", {(("prompt", name),): stats["renders"] for name, stats in prompt_stats.items()})
+        gauges["prompt_avg_render_ms"] = ("Tempo médio de renderização de cada prompt, em ms.", {(("prompt", name),): stats["avg_render_ms"] for name, stats in prompt_stats.items()})
+        gauges["prompt_last_size_chars"] = ("Tamanho do último prompt renderizado, em caracteres.", {(("prompt", name),): stats["last_size_chars"] for name, stats in prompt_stats.items()})
+    return gauges
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(get_metrics_registry().render_prometheus(_runtime_gauges()), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,49 +1,201 @@
 import os
+import hashlib
+import threading
+import time
+from dataclasses import dataclass, field
+
 import yaml
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
+
+from config import settings
+
+
+@dataclass
+class RenderStats:
+    """Estatísticas de renderização de um template."""
+    renders: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    last_size: int = 0
+    total_size: int = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "renders": self.renders,
+            "avg_render_ms": round(self.total_seconds / self.renders * 1000, 3) if self.renders else 0.0,
+            "max_render_ms": round(self.max_seconds * 1000, 3),
+            "last_size_chars": self.last_size,
+            "avg_size_chars": self.total_size // self.renders if self.renders else 0,
+        }
+
+
+@dataclass
+class PromptPrefix:
+    """Parte fixa de um prompt (chave `static_prefix` do YAML), igual em todas as chamadas."""
+    prompt_name: str
+    version: str
+    text: str
+
+
+@dataclass
+class PromptEntry:
+    """Prompt carregado: conteúdo do YAML, template já compilado e versão (hash do template)."""
+    path: str
+    mtime_ns: int
+    data: dict
+    template: Template | None
+    version: str
+    stats: RenderStats = field(default_factory=RenderStats)
+    prefix: PromptPrefix | None = None
+
 
 class PromptManager:
     """
-    Carrega, gerencia e renderiza todos os prompts da pasta de prompts.
+    Registro dos prompts da pasta de prompts.
+
+    Cada template é compilado uma única vez e recompilado apenas quando o mtime do
+    arquivo muda (a pasta é verificada no máximo a cada `reload_interval` segundos),
+    então alterações nos YAML valem sem reiniciar a aplicação.
+
+    Um YAML pode separar as instruções fixas (`static_prefix`, renderizado uma vez,
+    sem variáveis) dos dados de cada produto (`template`). O prompt final é sempre
+    o prefixo seguido do template, e o prefixo pode ser enviado como contexto em
+    cache pelo GeminiClient.
     """
-    def __init__(self, prompt_dir="prompts"):
+    def __init__(self, prompt_dir="prompts", reload_interval: float | None = None):
         """
         Inicializa o gerenciador, carregando todos os prompts .yaml do diretório.
 
         Args:
             prompt_dir (str): O caminho para o diretório que contém os arquivos .yaml dos prompts.
+            reload_interval (float): Intervalo mínimo, em segundos, entre verificações de
+                alterações nos arquivos. 0 verifica a cada uso; negativo desativa o recarregamento.
         """
         # Define o caminho para o diretório de prompts de forma robusta
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         self.prompt_dir = os.path.join(base_dir, prompt_dir)
-        
+        self.reload_interval = settings.PROMPT_RELOAD_INTERVAL_SECONDS if reload_interval is None else reload_interval
+
         # Configura o ambiente Jinja2 para carregar templates
         self.env = Environment(
             loader=FileSystemLoader(self.prompt_dir),
             autoescape=select_autoescape(['html', 'xml'])
         )
-        self.prompts = self._load_prompts()
-        print(f"PromptManager inicializado. Prompts carregados: {list(self.prompts.keys())}")
+        self._entries: dict[str, PromptEntry] = {}
+        # mtime dos arquivos que falharam ao carregar, para não tentar de novo até a próxima alteração.
+        self._failed_mtimes: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._last_scan = 0.0
+        self._scan_prompt_dir()
+        print(f"PromptManager inicializado. Prompts carregados: {list(self._entries.keys())}")
+
+    @property
+    def prompts(self) -> dict:
+        """Conteúdo dos YAML carregados, por nome do prompt."""
+        return {name: entry.data for name, entry in self._entries.items()}
+
+    def _load_entry(self, prompt_name: str, filepath: str, mtime_ns: int) -> PromptEntry | None:
+        try:
+            with open(filepath, "r", encoding="utf-8") as f:
+                prompt_data = yaml.safe_load(f)
+        except Exception as e:
+            print(f"Erro ao carregar o prompt '{os.path.basename(filepath)}': {e}")
+            return None
+
+        template_str = prompt_data.get('template', '') if isinstance(prompt_data, dict) else ''
+        prefix_str = (prompt_data.get('static_prefix') or '') if isinstance(prompt_data, dict) else ''
+        template = None
+        prefix = None
+        if isinstance(prompt_data, dict) and 'template' in prompt_data:
+            try:
+                template = self.env.from_string(template_str)
+                if prefix_str:
+                    prefix_text = self.env.from_string(prefix_str).render()
+                    prefix = PromptPrefix(prompt_name, hashlib.sha256(prefix_text.encode("utf-8")).hexdigest()[:12], prefix_text)
+            except Exception as e:
+                print(f"Erro ao compilar o template do prompt '{prompt_name}': {e}")
+                return None
+
+        # A versão cobre o prefixo e o template (prompts sem prefixo mantêm o hash só do template).
+        version_source = f"{prefix_str}\0{template_str}" if prefix_str else template_str
+        previous = self._entries.get(prompt_name)
+        return PromptEntry(
+            path=filepath,
+            mtime_ns=mtime_ns,
+            data=prompt_data,
+            template=template,
+            version=hashlib.sha256(version_source.encode("utf-8")).hexdigest()[:12],
+            stats=previous.stats if previous else RenderStats(),
+            prefix=prefix,
+        )
 
-    def _load_prompts(self) -> dict:
+    def _scan_prompt_dir(self):
         """
-        Carrega TODOS os arquivos .yaml do diretório de prompts dinamicamente.
+        Carrega os arquivos .yaml novos ou alterados e descarta os removidos.
+        Um arquivo que deixou de ser válido mantém a última versão carregada.
         """
-        loaded_prompts = {}
         if not os.path.isdir(self.prompt_dir):
             print(f"Aviso: Diretório de prompts '{self.prompt_dir}' não encontrado.")
-            return loaded_prompts
+            return
 
+        found = set()
         for filename in os.listdir(self.prompt_dir):
-            if filename.endswith((".yaml", ".yml")):
-                prompt_name = os.path.splitext(filename)[0]
-                filepath = os.path.join(self.prompt_dir, filename)
-                try:
-                    with open(filepath, "r", encoding="utf-8") as f:
-                        loaded_prompts[prompt_name] = yaml.safe_load(f)
-                except Exception as e:
-                    print(f"Erro ao carregar o prompt '{filename}': {e}")
-        return loaded_prompts
+            if not filename.endswith((".yaml", ".yml")):
+                continue
+            prompt_name = os.path.splitext(filename)[0]
+            filepath = os.path.join(self.prompt_dir, filename)
+            try:
+                mtime_ns = os.stat(filepath).st_mtime_ns
+            except OSError:
+                continue
+            found.add(prompt_name)
+
+            current = self._entries.get(prompt_name)
+            if (current is not None and current.mtime_ns == mtime_ns) or self._failed_mtimes.get(prompt_name) == mtime_ns:
+                continue
+            entry = self._load_entry(prompt_name, filepath, mtime_ns)
+            if entry is None:
+                self._failed_mtimes[prompt_name] = mtime_ns
+                continue
+            self._failed_mtimes.pop(prompt_name, None)
+            if current is not None and entry.version != current.version:
+                print(f"PromptManager: prompt '{prompt_name}' recarregado (versão {current.version} -> {entry.version}).")
+            self._entries[prompt_name] = entry
+
+        for prompt_name in set(self._entries) - found:
+            del self._entries[prompt_name]
+        self._last_scan = time.monotonic()
+
+    def _refresh(self):
+        if self.reload_interval < 0 or time.monotonic() - self._last_scan < self.reload_interval:
+            return
+        with self._lock:
+            if time.monotonic() - self._last_scan >= self.reload_interval:
+                self._scan_prompt_dir()
+
+    def get_version(self, prompt_name: str) -> str:
+        """
+        Retorna uma versão curta do prompt, derivada do hash do seu template.
+        Qualquer alteração no template gera uma nova versão (usada como chave de cache).
+        """
+        self._refresh()
+        entry = self._entries.get(prompt_name)
+        return entry.version if entry else hashlib.sha256(b"").hexdigest()[:12]
+
+    def get_versions(self) -> dict:
+        """Versão atual de cada prompt carregado."""
+        self._refresh()
+        return {name: entry.version for name, entry in self._entries.items()}
+
+    def get_static_prefix(self, prompt_name: str) -> PromptPrefix | None:
+        """Parte fixa do prompt, ou None se o YAML não tiver `static_prefix`."""
+        self._refresh()
+        entry = self._entries.get(prompt_name)
+        return entry.prefix if entry else None
+
+    def get_stats(self) -> dict:
+        """Tempo e tamanho de renderização acumulados por template."""
+        return {name: {"version": entry.version, **entry.stats.as_dict()} for name, entry in self._entries.items()}
 
     def render(self, prompt_name: str, **kwargs) -> str:
         """
@@ -55,18 +207,28 @@ class PromptManager:
 
         Returns:
             O prompt renderizado como uma string.
-        
+
         Raises:
             ValueError: Se o prompt solicitado não for encontrado.
         """
-        if prompt_name not in self.prompts:
-            raise ValueError(f"Prompt '{prompt_name}' não encontrado. Prompts disponíveis: {list(self.prompts.keys())}")
-        
-        prompt_data = self.prompts[prompt_name]
-        if not isinstance(prompt_data, dict) or 'template' not in prompt_data:
-             raise ValueError(f"O arquivo de prompt '{prompt_name}.yaml' é inválido ou não contém uma chave 'template'.")
+        self._refresh()
+        entry = self._entries.get(prompt_name)
+        if entry is None:
+            raise ValueError(f"Prompt '{prompt_name}' não encontrado. Prompts disponíveis: {list(self._entries.keys())}")
+        if entry.template is None:
+            raise ValueError(f"O arquivo de prompt '{prompt_name}.yaml' é inválido ou não contém uma chave 'template'.")
 
-        template_str = prompt_data['template']
-        template = self.env.from_string(template_str)
-        return template.render(**kwargs)
+        started_at = time.perf_counter()
+        rendered = entry.template.render(**kwargs)
+        if entry.prefix is not None:
+            rendered = f"{entry.prefix.text}\n{rendered}"
+        elapsed = time.perf_counter() - started_at
 
+        with self._lock:
+            stats = entry.stats
+            stats.renders += 1
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            stats.last_size = len(rendered)
+            stats.total_size += len(rendered)
+        return rendered
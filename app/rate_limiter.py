@@ -0,0 +1,174 @@
+# app/rate_limiter.py
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+
+class AdaptiveRateLimiter:
+    """
+    Limitador de requisições compartilhado por todas as chamadas ao Gemini.
+
+    Respeita o orçamento de requisições (RPM) e de tokens (TPM) por minuto em uma
+    janela deslizante e ajusta a concorrência no estilo AIMD: cresce aos poucos a
+    cada sucesso e cai pela metade quando a API responde 429/503. Dicas de espera
+    enviadas pelo servidor (RetryInfo / Retry-After) bloqueiam novas chamadas até
+    o prazo indicado.
+    """
+    WINDOW_SECONDS = 60.0
+    CHARS_PER_TOKEN = 4
+    # Intervalo mínimo entre duas reduções de concorrência, para que uma rajada de
+    # 429 simultâneos conte como um único sinal de congestionamento.
+    DECREASE_COOLDOWN = 2.0
+    MIN_BACKOFF = 2.0
+    MAX_BACKOFF = 60.0
+    # No caminho assíncrono não há notificação de release(): a espera é feita em
+    # fatias curtas, com jitter para que as corrotinas não acordem todas juntas.
+    ASYNC_POLL_INTERVAL = 0.25
+    ASYNC_JITTER = 0.1
+
+    def __init__(self, rpm_limit: int, tpm_limit: int, initial_concurrency: int = 4,
+                 min_concurrency: int = 1, max_concurrency: int = 32):
+        self.rpm_limit = max(1, int(rpm_limit))
+        self.tpm_limit = max(1, int(tpm_limit))
+        self.min_concurrency = max(1, int(min_concurrency))
+        self.max_concurrency = max(self.min_concurrency, int(max_concurrency))
+        self.concurrency_limit = float(min(max(initial_concurrency, self.min_concurrency), self.max_concurrency))
+
+        self._condition = threading.Condition()
+        self._window = deque()  # (timestamp, tokens) de cada requisição liberada
+        self._tokens_in_window = 0
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._consecutive_throttles = 0
+
+    @classmethod
+    def estimate_tokens(cls, text: str) -> int:
+        """Estimativa barata de tokens de um prompt renderizado (~4 caracteres por token)."""
+        return max(1, len(text or "") // cls.CHARS_PER_TOKEN)
+
+    def _purge_window(self, now: float):
+        while self._window and now - self._window[0][0] >= self.WINDOW_SECONDS:
+            _, tokens = self._window.popleft()
+            self._tokens_in_window -= tokens
+
+    def _try_reserve(self, tokens: int) -> float:
+        """
+        Tenta reservar uma vaga para a requisição. Deve ser chamado com o lock adquirido.
+
+        Returns:
+            0 se a vaga foi reservada, ou o tempo estimado (em segundos) até a próxima tentativa.
+        """
+        now = time.monotonic()
+        self._purge_window(now)
+
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._in_flight >= int(self.concurrency_limit):
+            # Será acordado por release(); o timeout é apenas uma salvaguarda.
+            return 1.0
+        if len(self._window) >= self.rpm_limit:
+            return self._window[0][0] + self.WINDOW_SECONDS - now
+
+        # Um prompt maior que o orçamento inteiro ainda precisa ser enviado em algum momento.
+        tokens = min(tokens, self.tpm_limit)
+        if self._window and self._tokens_in_window + tokens > self.tpm_limit:
+            tokens_to_free = self._tokens_in_window + tokens - self.tpm_limit
+            for timestamp, window_tokens in self._window:
+                tokens_to_free -= window_tokens
+                if tokens_to_free <= 0:
+                    return timestamp + self.WINDOW_SECONDS - now
+
+        self._window.append((now, tokens))
+        self._tokens_in_window += tokens
+        self._in_flight += 1
+        return 0.0
+
+    def acquire(self, tokens: int = 1):
+        """Bloqueia a thread atual até que a requisição caiba no orçamento."""
+        with self._condition:
+            while True:
+                wait_time = self._try_reserve(tokens)
+                if wait_time <= 0:
+                    return
+                self._condition.wait(timeout=wait_time)
+
+    def try_acquire(self, tokens: int = 1) -> float:
+        """
+        Tentativa sem espera.
+
+        Returns:
+            0 se a vaga foi reservada, ou o tempo estimado (em segundos) até a próxima tentativa.
+        """
+        with self._condition:
+            return self._try_reserve(tokens)
+
+    async def acquire_async(self, tokens: int = 1):
+        """Versão não bloqueante de acquire(): aguarda com asyncio.sleep, sem ocupar threads."""
+        while True:
+            with self._condition:
+                wait_time = self._try_reserve(tokens)
+            if wait_time <= 0:
+                return
+            await asyncio.sleep(min(wait_time, self.ASYNC_POLL_INTERVAL) + random.uniform(0, self.ASYNC_JITTER))
+
+    def release(self):
+        """Libera a vaga de concorrência ocupada por uma requisição finalizada."""
+        with self._condition:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._condition.notify_all()
+
+    def record_success(self):
+        """Aumento aditivo: +1 vaga a cada 'janela' de concorrência bem-sucedida."""
+        with self._condition:
+            self._consecutive_throttles = 0
+            self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1.0 / self.concurrency_limit)
+            self._condition.notify_all()
+
+    def record_throttle(self, retry_after: float | None = None):
+        """
+        Redução multiplicativa após um 429/503. Sem dica do servidor, a pausa
+        cresce exponencialmente a cada falha consecutiva.
+        """
+        with self._condition:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.DECREASE_COOLDOWN:
+                self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit / 2)
+                self._last_decrease = now
+
+            self._consecutive_throttles += 1
+            if retry_after is None:
+                retry_after = min(self.MIN_BACKOFF * 2 ** (self._consecutive_throttles - 1), self.MAX_BACKOFF)
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+            print(f"RATE LIMIT: Concorrência reduzida para {int(self.concurrency_limit)}. Novas chamadas liberadas em {retry_after:.1f}s.")
+
+    def headroom(self) -> float:
+        """
+        Folga atual do orçamento, de 0 a 1: a menor fração livre entre vagas de
+        concorrência, requisições e tokens da janela (0 enquanto bloqueado por um 429/503).
+        """
+        with self._condition:
+            now = time.monotonic()
+            self._purge_window(now)
+            if now < self._blocked_until:
+                return 0.0
+            return max(0.0, min(
+                1 - self._in_flight / int(self.concurrency_limit),
+                1 - len(self._window) / self.rpm_limit,
+                1 - self._tokens_in_window / self.tpm_limit,
+            ))
+
+    def snapshot(self) -> dict:
+        """Estado atual do limitador, para logs e diagnóstico."""
+        with self._condition:
+            now = time.monotonic()
+            self._purge_window(now)
+            return {
+                "concurrency_limit": int(self.concurrency_limit),
+                "in_flight": self._in_flight,
+                "requests_last_minute": len(self._window),
+                "tokens_last_minute": self._tokens_in_window,
+                "blocked_for_seconds": round(max(0.0, self._blocked_until - now), 2),
+            }
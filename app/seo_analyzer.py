@@ -1,20 +1,25 @@
 # app/seo_analyzer.py (Atualizado para refletir as regras do Agente Auditor de IA)
+import os
 import re
+import unicodedata
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Any, Iterable, Iterator
+
 from bs4 import BeautifulSoup
-from typing import Dict, Any
+from lxml import etree
 
-def check_headings_structure(soup: BeautifulSoup) -> Dict[str, Any]:
-    """
-    Verifica a hierarquia de títulos.
-    REGRA: É proibido usar <h1>. A estrutura deve começar com <h2>.
-    """
+_GOV_LINK_PATTERN = re.compile(r"gov\.br")
+
+def _headings_result(has_h1: bool, h2_count: int) -> Dict[str, Any]:
     score = 0
     feedback = []
     max_score = 10
 
-    if soup.find('h1'):
+    if has_h1:
         feedback.append("Hierarquia de headings incorreta: A tag <h1> é proibida no conteúdo.")
-    elif not soup.find_all('h2'):
+    elif not h2_count:
         feedback.append("Hierarquia de headings incorreta: A estrutura deve conter pelo menos uma tag <h2>.")
     else:
         score = 10
@@ -22,15 +27,12 @@ def check_headings_structure(soup: BeautifulSoup) -> Dict[str, Any]:
 
     return {"score": score, "max_score": max_score, "feedback": feedback}
 
-def check_readability(soup: BeautifulSoup) -> Dict[str, Any]:
-    """
-    Verifica a legibilidade através do uso de listas.
-    """
+def _readability_result(has_list: bool) -> Dict[str, Any]:
     score = 0
     feedback = []
     max_score = 10
 
-    if soup.find_all(['ul', 'ol']):
+    if has_list:
         score = 10
         feedback.append("Boa legibilidade, utilizando parágrafos curtos e listas (`<ul>`).")
     else:
@@ -38,16 +40,12 @@ def check_readability(soup: BeautifulSoup) -> Dict[str, Any]:
 
     return {"score": score, "max_score": max_score, "feedback": feedback}
 
-def check_faq_structure(soup: BeautifulSoup) -> Dict[str, Any]:
-    """
-    Verifica a presença e estrutura da seção de FAQ.
-    """
+def _faq_result(faq_is_valid: bool) -> Dict[str, Any]:
     score = 0
     feedback = []
     max_score = 10
 
-    faq_section = soup.find('div', class_='faq-section')
-    if faq_section and faq_section.find_all('details') and faq_section.find_all('summary'):
+    if faq_is_valid:
         score = 10
         feedback.append("A seção de FAQ utiliza `<details>` e `<summary>` conforme recomendado.")
     else:
@@ -55,13 +53,9 @@ def check_faq_structure(soup: BeautifulSoup) -> Dict[str, Any]:
 
     return {"score": score, "max_score": max_score, "feedback": feedback}
 
-def check_authority_signals(soup: BeautifulSoup) -> Dict[str, Any]:
-    """
-    Verifica os sinais de Autoridade e Confiança (GEO, Dados, Links).
-    """
+def _authority_result(lower_content: str, has_gov_link: bool) -> Dict[str, Any]:
     geo_score, verifiable_data_score, external_links_score = 0, 0, 0
     feedback = []
-    lower_content = soup.get_text().lower()
 
     # GEO Signals
     if "nota de transparência" in lower_content and "anvisa" in lower_content:
@@ -76,7 +70,7 @@ def check_authority_signals(soup: BeautifulSoup) -> Dict[str, Any]:
         feedback.append("Dados verificáveis (Registro ANVISA e Fabricante) não incluídos.")
 
     # External Links
-    if soup.find('a', href=re.compile(r"gov\.br")):
+    if has_gov_link:
         external_links_score = 10
     else:
         feedback.append("Link externo para fonte de autoridade (gov.br) não encontrado.")
@@ -88,23 +82,33 @@ def check_authority_signals(soup: BeautifulSoup) -> Dict[str, Any]:
         "feedback": feedback
     }
 
-def analyze_seo_performance_from_html(html_content: str) -> Dict[str, Any]:
+def check_headings_structure(soup: BeautifulSoup) -> Dict[str, Any]:
     """
-    Função principal que orquestra todas as verificações de SEO baseadas no HTML.
-    Esta é uma implementação em Python para fins de teste e validação,
-    o sistema principal usa o Agente de IA.
+    Verifica a hierarquia de títulos.
+    REGRA: É proibido usar <h1>. A estrutura deve começar com <h2>.
     """
-    if not html_content or not isinstance(html_content, str):
-        return {"total_score": 0, "breakdown": {"error": "Conteúdo inválido ou vazio."}}
+    return _headings_result(bool(soup.find('h1')), len(soup.find_all('h2')))
 
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
-    # Executa todas as funções de verificação
-    headings_results = check_headings_structure(soup)
-    readability_results = check_readability(soup)
-    faq_results = check_faq_structure(soup)
-    authority_results = check_authority_signals(soup)
-    
+def check_readability(soup: BeautifulSoup) -> Dict[str, Any]:
+    """
+    Verifica a legibilidade através do uso de listas.
+    """
+    return _readability_result(bool(soup.find_all(['ul', 'ol'])))
+
+def check_faq_structure(soup: BeautifulSoup) -> Dict[str, Any]:
+    """
+    Verifica a presença e estrutura da seção de FAQ.
+    """
+    faq_section = soup.find('div', class_='faq-section')
+    return _faq_result(bool(faq_section and faq_section.find_all('details') and faq_section.find_all('summary')))
+
+def check_authority_signals(soup: BeautifulSoup) -> Dict[str, Any]:
+    """
+    Verifica os sinais de Autoridade e Confiança (GEO, Dados, Links).
+    """
+    return _authority_result(soup.get_text().lower(), bool(soup.find('a', href=_GOV_LINK_PATTERN)))
+
+def _build_analysis(headings_results, readability_results, faq_results, authority_results) -> Dict[str, Any]:
     # Consolida os resultados em um breakdown similar ao do Agente de IA
     breakdown = {
         "headings": headings_results,
@@ -131,3 +135,468 @@ def analyze_seo_performance_from_html(html_content: str) -> Dict[str, Any]:
         "breakdown": breakdown,
         "feedback_geral": all_feedback
     }
+
+def analyze_seo_performance_with_soup(html_content: str) -> Dict[str, Any]:
+    """
+    Implementação original baseada em BeautifulSoup, em que cada verificação percorre
+    a árvore novamente. Mantida como referência para o benchmark e para comparação.
+    """
+    if not html_content or not isinstance(html_content, str):
+        return {"total_score": 0, "breakdown": {"error": "Conteúdo inválido ou vazio."}}
+
+    soup = BeautifulSoup(html_content, 'html.parser')
+    return _build_analysis(
+        check_headings_structure(soup),
+        check_readability(soup),
+        check_faq_structure(soup),
+        check_authority_signals(soup),
+    )
+
+class _HtmlSignalCollector:
+    """
+    Alvo (target) do parser HTML do lxml: recebe os eventos de abertura, fechamento
+    e texto em uma única passada, sem construir a árvore, e coleta todos os sinais
+    usados pelas verificações.
+    """
+    # Conteúdo que o get_text() do BeautifulSoup também ignora.
+    _SKIPPED_TEXT_TAGS = {"script", "style", "template"}
+
+    def __init__(self):
+        self.has_h1 = False
+        self.h2_count = 0
+        self.has_list = False
+        self.has_gov_link = False
+        self.text_parts = []
+        # Apenas a primeira div.faq-section é considerada, como no soup.find().
+        self._faq_state = "not_found"
+        self._faq_div_depth = 0
+        self._faq_has_details = False
+        self._faq_has_summary = False
+        self._skip_text_depth = 0
+
+    def start(self, tag, attrib):
+        if tag == "h1":
+            self.has_h1 = True
+        elif tag == "h2":
+            self.h2_count += 1
+        elif tag in ("ul", "ol"):
+            self.has_list = True
+        elif tag == "a" and _GOV_LINK_PATTERN.search(attrib.get("href", "")):
+            self.has_gov_link = True
+        elif tag == "div":
+            if self._faq_state == "open":
+                self._faq_div_depth += 1
+            elif self._faq_state == "not_found" and "faq-section" in attrib.get("class", "").split():
+                self._faq_state = "open"
+        elif tag in self._SKIPPED_TEXT_TAGS:
+            self._skip_text_depth += 1
+
+        if self._faq_state == "open":
+            if tag == "details":
+                self._faq_has_details = True
+            elif tag == "summary":
+                self._faq_has_summary = True
+
+    def end(self, tag):
+        if tag == "div" and self._faq_state == "open":
+            if self._faq_div_depth:
+                self._faq_div_depth -= 1
+            else:
+                self._faq_state = "closed"
+        elif tag in self._SKIPPED_TEXT_TAGS and self._skip_text_depth:
+            self._skip_text_depth -= 1
+
+    def data(self, data):
+        if not self._skip_text_depth:
+            self.text_parts.append(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        return self
+
+    @property
+    def faq_is_valid(self) -> bool:
+        return self._faq_state != "not_found" and self._faq_has_details and self._faq_has_summary
+
+def analyze_seo_performance_from_html(html_content: str) -> Dict[str, Any]:
+    """
+    Função principal que orquestra todas as verificações de SEO baseadas no HTML.
+    Esta é uma implementação em Python para fins de teste e validação,
+    o sistema principal usa o Agente de IA.
+
+    Os sinais são coletados em uma única passada do parser do lxml (ver
+    _HtmlSignalCollector); o resultado é o mesmo de analyze_seo_performance_with_soup.
+    """
+    if not html_content or not isinstance(html_content, str):
+        return {"total_score": 0, "breakdown": {"error": "Conteúdo inválido ou vazio."}}
+
+    parser = etree.HTMLParser(target=_HtmlSignalCollector())
+    try:
+        signals = etree.fromstring(html_content, parser)
+    except (etree.XMLSyntaxError, ValueError):
+        # Documentos sem nenhum elemento (só texto solto, por exemplo) ou com declaração
+        # de encoding não são aceitos pelo lxml; nesses casos raros usamos a implementação original.
+        return analyze_seo_performance_with_soup(html_content)
+
+    return _build_analysis(
+        _headings_result(signals.has_h1, signals.h2_count),
+        _readability_result(signals.has_list),
+        _faq_result(signals.faq_is_valid),
+        _authority_result("".join(signals.text_parts).lower(), signals.has_gov_link),
+    )
+
+def _analyze_chunk(html_contents: list) -> list:
+    return [analyze_seo_performance_from_html(html) for html in html_contents]
+
+def analyze_many(html_iterable: Iterable[str], max_workers: int | None = None, chunksize: int = 500) -> Iterator[Dict[str, Any]]:
+    """
+    Analisa muitas descrições em um pool de processos, devolvendo os resultados na
+    mesma ordem da entrada.
+
+    A entrada é consumida aos poucos, em blocos de `chunksize`, com no máximo dois
+    blocos em andamento por processo, então geradores muito grandes não são
+    carregados inteiros na memória.
+
+    Args:
+        html_iterable: Descrições HTML a analisar.
+        max_workers: Quantidade de processos (padrão: número de CPUs). Com 1, roda no próprio processo.
+        chunksize: Quantidade de descrições enviadas a um processo por vez.
+    """
+    max_workers = max(1, max_workers or os.cpu_count() or 1)
+    html_iterator = iter(html_iterable)
+    chunks = iter(lambda: list(islice(html_iterator, chunksize)), [])
+
+    if max_workers == 1:
+        for chunk in chunks:
+            yield from _analyze_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        pending = []
+        for chunk in chunks:
+            pending.append(executor.submit(_analyze_chunk, chunk))
+            if len(pending) >= max_workers * 2:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+# --- Auditor determinístico (mesmo checklist de 100 pontos do auditor_seo_tecnico.yaml) ---
+
+REQUIRED_PAGE_KEYS = ("seo_title", "meta_description", "html_content")
+
+# Títulos <h2> das seções da lauda mestra, na ordem obrigatória (texto sem acentos, minúsculo).
+SECTION_ORDER_PATTERNS = [
+    ("Para que serve", re.compile(r"para que (e indicado|serve)")),
+    ("Como funciona", re.compile(r"funciona")),
+    ("Contraindicações", re.compile(r"contraindica")),
+    ("Como usar", re.compile(r"como usar")),
+    ("Composição", re.compile(r"composicao")),
+    ("Especificações", re.compile(r"especificac")),
+]
+SPECIFICATION_ROWS = {"fabricante", "principio ativo", "registro ms"}
+LEGAL_NOTICE_PHRASES = ("um medicamento", "seu uso pode trazer riscos", "procure um medico ou um farmaceutico", "leia a bula")
+
+_DOSAGE_PATTERN = re.compile(r"\d+(?:[.,]\d+)?\s?(?:mg|mcg|µg|g|ml|ui|%)(?:/\w+)?\b", re.IGNORECASE)
+_QUANTITY_PATTERN = re.compile(
+    r"\b\d+\s?(?:comprimidos?|c[aá]psulas?|dr[aá]geas?|sach[eê]s?|ampolas?|unidades?|envelopes?|frascos?|"
+    r"pastilhas?|adesivos?|ml|g)\b", re.IGNORECASE)
+_STORE_CTA_PATTERN = re.compile(r"\bmevo ?farma[.!]?$")
+_CTA_HINT_PATTERN = re.compile(r"\b(compre|aproveite|garanta|encontre|confira|pe[cç]a|mevo)\b")
+_REGISTRY_NUMBER_PATTERN = re.compile(r"registro ms:?\s*[\d.\-/]{5,}")
+
+# Verificações que dependem de interpretação. Quando a heurística local não é conclusiva,
+# ficam pendentes e podem ser avaliadas pelo auditor de IA (prompt auditor_seo_subjetivo).
+SUBJECTIVE_CHECKS = {
+    "seo_title_pattern": ("seo_title_format", 7.5),
+    "meta_description_cta": ("meta_description_format", 5),
+}
+
+def _normalize_text(text: str) -> str:
+    """Minúsculas, sem acentos e com espaços colapsados, para comparações tolerantes."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.lower().split())
+
+def _result(score: float, max_score: float, feedback: str) -> Dict[str, Any]:
+    return {"score": score, "max_score": max_score, "feedback": feedback}
+
+def audit_json_structure(page: Any) -> Dict[str, Any]:
+    if not isinstance(page, dict):
+        return _result(0, 5, "A resposta não é um objeto JSON.")
+    missing = [key for key in REQUIRED_PAGE_KEYS if not isinstance(page.get(key), str) or not page[key].strip()]
+    if missing:
+        return _result(0, 5, f"Chaves ausentes ou vazias: {', '.join(missing)}.")
+    return _result(5, 5, "Estrutura JSON correta com todas as chaves.")
+
+def _no_h1_result(has_h1: bool) -> Dict[str, Any]:
+    if has_h1:
+        return _result(0, 5, "O html_content contém a tag <h1>, que é proibida.")
+    return _result(5, 5, "Nenhuma tag H1 proibida foi encontrada.")
+
+def _section_order_result(headings: list) -> Dict[str, Any]:
+    positions = []
+    for label, pattern in SECTION_ORDER_PATTERNS:
+        position = next((i for i, text in enumerate(headings) if pattern.search(text)), None)
+        if position is None:
+            return _result(0, 15, f"Seção '{label}' não encontrada entre os títulos <h2>.")
+        positions.append(position)
+    if positions != sorted(positions):
+        return _result(0, 15, "Os títulos <h2> estão fora da ordem da lauda mestra.")
+    return _result(15, 15, "A ordem das seções está correta.")
+
+def _specifications_table_result(table_rows: list | None) -> Dict[str, Any]:
+    """`table_rows`: textos normalizados das células de cada linha da tabela, ou None sem tabela."""
+    if table_rows is None:
+        return _result(0, 10, "Tabela de especificações não encontrada.")
+
+    rows = {}
+    for cells in table_rows:
+        if cells:
+            rows[cells[0].rstrip(":")] = cells[1] if len(cells) > 1 else ""
+    if set(rows) != SPECIFICATION_ROWS:
+        return _result(0, 10, "A tabela deve ter apenas as linhas Fabricante, Princípio Ativo e Registro MS.")
+    if not all(rows.values()):
+        return _result(0, 10, "A tabela de especificações possui linhas sem valor.")
+    return _result(10, 10, "Tabela de especificações correta.")
+
+def _faq_structure_result(details: list) -> Dict[str, Any]:
+    """`details`: (tem o atributo open, contém <summary>) de cada <details>."""
+    if not details:
+        return _result(0, 15, "Nenhuma pergunta frequente com <details open> e <summary> foi encontrada.")
+    if not all(is_open and has_summary for is_open, has_summary in details):
+        return _result(0, 15, "Todas as perguntas do FAQ devem usar <details open> com <summary>.")
+    return _result(15, 15, "Estrutura de FAQ correta.")
+
+def _legal_notice_result(text: str) -> Dict[str, Any]:
+    if all(phrase in text for phrase in LEGAL_NOTICE_PHRASES):
+        return _result(10, 10, "Aviso legal presente.")
+    return _result(0, 10, "O aviso legal padrão ('... É UM MEDICAMENTO. SEU USO PODE TRAZER RISCOS ...') está ausente ou incompleto.")
+
+def _transparency_note_result(text: str) -> Dict[str, Any]:
+    if "aprovada pela anvisa" not in text:
+        return _result(0, 10, "A nota de transparência da Anvisa está ausente.")
+    if not _REGISTRY_NUMBER_PATTERN.search(text):
+        return _result(0, 10, "A nota de transparência não informa o número do Registro MS.")
+    return _result(10, 10, "Nota de transparência presente.")
+
+def audit_no_h1_tag(soup: BeautifulSoup) -> Dict[str, Any]:
+    return _no_h1_result(bool(soup.find("h1")))
+
+def audit_section_order(soup: BeautifulSoup) -> Dict[str, Any]:
+    # Os <h2> dentro de <summary> pertencem ao FAQ e não fazem parte da ordem das seções.
+    return _section_order_result([_normalize_text(h2.get_text()) for h2 in soup.find_all("h2") if not h2.find_parent("summary")])
+
+def audit_specifications_table(soup: BeautifulSoup) -> Dict[str, Any]:
+    heading = next((h2 for h2 in soup.find_all("h2") if "especificac" in _normalize_text(h2.get_text())), None)
+    table = heading.find_next("table") if heading else soup.find("table")
+    if table is None:
+        return _specifications_table_result(None)
+    return _specifications_table_result([[_normalize_text(cell.get_text()) for cell in tr.find_all(["th", "td"])] for tr in table.find_all("tr")])
+
+def audit_faq_structure(soup: BeautifulSoup) -> Dict[str, Any]:
+    return _faq_structure_result([(item.has_attr("open"), item.find("summary") is not None) for item in soup.find_all("details")])
+
+def audit_legal_notice(soup: BeautifulSoup) -> Dict[str, Any]:
+    box = soup.find("div", class_="legal-notice-box")
+    return _legal_notice_result(_normalize_text((box or soup).get_text(" ")))
+
+def audit_transparency_note(soup: BeautifulSoup) -> Dict[str, Any]:
+    note = soup.find(class_="transparency-note-final")
+    return _transparency_note_result(_normalize_text((note or soup).get_text(" ")))
+
+# Versões sobre a árvore do lxml (parser em C, consultas em XPath), usadas por
+# audit_page_json; o resultado é o mesmo das funções sobre o BeautifulSoup acima.
+def _has_class(class_name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+def _tree_text(element, separator: str = "") -> str:
+    # etree.Element como filtro deixa de fora o texto de comentários, como o get_text().
+    return separator.join(element.itertext(etree.Element))
+
+def _audit_html_tree(root) -> Dict[str, Dict[str, Any]]:
+    h2_elements = root.xpath("//h2")
+    section_headings = [_normalize_text(_tree_text(h2)) for h2 in root.xpath("//h2[not(ancestor::summary)]")]
+
+    spec_heading = next((h2 for h2 in h2_elements if "especificac" in _normalize_text(_tree_text(h2))), None)
+    tables = spec_heading.xpath("following::table[1]") if spec_heading is not None else root.xpath("(//table)[1]")
+    table_rows = None
+    if tables:
+        table_rows = [[_normalize_text(_tree_text(cell)) for cell in tr.iter("th", "td")] for tr in tables[0].iter("tr")]
+
+    legal_box = root.xpath(f"(//div[{_has_class('legal-notice-box')}])[1]")
+    note = root.xpath(f"(//*[{_has_class('transparency-note-final')}])[1]")
+    return {
+        "no_h1_tag": _no_h1_result(bool(root.xpath("//h1"))),
+        "section_order": _section_order_result(section_headings),
+        "specifications_table": _specifications_table_result(table_rows),
+        "faq_structure": _faq_structure_result([("open" in item.attrib, bool(item.xpath(".//summary"))) for item in root.iter("details")]),
+        "legal_notice": _legal_notice_result(_normalize_text(_tree_text(legal_box[0] if legal_box else root, " "))),
+        "transparency_note": _transparency_note_result(_normalize_text(_tree_text(note[0] if note else root, " "))),
+    }
+
+def _audit_html_soup(html_content: str) -> Dict[str, Dict[str, Any]]:
+    soup = BeautifulSoup(html_content, "html.parser")
+    return {
+        "no_h1_tag": audit_no_h1_tag(soup),
+        "section_order": audit_section_order(soup),
+        "specifications_table": audit_specifications_table(soup),
+        "faq_structure": audit_faq_structure(soup),
+        "legal_notice": audit_legal_notice(soup),
+        "transparency_note": audit_transparency_note(soup),
+    }
+
+def _audit_html(html_content: str) -> Dict[str, Dict[str, Any]]:
+    """Verificações do html_content: árvore do lxml, com o BeautifulSoup para o que o lxml recusa."""
+    try:
+        root = etree.fromstring(html_content, etree.HTMLParser()) if html_content.strip() else None
+    except (etree.XMLSyntaxError, ValueError):
+        # Ex: declaração de encoding em uma string (ValueError) ou documento sem elementos.
+        root = None
+    if root is None:
+        return _audit_html_soup(html_content)
+    return _audit_html_tree(root)
+
+def _title_pattern_verdict(seo_title: str, product_name: str | None) -> bool | None:
+    """
+    Padrão [Produto] [Dosagem] [Fabricante] [Quantidade]. Retorna True/False quando a
+    heurística é conclusiva e None quando o título precisa de avaliação subjetiva.
+    """
+    normalized = _normalize_text(seo_title)
+    base_name = _normalize_text(product_name).split(" ")[0] if product_name else ""
+    if base_name and base_name not in normalized:
+        return False
+    dosage = _DOSAGE_PATTERN.search(seo_title)
+    quantity = None
+    if dosage:
+        quantity = next((match for match in _QUANTITY_PATTERN.finditer(seo_title, dosage.end()) if match.start() > dosage.end()), None)
+    if base_name and dosage and quantity and normalized.startswith(base_name):
+        # Entre a dosagem e a quantidade deve sobrar o nome do fabricante.
+        if seo_title[dosage.end():quantity.start()].strip():
+            return True
+    return None
+
+def _meta_cta_verdict(meta_description: str) -> bool | None:
+    normalized = _normalize_text(meta_description)
+    if _STORE_CTA_PATTERN.search(normalized):
+        return True
+    last_sentence = re.split(r"[.!?]\s", normalized.rstrip(".!? "))[-1]
+    return None if _CTA_HINT_PATTERN.search(last_sentence) else False
+
+def audit_seo_title_format(seo_title: str, product_name: str | None, pending: Dict[str, float]) -> Dict[str, Any]:
+    score, feedback = 0.0, []
+    verdict = _title_pattern_verdict(seo_title, product_name)
+    if verdict:
+        score += 7.5
+        feedback.append("O título segue o padrão [Produto] [Dosagem] [Fabricante] [Quantidade].")
+    elif verdict is None:
+        pending["seo_title_pattern"] = SUBJECTIVE_CHECKS["seo_title_pattern"][1]
+        feedback.append("Padrão do título pendente de avaliação.")
+    else:
+        feedback.append("O título não segue o padrão [Produto] [Dosagem] [Fabricante] [Quantidade].")
+
+    length = len(seo_title.strip())
+    if 50 <= length <= 65:
+        score += 7.5
+        feedback.append(f"Comprimento ideal ({length} caracteres).")
+    else:
+        feedback.append(f"O título tem {length} caracteres; o ideal é entre 50 e 65.")
+    return _result(score, 15, " ".join(feedback))
+
+def audit_meta_description_format(meta_description: str, pending: Dict[str, float]) -> Dict[str, Any]:
+    score, feedback = 0.0, []
+    length = len(meta_description.strip())
+    if 120 <= length <= 165:
+        score += 5
+        feedback.append(f"Comprimento ideal ({length} caracteres).")
+    else:
+        feedback.append(f"A meta descrição tem {length} caracteres; o ideal é entre 120 e 165.")
+
+    if re.search(r"\bbula\b", _normalize_text(meta_description)):
+        feedback.append("A meta descrição não deve conter a palavra 'bula'.")
+    else:
+        score += 5
+
+    verdict = _meta_cta_verdict(meta_description)
+    if verdict:
+        score += 5
+        feedback.append("Termina com a chamada para a loja.")
+    elif verdict is None:
+        pending["meta_description_cta"] = SUBJECTIVE_CHECKS["meta_description_cta"][1]
+        feedback.append("Chamada para a loja pendente de avaliação.")
+    else:
+        feedback.append("A meta descrição deve terminar com uma chamada para a loja, como 'na Mevo Farma'.")
+    return _result(score, 15, " ".join(feedback))
+
+def _total_score(breakdown: Dict[str, Any]) -> float:
+    total = sum(item["score"] for item in breakdown.values())
+    return int(total) if float(total).is_integer() else total
+
+def audit_page_json(page: Any, product_name: str | None = None) -> Dict[str, Any]:
+    """
+    Reproduz localmente o checklist do auditor de IA, em microssegundos.
+
+    Args:
+        page: O JSON gerado (seo_title, meta_description, html_content).
+        product_name: Nome do produto, usado na verificação do padrão do título.
+
+    Returns:
+        {"seo_score", "score_breakdown", "pending_checks"}, com o mesmo formato de
+        score_breakdown do auditor de IA. `pending_checks` traz as verificações
+        subjetivas não conclusivas e quantos pontos cada uma ainda pode somar.
+    """
+    structure = audit_json_structure(page)
+    page = page if isinstance(page, dict) else {}
+    pending: Dict[str, float] = {}
+
+    breakdown = {
+        "json_structure": structure,
+        **_audit_html(str(page.get("html_content") or "")),
+        "seo_title_format": audit_seo_title_format(str(page.get("seo_title") or ""), product_name, pending),
+        "meta_description_format": audit_meta_description_format(str(page.get("meta_description") or ""), pending),
+    }
+    return {"seo_score": _total_score(breakdown), "score_breakdown": breakdown, "pending_checks": pending}
+
+def apply_subjective_verdicts(audit: Dict[str, Any], verdicts: Dict[str, Any] | None) -> Dict[str, Any]:
+    """
+    Soma ao resultado local os pontos das verificações subjetivas avaliadas pela IA.
+    Verificações sem veredito válido ficam sem os pontos.
+
+    Args:
+        audit: Resultado de audit_page_json.
+        verdicts: {nome da verificação: {"passed": bool, "feedback": str}}.
+    """
+    verdicts = verdicts or {}
+    breakdown = audit["score_breakdown"]
+    for check_name, points in audit.get("pending_checks", {}).items():
+        breakdown_key = SUBJECTIVE_CHECKS[check_name][0]
+        verdict = verdicts.get(check_name)
+        item = breakdown[breakdown_key]
+        if isinstance(verdict, dict) and verdict.get("passed") is True:
+            item["score"] += points
+        feedback = verdict.get("feedback") if isinstance(verdict, dict) else None
+        item["feedback"] += f" Avaliação subjetiva: {feedback or 'sem resposta válida do auditor.'}"
+    audit["pending_checks"] = {}
+    audit["seo_score"] = _total_score(breakdown)
+    return audit
+
+def credit_skipped_checks(audit: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Encerra as verificações subjetivas que não foram enviadas à IA por não alterarem
+    o resultado da meta de score: os pontos são creditados (a heurística não as
+    reprovou) e elas ficam listadas em `skipped_checks`, separadas das reprovações.
+
+    Args:
+        audit: Resultado de audit_page_json.
+    """
+    breakdown = audit["score_breakdown"]
+    skipped = dict(audit.get("pending_checks", {}))
+    for check_name, points in skipped.items():
+        item = breakdown[SUBJECTIVE_CHECKS[check_name][0]]
+        item["score"] += points
+        item["feedback"] += " Avaliação subjetiva não realizada (não alteraria a meta de score); pontos creditados."
+    audit["pending_checks"] = {}
+    audit["skipped_checks"] = skipped
+    audit["seo_score"] = _total_score(breakdown)
+    return audit
@@ -0,0 +1,89 @@
+# app/sku_index.py
+import io
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable
+
+import openpyxl
+
+
+def normalize_sku(value) -> str:
+    """
+    Normaliza um SKU vindo da planilha ou do frontend para comparação:
+    123, 123.0, "123" e " 123 " resultam todos em "123".
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def column_positions(header: Iterable) -> Dict[Any, int]:
+    """Mapa nome da coluna -> índice no cabeçalho (para nomes repetidos, vale a primeira coluna, como em list.index)."""
+    positions = {}
+    for index, name in enumerate(header):
+        positions.setdefault(name, index)
+    return positions
+
+
+@dataclass
+class SkuRow:
+    """Linha da planilha associada a um SKU."""
+    row_number: int  # Número da linha no Excel (o cabeçalho é a linha 1)
+    fields: Dict[str, Any] = field(default_factory=dict)
+
+
+class SkuIndex:
+    """
+    Índice SKU -> linha construído em uma única passada pela planilha, para
+    buscas O(1) nos endpoints de revisão e finalização.
+    """
+    def __init__(self, rows: Dict[str, SkuRow], header: list):
+        self._rows = rows
+        self.header = header
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple], key_column: str, fields: Iterable[str] = ()) -> "SkuIndex":
+        """
+        Constrói o índice a partir das linhas da planilha (a primeira é o cabeçalho).
+
+        Raises:
+            ValueError: Se a coluna-chave não existir no cabeçalho.
+        """
+        rows = iter(rows)
+        header = list(next(rows, ()))
+        if key_column not in header:
+            raise ValueError(key_column)
+        positions = column_positions(header)
+        key_idx = positions[key_column]
+        field_positions = {name: positions[name] for name in fields if name in positions}
+
+        index = {}
+        for row_number, row in enumerate(rows, start=2):
+            sku = normalize_sku(row[key_idx] if key_idx < len(row) else None)
+            # Mantém a primeira ocorrência, como a busca anterior com DataFrame.
+            if not sku or sku in index:
+                continue
+            index[sku] = SkuRow(
+                row_number=row_number,
+                fields={name: row[pos] if pos < len(row) else None for name, pos in field_positions.items()},
+            )
+        return cls(index, header)
+
+    @classmethod
+    def from_excel_bytes(cls, file_bytes: bytes, key_column: str, fields: Iterable[str] = ()) -> "SkuIndex":
+        """Constrói o índice lendo um .xlsx em modo read_only."""
+        workbook = openpyxl.load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True)
+        try:
+            return cls.from_rows(workbook.active.iter_rows(values_only=True), key_column, fields)
+        finally:
+            workbook.close()
+
+    def get(self, sku) -> SkuRow | None:
+        return self._rows.get(normalize_sku(sku))
+
+    def __contains__(self, sku) -> bool:
+        return normalize_sku(sku) in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
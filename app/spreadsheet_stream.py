@@ -0,0 +1,104 @@
+# app/spreadsheet_stream.py
+import io
+from typing import Iterator, Iterable
+
+import pandas as pd
+
+from config import settings
+
+
+def _resolve_excel_engine(engine: str | None) -> str:
+    """
+    Escolhe o leitor de xlsx. 'auto' usa o python-calamine (Rust, bem mais rápido)
+    quando instalado e o openpyxl em modo read_only caso contrário.
+    """
+    engine = (engine or settings.SPREADSHEET_ENGINE).lower()
+    if engine != "auto":
+        return engine
+    try:
+        import python_calamine  # noqa: F401
+        return "calamine"
+    except ImportError:
+        return "openpyxl"
+
+
+def _iter_openpyxl_rows(file_bytes: bytes) -> Iterator[tuple]:
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _normalize_calamine_cell(value):
+    # O calamine devolve números inteiros como float e células vazias como ''.
+    if value == "":
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _iter_calamine_rows(file_bytes: bytes) -> Iterator[tuple]:
+    from python_calamine import CalamineWorkbook
+
+    sheet = CalamineWorkbook.from_filelike(io.BytesIO(file_bytes)).get_sheet_by_index(0)
+    for row in sheet.iter_rows():
+        yield tuple(_normalize_calamine_cell(value) for value in row)
+
+
+def _batch_rows(rows: Iterable[tuple], batch_size: int) -> Iterator[pd.DataFrame]:
+    """Agrupa as linhas (a primeira é o cabeçalho) em DataFrames de até batch_size linhas."""
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = [str(name) if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+
+    batch = []
+    pending_empty_rows = 0
+    for row in rows:
+        # Linhas totalmente vazias só são descartadas no final da planilha (comuns em
+        # planilhas formatadas); no meio, são mantidas para preservar a posição das linhas.
+        if all(value is None for value in row):
+            pending_empty_rows += 1
+            continue
+        for _ in range(pending_empty_rows):
+            batch.append((None,) * len(columns))
+            if len(batch) >= batch_size:
+                yield pd.DataFrame.from_records(batch, columns=columns)
+                batch = []
+        pending_empty_rows = 0
+        batch.append(row[:len(columns)])
+        if len(batch) >= batch_size:
+            yield pd.DataFrame.from_records(batch, columns=columns)
+            batch = []
+    if batch:
+        yield pd.DataFrame.from_records(batch, columns=columns)
+
+
+def iter_spreadsheet_batches(file_bytes: bytes, filename: str, batch_size: int, engine: str | None = None) -> Iterator[pd.DataFrame]:
+    """
+    Lê uma planilha xlsx/csv de forma incremental, em lotes tipados de até batch_size linhas.
+
+    O primeiro lote fica disponível sem que o arquivo inteiro seja convertido em
+    DataFrame, então o tempo até o primeiro item e o pico de memória não dependem
+    do tamanho do arquivo.
+
+    Args:
+        file_bytes: Conteúdo do arquivo.
+        filename: Nome do arquivo, usado para detectar CSV.
+        batch_size: Quantidade máxima de linhas por lote.
+        engine: 'auto', 'openpyxl' ou 'calamine' (apenas xlsx). Padrão: settings.SPREADSHEET_ENGINE.
+    """
+    if filename.lower().endswith('.csv'):
+        yield from pd.read_csv(io.BytesIO(file_bytes), sep=',', encoding='utf-8-sig', chunksize=batch_size)
+        return
+
+    if _resolve_excel_engine(engine) == "calamine":
+        rows = _iter_calamine_rows(file_bytes)
+    else:
+        rows = _iter_openpyxl_rows(file_bytes)
+    yield from _batch_rows(rows, batch_size)
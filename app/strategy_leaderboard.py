@@ -0,0 +1,164 @@
+# app/strategy_leaderboard.py
+import bisect
+import heapq
+import math
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Iterable, List
+
+ALL_PRODUCT_TYPES = "*"
+
+
+def _parse_timestamp(value) -> float:
+    """Timestamp ISO do ledger em segundos desde a época (0 se ausente ou inválido)."""
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return 0.0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+@dataclass
+class StrategyStats:
+    """Agregado de uma estratégia para um tipo de produto."""
+    strategy: str
+    count: int = 0
+    total: float = 0.0
+    improvements: List[float] = field(default_factory=list)  # Mantida ordenada, para a mediana.
+    decayed_total: float = 0.0
+    decayed_weight: float = 0.0
+    last_seen: float = 0.0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def median(self) -> float:
+        values, middle = self.improvements, len(self.improvements) // 2
+        if not values:
+            return 0.0
+        return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+    @property
+    def decayed_mean(self) -> float:
+        """Média ponderada pela recência: cada meia-vida reduz pela metade o peso de um registro."""
+        return self.decayed_total / self.decayed_weight if self.decayed_weight else 0.0
+
+
+class _LazyRankedHeap:
+    """
+    Heap com invalidação preguiçosa: cada atualização empilha uma nova entrada e as
+    antigas são descartadas quando aparecem no topo. A consulta dos k primeiros
+    custa O(k log n), sem ordenar todos os itens.
+    """
+    def __init__(self):
+        self._heap = []
+        self._current = {}
+        self._sequence = 0
+
+    def update(self, name: str, sort_key: float | None):
+        """Atualiza a posição do item; sort_key None o remove do ranking."""
+        self._sequence += 1
+        if sort_key is None:
+            self._current.pop(name, None)
+        else:
+            self._current[name] = self._sequence
+            heapq.heappush(self._heap, (sort_key, self._sequence, name))
+        if len(self._heap) > 2 * len(self._current) + 32:
+            self._heap = [entry for entry in self._heap if self._current.get(entry[2]) == entry[1]]
+            heapq.heapify(self._heap)
+
+    def top(self, k: int, accept=lambda name: True) -> List[str]:
+        popped, result = [], []
+        while self._heap and len(result) < k:
+            entry = heapq.heappop(self._heap)
+            if self._current.get(entry[2]) != entry[1]:
+                continue
+            popped.append(entry)
+            if accept(entry[2]):
+                result.append(entry[2])
+        for entry in popped:
+            heapq.heappush(self._heap, entry)
+        return result
+
+
+class StrategyLeaderboard:
+    """
+    Ranking das estratégias mantido de forma incremental a cada registro do ledger.
+
+    Para cada (tipo de produto, estratégia) guarda contagem, média, mediana e média
+    com decaimento temporal; estratégias repetidas no ledger viram um único item.
+    Os rankings de sucesso (maior média com decaimento) e de falha (menor) ficam
+    em heaps, então as listas Top-N saem em O(k log n).
+    """
+    def __init__(self, half_life_days: float = 30.0, min_samples: int = 1):
+        self.half_life_seconds = max(half_life_days, 0.001) * 86400
+        self.min_samples = max(1, int(min_samples))
+        self._stats: dict[tuple[str, str], StrategyStats] = {}
+        self._success: dict[str, _LazyRankedHeap] = {}
+        self._failure: dict[str, _LazyRankedHeap] = {}
+        self._anchor = None
+        self._lock = threading.Lock()
+
+    def _weight(self, timestamp: float) -> float:
+        # O peso é relativo a um instante fixo (o primeiro registro visto): como a razão
+        # entre pesos não depende do "agora", os agregados nunca precisam ser recalculados.
+        if self._anchor is None:
+            self._anchor = timestamp
+        exponent = (timestamp - self._anchor) / self.half_life_seconds
+        return math.pow(2.0, max(min(exponent, 1000.0), -1000.0))
+
+    def _add_to(self, product_type: str, strategy: str, improvement: float, timestamp: float, weight: float):
+        stats = self._stats.get((product_type, strategy))
+        if stats is None:
+            stats = self._stats[(product_type, strategy)] = StrategyStats(strategy)
+        stats.count += 1
+        stats.total += improvement
+        bisect.insort(stats.improvements, improvement)
+        stats.decayed_total += weight * improvement
+        stats.decayed_weight += weight
+        stats.last_seen = max(stats.last_seen, timestamp)
+
+        eligible = stats.count >= self.min_samples
+        score = stats.decayed_mean
+        success_heap = self._success.setdefault(product_type, _LazyRankedHeap())
+        failure_heap = self._failure.setdefault(product_type, _LazyRankedHeap())
+        success_heap.update(strategy, -score if eligible and score > 0 else None)
+        failure_heap.update(strategy, score if eligible and score <= 0 else None)
+
+    def add(self, record: dict):
+        """Incorpora um registro do ledger aos agregados."""
+        strategy = record.get("estrategia_aplicada")
+        if not strategy:
+            return
+        try:
+            improvement = float(record.get("melhora_score", 0))
+        except (TypeError, ValueError):
+            return
+        timestamp = _parse_timestamp(record.get("timestamp"))
+        product_type = record.get("tipo_de_produto") or ""
+        with self._lock:
+            weight = self._weight(timestamp)
+            self._add_to(product_type, strategy, improvement, timestamp, weight)
+            self._add_to(ALL_PRODUCT_TYPES, strategy, improvement, timestamp, weight)
+
+    def add_many(self, records: Iterable[dict]):
+        for record in records:
+            self.add(record)
+
+    def has_product_type(self, product_type: str) -> bool:
+        return product_type in self._success
+
+    def top_successes(self, product_type: str, k: int) -> List[StrategyStats]:
+        with self._lock:
+            heap = self._success.get(product_type)
+            return [self._stats[(product_type, name)] for name in heap.top(k)] if heap else []
+
+    def top_failures(self, product_type: str, k: int) -> List[StrategyStats]:
+        with self._lock:
+            heap = self._failure.get(product_type)
+            return [self._stats[(product_type, name)] for name in heap.top(k)] if heap else []
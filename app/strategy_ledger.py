@@ -0,0 +1,313 @@
+# app/strategy_ledger.py
+import abc
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Iterator, List
+
+# Campos fixos de cada registro do ledger; campos extras são preservados em JSON.
+LEDGER_FIELDS = ("estrategia_aplicada", "tipo_de_produto", "texto_original_score", "novo_texto_score", "melhora_score", "timestamp")
+
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextlib.contextmanager
+def _exclusive_file_lock(lock_path: str):
+    """Lock exclusivo entre processos baseado em um arquivo (fcntl no POSIX, msvcrt no Windows)."""
+    with open(lock_path, "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class LedgerBackend(abc.ABC):
+    """Interface dos armazenamentos do ledger de estratégias."""
+
+    @abc.abstractmethod
+    def append(self, record: dict):
+        """Grava um registro no fim do ledger."""
+
+    @abc.abstractmethod
+    def append_many_if_empty(self, records: List[dict]) -> int:
+        """Grava os registros apenas se o ledger estiver vazio (usado na migração). Retorna quantos foram gravados."""
+
+    @abc.abstractmethod
+    def records(self, product_type: str | None = None) -> List[dict]:
+        """Registros em ordem de gravação, opcionalmente filtrados por tipo de produto."""
+
+    def count(self) -> int:
+        return len(self.records())
+
+    def records_after(self, cursor: int) -> tuple[List[dict], int]:
+        """
+        Registros gravados depois da posição `cursor` (inclusive por outros processos)
+        e a nova posição, para quem mantém agregados incrementais sobre o ledger.
+        """
+        ledger = self.records()
+        return ledger[cursor:], len(ledger)
+
+
+class JsonFileLedgerBackend(LedgerBackend):
+    """
+    Formato original: uma lista JSON reescrita por completo a cada registro.
+    Mantido por compatibilidade; a escrita agora é protegida por lock entre processos.
+    """
+    def __init__(self, path: str):
+        self.path = str(path)
+
+    def _read(self) -> list:
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            return []
+        except (json.JSONDecodeError, FileNotFoundError):
+            return []
+
+    def _write(self, ledger: list):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(ledger, f, indent=2, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def append(self, record: dict):
+        with _exclusive_file_lock(f"{self.path}.lock"):
+            ledger = self._read()
+            ledger.append(record)
+            self._write(ledger)
+
+    def append_many_if_empty(self, records: List[dict]) -> int:
+        with _exclusive_file_lock(f"{self.path}.lock"):
+            if self._read():
+                return 0
+            self._write(list(records))
+        return len(records)
+
+    def records(self, product_type: str | None = None) -> List[dict]:
+        ledger = self._read()
+        if product_type is None:
+            return ledger
+        return [record for record in ledger if record.get('tipo_de_produto') == product_type]
+
+
+class JsonlLedgerBackend(LedgerBackend):
+    """
+    Um registro por linha (JSON Lines), gravado em modo append sob lock de arquivo:
+    cada gravação é O(1) e segura com vários processos escrevendo.
+
+    As leituras são incrementais: apenas os bytes acrescentados desde a última
+    leitura são interpretados, e os registros ficam indexados por tipo de produto.
+    """
+    def __init__(self, path: str):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._offset = 0
+        self._all: List[dict] = []
+        self._by_type: dict[str, List[dict]] = {}
+
+    def _append_lines(self, records: List[dict]):
+        payload = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        with open(self.path, "a+b") as f:
+            # Uma gravação interrompida pode ter deixado a última linha sem o "\n":
+            # a nova linha começa depois dela, em vez de ser colada nela.
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    payload = "\n" + payload
+            f.write(payload.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def append(self, record: dict):
+        with _exclusive_file_lock(f"{self.path}.lock"):
+            self._append_lines([record])
+
+    def append_many_if_empty(self, records: List[dict]) -> int:
+        with _exclusive_file_lock(f"{self.path}.lock"):
+            if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                return 0
+            self._append_lines(records)
+        return len(records)
+
+    def _catch_up(self):
+        """Lê apenas as linhas completas acrescentadas desde a última leitura."""
+        if not os.path.exists(self.path):
+            return
+        if os.path.getsize(self.path) < self._offset:
+            # O arquivo foi substituído ou truncado: reconstrói o índice do zero.
+            self._offset, self._all, self._by_type = 0, [], {}
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read()
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            self._all.append(record)
+            self._by_type.setdefault(record.get("tipo_de_produto"), []).append(record)
+        self._offset += end
+
+    def records(self, product_type: str | None = None) -> List[dict]:
+        with self._lock:
+            self._catch_up()
+            if product_type is None:
+                return list(self._all)
+            return list(self._by_type.get(product_type, []))
+
+    def count(self) -> int:
+        with self._lock:
+            self._catch_up()
+            return len(self._all)
+
+    def records_after(self, cursor: int) -> tuple[List[dict], int]:
+        # Aqui o cursor é a quantidade de registros já lidos: só os novos são copiados.
+        with self._lock:
+            self._catch_up()
+            return self._all[cursor:], len(self._all)
+
+
+class SqliteLedgerBackend(LedgerBackend):
+    """
+    Ledger em SQLite (modo WAL), com índice em tipo_de_produto. Vários processos
+    podem gravar ao mesmo tempo; o busy_timeout faz cada um aguardar a sua vez.
+    """
+    def __init__(self, path: str, busy_timeout_ms: int = 10000):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=busy_timeout_ms / 1000)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS strategies ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " estrategia_aplicada TEXT,"
+            " tipo_de_produto TEXT,"
+            " texto_original_score REAL,"
+            " novo_texto_score REAL,"
+            " melhora_score REAL,"
+            " timestamp TEXT,"
+            " extra TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_strategies_tipo ON strategies (tipo_de_produto)")
+
+    @staticmethod
+    def _to_row(record: dict) -> tuple:
+        extra = {key: value for key, value in record.items() if key not in LEDGER_FIELDS}
+        return tuple(record.get(name) for name in LEDGER_FIELDS) + (json.dumps(extra, ensure_ascii=False) if extra else None,)
+
+    @staticmethod
+    def _from_row(row: tuple) -> dict:
+        record = dict(zip(LEDGER_FIELDS, row[:-1]))
+        for name in ("texto_original_score", "novo_texto_score", "melhora_score"):
+            # As colunas são REAL: devolve inteiros como int, como no JSON original.
+            if isinstance(record[name], float) and record[name].is_integer():
+                record[name] = int(record[name])
+        if row[-1]:
+            record.update(json.loads(row[-1]))
+        return record
+
+    def _insert(self, records: List[dict]):
+        self._conn.executemany(
+            f"INSERT INTO strategies ({', '.join(LEDGER_FIELDS)}, extra) VALUES ({', '.join('?' * (len(LEDGER_FIELDS) + 1))})",
+            [self._to_row(record) for record in records],
+        )
+
+    def append(self, record: dict):
+        with self._lock:
+            self._insert([record])
+
+    def append_many_if_empty(self, records: List[dict]) -> int:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._conn.execute("SELECT 1 FROM strategies LIMIT 1").fetchone():
+                    self._conn.execute("ROLLBACK")
+                    return 0
+                self._insert(records)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(records)
+
+    def _iter_rows(self, product_type: str | None) -> Iterator[tuple]:
+        columns = f"{', '.join(LEDGER_FIELDS)}, extra"
+        if product_type is None:
+            return self._conn.execute(f"SELECT {columns} FROM strategies ORDER BY id")
+        return self._conn.execute(f"SELECT {columns} FROM strategies WHERE tipo_de_produto = ? ORDER BY id", (product_type,))
+
+    def records(self, product_type: str | None = None) -> List[dict]:
+        with self._lock:
+            return [self._from_row(row) for row in self._iter_rows(product_type)]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM strategies").fetchone()[0]
+
+    def records_after(self, cursor: int) -> tuple[List[dict], int]:
+        # Aqui o cursor é o id do último registro lido.
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(LEDGER_FIELDS)}, extra, id FROM strategies WHERE id > ? ORDER BY id", (cursor,)
+            ).fetchall()
+        if not rows:
+            return [], cursor
+        return [self._from_row(row[:-1]) for row in rows], rows[-1][-1]
+
+
+def create_ledger_backend(kind: str, path: str) -> LedgerBackend:
+    """
+    Cria o armazenamento do ledger.
+
+    Args:
+        kind: 'sqlite', 'jsonl' ou 'json' (formato original).
+        path: Caminho do arquivo.
+
+    Raises:
+        ValueError: Se o tipo não for reconhecido.
+    """
+    backends = {"sqlite": SqliteLedgerBackend, "jsonl": JsonlLedgerBackend, "json": JsonFileLedgerBackend}
+    if kind not in backends:
+        raise ValueError(f"Tipo de ledger desconhecido: '{kind}'. Use um de: {list(backends)}.")
+    return backends[kind](path)
+
+
+def migrate_json_ledger(json_path: str, backend: LedgerBackend) -> int:
+    """
+    Migração única do arquivo JSON original para outro armazenamento: os registros
+    só são copiados se o destino ainda estiver vazio, então executar de novo não
+    duplica nada. O arquivo JSON não é alterado.
+
+    Returns:
+        Quantidade de registros migrados.
+    """
+    if isinstance(backend, JsonFileLedgerBackend) and os.path.abspath(backend.path) == os.path.abspath(json_path):
+        return 0
+    legacy_records = JsonFileLedgerBackend(json_path).records()
+    if not legacy_records:
+        return 0
+    migrated = backend.append_many_if_empty(legacy_records)
+    if migrated:
+        print(f"Ledger de estratégias: {migrated} registros migrados de '{os.path.basename(json_path)}'.")
+    return migrated
@@ -1,34 +1,46 @@
 # app/strategy_manager.py
 import os
-import json
 from datetime import datetime, timezone
 from typing import Tuple
 
 from collections import defaultdict
 
+from config import settings
+from .strategy_leaderboard import ALL_PRODUCT_TYPES, StrategyLeaderboard, StrategyStats
+from .strategy_ledger import LedgerBackend, create_ledger_backend, migrate_json_ledger
+
 class StrategyManager:
     """
     Gerencia a leitura e escrita do ledger de estratégias de SEO,
     fornecendo aprendizado histórico para o otimizador.
+
+    O armazenamento é plugável (ver app/strategy_ledger.py): por padrão usa o
+    configurado em settings.STRATEGY_LEDGER_BACKEND e, na primeira execução,
+    migra os registros do arquivo JSON original.
+
+    As consultas são atendidas por um StrategyLeaderboard em memória, atualizado
+    incrementalmente com os registros novos do ledger (inclusive de outros processos).
     """
-    def __init__(self, ledger_file='estrategias_pharma_seo.json'):
+    def __init__(self, ledger_file='estrategias_pharma_seo.json', backend: LedgerBackend | None = None):
         project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         self.ledger_file = os.path.join(project_root, ledger_file)
+        if backend is None:
+            backend_path = self.ledger_file if settings.STRATEGY_LEDGER_BACKEND == "json" else settings.STRATEGY_LEDGER_PATH
+            backend = create_ledger_backend(settings.STRATEGY_LEDGER_BACKEND, backend_path)
+            migrate_json_ledger(self.ledger_file, backend)
+        self.backend = backend
+        self.leaderboard = StrategyLeaderboard(settings.STRATEGY_DECAY_HALF_LIFE_DAYS, settings.STRATEGY_MIN_SAMPLES)
+        self._ledger_cursor = 0
+        self._sync_leaderboard()
+
+    def _sync_leaderboard(self):
+        """Incorpora ao ranking os registros gravados desde a última sincronização."""
+        new_records, self._ledger_cursor = self.backend.records_after(self._ledger_cursor)
+        self.leaderboard.add_many(new_records)
 
     def _read_ledger(self) -> list:
-        """Lê o arquivo de estratégias de forma segura."""
-        try:
-            if os.path.exists(self.ledger_file) and os.path.getsize(self.ledger_file) > 0:
-                with open(self.ledger_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return []
-        except (json.JSONDecodeError, FileNotFoundError):
-            return []
-
-    def _write_ledger(self, ledger: list):
-        """Escreve no arquivo de estratégias de forma segura."""
-        with open(self.ledger_file, 'w', encoding='utf-8') as f:
-            json.dump(ledger, f, indent=2, ensure_ascii=False)
+        """Lê todos os registros do ledger."""
+        return self.backend.records()
 
     def _derive_strategy_from_feedback(self, analysis_before: dict, analysis_after: dict) -> str:
         """
@@ -70,11 +82,14 @@ class StrategyManager:
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
 
-        ledger = self._read_ledger()
-        ledger.append(record)
-        self._write_ledger(ledger)
+        self.backend.append(record)
+        self._sync_leaderboard()
         print(f"Estratégia registrada: {strategy_description} (Melhora: {score_improvement})")
 
+    @staticmethod
+    def _format_stats(stats: StrategyStats) -> str:
+        return f"{round(stats.decayed_mean, 1):g} em média, mediana {round(stats.median, 1):g}, {stats.count} registro(s)"
+
     def get_strategies(self, product_type: str, top_n: int = 3) -> Tuple[str, str]:
         """
         Obtém as melhores e piores estratégias do histórico para o tipo de produto.
@@ -84,21 +99,15 @@ class StrategyManager:
         default_fail_msg = "Nenhuma estratégia de falha registrada."
         # ---> FIM DA MODIFICAÇÃO <---
 
-        ledger = self._read_ledger()
-        if not ledger:
-            return default_success_msg, default_fail_msg
-
-        relevant_strategies = [s for s in ledger if s.get('tipo_de_produto') == product_type]
-        if not relevant_strategies:
-            relevant_strategies = ledger
-
-        sorted_strategies = sorted(relevant_strategies, key=lambda x: x['melhora_score'], reverse=True)
-        
-        successful = sorted_strategies[:top_n]
-        successful_str = "\n".join([f"- {s['estrategia_aplicada']} (Melhora de Score: +{s['melhora_score']})" for s in successful if s['melhora_score'] > 0])
-        
-        failed = [s for s in sorted_strategies if s['melhora_score'] <= 0]
-        failed_str = "\n".join([f"- {s['estrategia_aplicada']} (Piora de Score: {s['melhora_score']})" for s in failed[:top_n]])
+        self._sync_leaderboard()
+        # Sem histórico para o tipo de produto, usa o ranking de todos os tipos.
+        ranking_key = product_type if self.leaderboard.has_product_type(product_type) else ALL_PRODUCT_TYPES
+
+        successful = self.leaderboard.top_successes(ranking_key, top_n)
+        successful_str = "\n".join(f"- {s.strategy} (Melhora de Score: +{self._format_stats(s)})" for s in successful)
+
+        failed = self.leaderboard.top_failures(ranking_key, top_n)
+        failed_str = "\n".join(f"- {s.strategy} (Piora de Score: {self._format_stats(s)})" for s in failed)
 
         return successful_str or default_success_msg, \
                failed_str or default_fail_msg
\ No newline at end of file
@@ -1,61 +1,139 @@
 # app/use_cases.py (Versão Final com Tratamento de Falhas Melhorado)
 import json
-from typing import Dict, Any, AsyncGenerator
+from dataclasses import replace
+from typing import Dict, Any, AsyncGenerator, AsyncIterable, Awaitable, Callable
 import asyncio
+import threading
 import traceback
-import time
 import re
 from bs4 import BeautifulSoup
 from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+from pydantic import BaseModel, ValidationError
 
+from config import settings
+from data_models.responses.agent_outputs import ProductPageContent, SeoAuditReport, SubjectiveAuditVerdicts
+from .cache_store import make_response_cache_key
+from . import seo_analyzer
+from .agent_profiles import AgentProfile, get_agent_profile
+from .metrics import AgentCallStats, record_agent_call
+from .bula_preprocessor import estimate_tokens, preprocess_bula
 from .pharma_seo_optimizer import SeoOptimizerAgent
 
 # --- Funções Singleton ---
 _prompt_manager = None
 _gemini_client = None
+_response_cache = None
+# Vários SKUs rodam em paralelo: o lock evita que os singletons sejam criados em duplicidade.
+_singleton_lock = threading.Lock()
 
 def _get_prompt_manager():
     global _prompt_manager
     if _prompt_manager is None:
-        from .prompt_manager import PromptManager
-        _prompt_manager = PromptManager()
+        with _singleton_lock:
+            if _prompt_manager is None:
+                from .prompt_manager import PromptManager
+                _prompt_manager = PromptManager()
     return _prompt_manager
 
 def _get_gemini_client():
     global _gemini_client
     if _gemini_client is None:
-        from .gemini_client import GeminiClient
-        _gemini_client = GeminiClient()
+        with _singleton_lock:
+            if _gemini_client is None:
+                from .gemini_client import GeminiClient
+                _gemini_client = GeminiClient()
     return _gemini_client
 
+def _get_response_cache():
+    """Cache persistente de respostas do LLM (None quando desativado nas configurações)."""
+    global _response_cache
+    if _response_cache is None and settings.RESPONSE_CACHE_ENABLED:
+        with _singleton_lock:
+            if _response_cache is None:
+                from .cache_store import SqliteLRUCache
+                _response_cache = SqliteLRUCache(
+                    settings.RESPONSE_CACHE_PATH,
+                    max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+                    ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+                )
+    return _response_cache
+
 # --- Funções Auxiliares Robustas ---
+_JSON_DECODER = json.JSONDecoder(strict=False)  # strict=False aceita quebras de linha cruas dentro das strings
+_JSON_FENCE_PATTERN = re.compile(r'```(?:json)?\s*', re.IGNORECASE)
+
+def _decode_first_json_object(text: str) -> Dict[str, Any] | None:
+    """
+    Decodifica o primeiro objeto JSON completo do texto. O raw_decode acompanha o
+    balanceamento de chaves e as strings, então objetos aninhados e chaves dentro
+    de strings (ex: no html_content) não cortam o JSON antes do fim.
+    """
+    start = text.find("{")
+    while start != -1:
+        try:
+            data, _ = _JSON_DECODER.raw_decode(text, start)
+            if isinstance(data, dict):
+                return data
+        except json.JSONDecodeError:
+            pass
+        start = text.find("{", start + 1)
+    return None
+
 def _extract_json_from_string(text: str) -> Dict[str, Any]:
     if not text:
         print("ERROR: Texto de entrada para extração de JSON está vazio.")
         return None
-    # Regex aprimorado para ser mais flexível com espaços em branco e newlines
-    json_match = re.search(r'```json\s*(\{.*?\})\s*```|(\{.*?\})', text, re.DOTALL)
-    if json_match:
-        json_str = json_match.group(1) or json_match.group(2)
+    # Caminho rápido: saída estruturada (JSON puro).
+    stripped = text.strip()
+    if stripped.startswith("{"):
         try:
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            print(f"ERROR: Falha ao decodificar JSON extraído: {e}")
-            print(f"JSON com erro: {json_str[:500]}...") # Loga o início do JSON problemático
-            return None
-    print("ERROR: Nenhum bloco JSON válido encontrado na resposta da IA.")
+            data = _JSON_DECODER.decode(stripped)
+            if isinstance(data, dict):
+                return data
+        except json.JSONDecodeError:
+            pass
+    # Resposta em texto livre: procura o objeto depois de uma cerca ```json, ou em qualquer ponto.
+    fence = _JSON_FENCE_PATTERN.search(text)
+    data = (_decode_first_json_object(text[fence.end():]) if fence else None) or _decode_first_json_object(text)
+    if data is not None:
+        return data
+    if "{" in text:
+        print(f"ERROR: Falha ao decodificar JSON extraído. Início da resposta: {text[:500]}...")
+    else:
+        print("ERROR: Nenhum bloco JSON válido encontrado na resposta da IA.")
     return None
 
-def _execute_prompt_with_backoff(prompt: str, max_retries: int = 5) -> str | None:
-    wait_time = 2
+def _validate_agent_output(data: Dict[str, Any] | None, schema: type[BaseModel], agent_label: str) -> Dict[str, Any] | None:
+    """
+    Valida o JSON extraído contra o formato de saída do agente (data_models/responses).
+    Envelopes {"error": ...} e respostas fora do formato são recusados, para não serem
+    usados nem gravados no cache; a falha conta como falha de interpretação nas métricas.
+    """
+    if not data or "error" in data:
+        return None
+    try:
+        schema.model_validate(data)
+    except ValidationError as e:
+        print(f"ERROR: {agent_label} retornou um JSON fora do formato esperado ({e.error_count()} erro(s)): {e.errors()[0]['loc']}")
+        return None
+    return data
+
+def _execute_prompt_with_backoff(prompt: str, max_retries: int = 5, call_stats: AgentCallStats | None = None, response_schema=None, static_prefix=None, profile: AgentProfile | None = None) -> str | None:
+    # A espera entre tentativas é feita pelo limitador do GeminiClient, que conhece
+    # a cota e as dicas de Retry do servidor; aqui apenas repetimos a chamada.
     for attempt in range(max_retries):
         try:
-            return _get_gemini_client().execute_prompt(prompt)
+            if call_stats is not None and attempt:
+                call_stats.retries += 1
+            return _get_gemini_client().execute_prompt(prompt, call_stats=call_stats, response_schema=response_schema, static_prefix=static_prefix, profile=profile)
         except (ResourceExhausted, ServiceUnavailable) as e:
+            if call_stats is not None:
+                if isinstance(e, ResourceExhausted):
+                    call_stats.throttled_429 += 1
+                else:
+                    call_stats.throttled_503 += 1
             error_type = "Rate limit (429)" if isinstance(e, ResourceExhausted) else "Servidor sobrecarregado (503)"
-            print(f"WARN: {error_type} (tentativa {attempt + 1}/{max_retries}). Aguardando {wait_time}s...")
-            time.sleep(wait_time)
-            wait_time = min(wait_time * 2, 60)
+            print(f"WARN: {error_type} (tentativa {attempt + 1}/{max_retries}). Aguardando liberação do limitador...")
         except Exception as e:
             print(f"ERROR: Erro irrecuperável na chamada da API, não haverá nova tentativa: {e}")
             traceback.print_exc() # Log completo do traceback para depuração
@@ -63,38 +141,187 @@ def _execute_prompt_with_backoff(prompt: str, max_retries: int = 5) -> str | Non
     print("ERROR: Limite máximo de tentativas atingido. A API continua indisponível.")
     return None
 
+async def _execute_prompt_with_backoff_async(prompt: str, max_retries: int = 5, call_stats: AgentCallStats | None = None, response_schema=None, static_prefix=None, profile: AgentProfile | None = None) -> str | None:
+    # Mesma política da versão síncrona; a espera (com jitter) acontece em
+    # asyncio.sleep dentro do limitador, sem ocupar threads do pool.
+    for attempt in range(max_retries):
+        try:
+            if call_stats is not None and attempt:
+                call_stats.retries += 1
+            return await _get_gemini_client().execute_prompt_async(prompt, call_stats=call_stats, response_schema=response_schema, static_prefix=static_prefix, profile=profile)
+        except (ResourceExhausted, ServiceUnavailable) as e:
+            if call_stats is not None:
+                if isinstance(e, ResourceExhausted):
+                    call_stats.throttled_429 += 1
+                else:
+                    call_stats.throttled_503 += 1
+            error_type = "Rate limit (429)" if isinstance(e, ResourceExhausted) else "Servidor sobrecarregado (503)"
+            print(f"WARN: {error_type} (tentativa {attempt + 1}/{max_retries}). Aguardando liberação do limitador...")
+        except Exception as e:
+            print(f"ERROR: Erro irrecuperável na chamada da API, não haverá nova tentativa: {e}")
+            traceback.print_exc()
+            return None
+    print("ERROR: Limite máximo de tentativas atingido. A API continua indisponível.")
+    return None
+
+# --- Cache de Respostas ---
+# Fica entre os agentes e o GeminiClient: uma resposta só é gravada depois de
+# interpretada com sucesso, para que respostas ruins não sejam reaproveitadas.
+def _response_cache_key(prompt_name: str, prompt: str, profile: AgentProfile | None = None) -> str:
+    # Variantes do perfil (ex: candidatos especulativos com outra temperatura) têm entradas próprias.
+    default_profile = get_agent_profile(prompt_name)
+    model_key = default_profile.model if profile is None or profile == default_profile else f"{profile.model}@temperature={profile.temperature}"
+    return make_response_cache_key(model_key, prompt_name, _get_prompt_manager().get_version(prompt_name), prompt)
+
+def _get_cached_result(cache_key: str, parse: Callable[[str | None], Any]) -> Any:
+    cache = _get_response_cache()
+    if cache is None:
+        return None
+    cached = cache.get(cache_key)
+    if cached is None:
+        return None
+    data = parse(cached.decode("utf-8"))
+    if data is not None:
+        print(f"CACHE: Resposta reaproveitada do cache ({cache_key.split(':')[1]}).")
+    return data
+
+def _store_result(cache_key: str, response_raw: str):
+    cache = _get_response_cache()
+    if cache is not None:
+        cache.put(cache_key, response_raw.encode("utf-8"))
+
+# Cada chamada de agente (inclusive as atendidas pelo cache) é registrada em app/metrics.py,
+# com o perfil de modelo usado (app/agent_profiles.py).
+def _run_agent_prompt(prompt_name: str, prompt: str, parse: Callable[[str | None], Any], response_schema=None) -> Any:
+    profile = get_agent_profile(prompt_name)
+    call_stats = AgentCallStats(prompt_name, profile.model, structured=response_schema is not None and settings.GEMINI_STRUCTURED_OUTPUT, profile=profile)
+    try:
+        cache_key = _response_cache_key(prompt_name, prompt)
+        data = _get_cached_result(cache_key, parse)
+        if data is not None:
+            call_stats.cache_hit = True
+            return data
+        response_raw = _execute_prompt_with_backoff(prompt, call_stats=call_stats, response_schema=response_schema, static_prefix=_get_prompt_manager().get_static_prefix(prompt_name), profile=profile)
+        data = parse(response_raw)
+        call_stats.parse_failed = response_raw is not None and data is None
+        if data is not None:
+            call_stats.success = True
+            _store_result(cache_key, response_raw)
+        return data
+    finally:
+        record_agent_call(call_stats)
+
+async def _run_agent_prompt_async(prompt_name: str, prompt: str, parse: Callable[[str | None], Any], response_schema=None, profile: AgentProfile | None = None) -> Any:
+    profile = profile or get_agent_profile(prompt_name)
+    call_stats = AgentCallStats(prompt_name, profile.model, structured=response_schema is not None and settings.GEMINI_STRUCTURED_OUTPUT, profile=profile)
+    try:
+        cache_key = _response_cache_key(prompt_name, prompt, profile)
+        # O cache de respostas é SQLite: o acesso roda em uma thread para não travar o event loop.
+        data = await asyncio.to_thread(_get_cached_result, cache_key, parse)
+        if data is not None:
+            call_stats.cache_hit = True
+            return data
+        response_raw = await _execute_prompt_with_backoff_async(prompt, call_stats=call_stats, response_schema=response_schema, static_prefix=_get_prompt_manager().get_static_prefix(prompt_name), profile=profile)
+        data = parse(response_raw)
+        call_stats.parse_failed = response_raw is not None and data is None
+        if data is not None:
+            call_stats.success = True
+            await asyncio.to_thread(_store_result, cache_key, response_raw)
+        return data
+    except asyncio.CancelledError:
+        call_stats.cancelled = True
+        raise
+    finally:
+        record_agent_call(call_stats)
+
+def get_runtime_snapshot() -> dict:
+    """Estado do limitador de cota de cada chave e estatísticas de renderização dos prompts (apenas dos singletons já criados)."""
+    return {
+        "rate_limiter": _gemini_client.pool.snapshot() if _gemini_client is not None else {},
+        "prompts": _prompt_manager.get_stats() if _prompt_manager is not None else {},
+    }
+
+def _prepare_bula_text(product_info: dict, prompt_name: str) -> str:
+    """
+    Texto da bula enviado a um agente: normalizado, segmentado nas seções da ANVISA
+    e cortado no orçamento de tokens do agente (settings.BULA_TOKEN_BUDGETS).
+    """
+    bula_text = product_info.get("bula_text", "")
+    if not bula_text or not settings.BULA_PREPROCESSING_ENABLED:
+        return bula_text
+    prepared = preprocess_bula(bula_text)
+    fitted = prepared.fit(settings.BULA_TOKEN_BUDGETS.get(prompt_name, 0))
+    if not fitted.strip():
+        return bula_text
+    print(f"BULA: {prepared.original_tokens} -> {estimate_tokens(fitted)} tokens estimados para '{prompt_name}' ({len(prepared.sections)} seções).")
+    return fitted
+
 # --- Funções dos Agentes (com checagem de falha) ---
-def _run_master_generator_agent(product_name: str, product_info: dict) -> Dict[str, Any] | None:
-    print(f"PIPELINE: Executing Master Generator for '{product_name}'...")
-    prompt = _get_prompt_manager().render("medicamento_generator", product_name=product_name, product_info=product_info.get("bula_text", ""))
-    response_raw = _execute_prompt_with_backoff(prompt)
+# Cada agente é dividido em renderização do prompt e interpretação da resposta,
+# compartilhadas pelas variantes síncrona e assíncrona. A interpretação retorna
+# None em caso de falha; o plano de contingência de cada agente é aplicado depois.
+def _render_master_generator_prompt(product_name: str, product_info: dict) -> str:
+    return _get_prompt_manager().render("medicamento_generator", product_name=product_name, product_info=_prepare_bula_text(product_info, "medicamento_generator"))
+
+def _parse_master_generator_response(response_raw: str | None) -> Dict[str, Any] | None:
     if response_raw is None:
         print(f"ERROR: Master Generator não recebeu resposta da API.")
         return None
     data = _extract_json_from_string(response_raw)
-    if data and data.get("html_content") and len(data["html_content"]) > 50:
+    data = _validate_agent_output(data, ProductPageContent, "Master Generator")
+    if data and len(data["html_content"]) > 50:
         return data
     print(f"ERROR: Master Generator falhou na extração do JSON ou gerou conteúdo muito curto.")
     return None
 
-def _run_refiner_agent(product_name: str, product_info: dict, previous_json: dict, qa_feedback: dict) -> Dict[str, Any]:
-    print(f"PIPELINE: Executing Refiner Agent for '{product_name}'...")
-    prompt = _get_prompt_manager().render("refinador_qualidade", product_name=product_name, bula_text=product_info.get("bula_text", ""), previous_json=json.dumps(previous_json, ensure_ascii=False), qa_feedback=json.dumps(qa_feedback, ensure_ascii=False))
-    response_raw = _execute_prompt_with_backoff(prompt)
+def _run_master_generator_agent(product_name: str, product_info: dict) -> Dict[str, Any] | None:
+    print(f"PIPELINE: Executing Master Generator for '{product_name}'...")
+    prompt = _render_master_generator_prompt(product_name, product_info)
+    return _run_agent_prompt("medicamento_generator", prompt, _parse_master_generator_response, ProductPageContent)
+
+async def _run_master_generator_agent_async(product_name: str, product_info: dict, profile: AgentProfile | None = None) -> Dict[str, Any] | None:
+    print(f"PIPELINE: Executing Master Generator for '{product_name}'...")
+    prompt = _render_master_generator_prompt(product_name, product_info)
+    return await _run_agent_prompt_async("medicamento_generator", prompt, _parse_master_generator_response, ProductPageContent, profile)
+
+def _render_refiner_prompt(product_name: str, product_info: dict, previous_json: dict, qa_feedback: dict) -> str:
+    return _get_prompt_manager().render("refinador_qualidade", product_name=product_name, bula_text=_prepare_bula_text(product_info, "refinador_qualidade"), previous_json=json.dumps(previous_json, ensure_ascii=False), qa_feedback=json.dumps(qa_feedback, ensure_ascii=False))
+
+def _parse_refiner_response(response_raw: str | None) -> Dict[str, Any] | None:
     if response_raw is None:
         print(f"ERROR: Refiner Agent não recebeu resposta da API. Retornando JSON anterior.")
-        return previous_json
+        return None
     data = _extract_json_from_string(response_raw)
-    if data:
+    data = _validate_agent_output(data, ProductPageContent, "Refiner Agent")
+    if data and data["html_content"].strip():
         return data
-    print(f"ERROR: Refiner Agent falhou na extração do JSON. Retornando JSON anterior.")
-    return previous_json
+    print(f"ERROR: Refiner Agent falhou na extração do JSON ou a resposta não tem os campos da página. Retornando JSON anterior.")
+    return None
 
-def _run_essentials_generator_agent(product_name: str, product_info: dict) -> Dict[str, Any]:
-    print(f"PIPELINE: All attempts failed. Executing Essentials Fallback Agent for '{product_name}'...")
-    prompt = _get_prompt_manager().render("essentials_generator", product_name=product_name, product_info=product_info.get("bula_text", ""))
-    html_content = _execute_prompt_with_backoff(prompt)
+def _run_refiner_agent(product_name: str, product_info: dict, previous_json: dict, qa_feedback: dict) -> Dict[str, Any]:
+    print(f"PIPELINE: Executing Refiner Agent for '{product_name}'...")
+    prompt = _render_refiner_prompt(product_name, product_info, previous_json, qa_feedback)
+    return _run_agent_prompt("refinador_qualidade", prompt, _parse_refiner_response, ProductPageContent) or previous_json
+
+async def _run_refiner_agent_async(product_name: str, product_info: dict, previous_json: dict, qa_feedback: dict) -> Dict[str, Any]:
+    print(f"PIPELINE: Executing Refiner Agent for '{product_name}'...")
+    prompt = _render_refiner_prompt(product_name, product_info, previous_json, qa_feedback)
+    return await _run_agent_prompt_async("refinador_qualidade", prompt, _parse_refiner_response, ProductPageContent) or previous_json
+
+def _render_essentials_prompt(product_name: str, product_info: dict) -> str:
+    return _get_prompt_manager().render("essentials_generator", product_name=product_name, product_info=_prepare_bula_text(product_info, "essentials_generator"))
+
+def _parse_essentials_response(html_content: str | None) -> str | None:
     if html_content is None or len(html_content) < 20:
+        return None
+    # A resposta é HTML livre: um objeto JSON de erro no lugar dela não é conteúdo.
+    if html_content.lstrip().startswith("{") and "error" in (_decode_first_json_object(html_content) or {}):
+        print(f"ERROR: Essentials Agent recebeu um JSON de erro no lugar do HTML.")
+        return None
+    return html_content
+
+def _build_essentials_result(html_content: str | None, product_name: str) -> Dict[str, Any]:
+    if html_content is None:
         html_content = "<p>Falha crítica na geração de conteúdo.</p>"
 
     # Gera um título e descrição SEO básicos para o conteúdo essencial
@@ -107,24 +334,113 @@ def _run_essentials_generator_agent(product_name: str, product_info: dict) -> Di
         "html_content": html_content
     }
 
+def _run_essentials_generator_agent(product_name: str, product_info: dict) -> Dict[str, Any]:
+    print(f"PIPELINE: All attempts failed. Executing Essentials Fallback Agent for '{product_name}'...")
+    prompt = _render_essentials_prompt(product_name, product_info)
+    return _build_essentials_result(_run_agent_prompt("essentials_generator", prompt, _parse_essentials_response), product_name)
+
+async def _run_essentials_generator_agent_async(product_name: str, product_info: dict) -> Dict[str, Any]:
+    print(f"PIPELINE: All attempts failed. Executing Essentials Fallback Agent for '{product_name}'...")
+    prompt = _render_essentials_prompt(product_name, product_info)
+    return _build_essentials_result(await _run_agent_prompt_async("essentials_generator", prompt, _parse_essentials_response), product_name)
+
+def _render_seo_auditor_prompt(full_page_json: dict) -> str:
+    return _get_prompt_manager().render("auditor_seo_tecnico", full_page_json=json.dumps(full_page_json, ensure_ascii=False))
+
+def _parse_seo_auditor_response(response_raw: str | None) -> Dict[str, Any] | None:
+    if response_raw is None:
+        print(f"ERROR: Auditor Agent não recebeu resposta da API.")
+        return None
+    data = _extract_json_from_string(response_raw)
+    if _validate_agent_output(data, SeoAuditReport, "Auditor Agent"):
+        return data
+    print(f"ERROR: Auditor Agent falhou na extração do JSON ou a resposta não tem o score.")
+    return None
+
+def _audit_failure_result() -> Dict[str, Any]:
+    return {"seo_score": 0, "score_breakdown": {"error": {"feedback": "Falha crítica na auditoria - sem resposta válida da API."}}}
+
 def _run_seo_auditor_agent(full_page_json: dict) -> Dict[str, Any]:
     print(f"PIPELINE: Executing Master Auditor...")
-    prompt = _get_prompt_manager().render("auditor_seo_tecnico", full_page_json=json.dumps(full_page_json, ensure_ascii=False))
-    response_raw = _execute_prompt_with_backoff(prompt)
+    prompt = _render_seo_auditor_prompt(full_page_json)
+    return _run_agent_prompt("auditor_seo_tecnico", prompt, _parse_seo_auditor_response, SeoAuditReport) or _audit_failure_result()
+
+async def _run_seo_auditor_agent_async(full_page_json: dict) -> Dict[str, Any]:
+    print(f"PIPELINE: Executing Master Auditor...")
+    prompt = _render_seo_auditor_prompt(full_page_json)
+    return await _run_agent_prompt_async("auditor_seo_tecnico", prompt, _parse_seo_auditor_response, SeoAuditReport) or _audit_failure_result()
+
+# A auditoria híbrida pontua o checklist localmente (seo_analyzer) e só consulta a IA
+# para as verificações subjetivas não conclusivas, e apenas quando os pontos delas
+# podem decidir se a meta de score é atingida.
+def _render_subjective_auditor_prompt(full_page_json: dict, product_name: str, checks: list) -> str:
+    return _get_prompt_manager().render("auditor_seo_subjetivo", product_name=product_name, seo_title=full_page_json.get("seo_title", ""), meta_description=full_page_json.get("meta_description", ""), checks=checks)
+
+def _parse_subjective_auditor_response(response_raw: str | None) -> Dict[str, Any] | None:
     if response_raw is None:
-        print(f"ERROR: Auditor Agent não recebeu resposta da API.")
-        return {"seo_score": 0, "score_breakdown": {"error": {"feedback": "Falha crítica na auditoria - sem resposta da API."}}}
+        print(f"ERROR: Subjective Auditor não recebeu resposta da API.")
+        return None
     data = _extract_json_from_string(response_raw)
-    if data:
+    # Os veredictos são opcionais no esquema, mas a resposta precisa trazer pelo menos um.
+    if _validate_agent_output(data, SubjectiveAuditVerdicts, "Subjective Auditor") and any(data.get(name) is not None for name in SubjectiveAuditVerdicts.model_fields):
         return data
-    print(f"ERROR: Auditor Agent falhou na extração do JSON.")
-    return {"seo_score": 0, "score_breakdown": {"error": {"feedback": "Falha crítica na auditoria - JSON inválido."}}}
+    print(f"ERROR: Subjective Auditor falhou na extração do JSON ou a resposta não tem veredictos.")
+    return None
+
+def _start_local_audit(full_page_json: dict, product_name: str, min_score: float) -> tuple[Dict[str, Any], list]:
+    """Executa o auditor local e decide quais verificações subjetivas precisam da IA."""
+    audit = seo_analyzer.audit_page_json(full_page_json, product_name)
+    pending = audit["pending_checks"]
+    if pending and audit["seo_score"] < min_score <= audit["seo_score"] + sum(pending.values()):
+        return audit, list(pending)
+    return audit, []
+
+def _run_seo_audit(full_page_json: dict, product_name: str, min_score: float) -> Dict[str, Any]:
+    if settings.SEO_AUDITOR_MODE == "llm":
+        return _run_seo_auditor_agent(full_page_json)
+    audit, checks = _start_local_audit(full_page_json, product_name, min_score)
+    if not checks:
+        return seo_analyzer.credit_skipped_checks(audit)
+    print(f"PIPELINE: Executing Subjective Auditor ({', '.join(checks)})...")
+    prompt = _render_subjective_auditor_prompt(full_page_json, product_name, checks)
+    return seo_analyzer.apply_subjective_verdicts(audit, _run_agent_prompt("auditor_seo_subjetivo", prompt, _parse_subjective_auditor_response, SubjectiveAuditVerdicts))
+
+async def _run_seo_audit_async(full_page_json: dict, product_name: str, min_score: float) -> Dict[str, Any]:
+    if settings.SEO_AUDITOR_MODE == "llm":
+        return await _run_seo_auditor_agent_async(full_page_json)
+    audit, checks = _start_local_audit(full_page_json, product_name, min_score)
+    if not checks:
+        return seo_analyzer.credit_skipped_checks(audit)
+    print(f"PIPELINE: Executing Subjective Auditor ({', '.join(checks)})...")
+    prompt = _render_subjective_auditor_prompt(full_page_json, product_name, checks)
+    return seo_analyzer.apply_subjective_verdicts(audit, await _run_agent_prompt_async("auditor_seo_subjetivo", prompt, _parse_subjective_auditor_response, SubjectiveAuditVerdicts))
 
 # --- Orquestrador Principal da Pipeline ---
-async def run_seo_pipeline_stream(product_type: str, product_name: str, product_info: Dict[str, Any]) -> AsyncGenerator[str, None]:
-    MIN_SCORE_TARGET = 95
-    MAX_ATTEMPTS = 2
+SEO_MIN_SCORE_TARGET = 95
+SEO_MAX_ATTEMPTS = 2
+
+def _speculative_profiles(candidates: int) -> list[AgentProfile]:
+    """Perfis dos candidatos: o primeiro é o perfil padrão do gerador; os demais variam a temperatura."""
+    base_profile = get_agent_profile("medicamento_generator")
+    temperatures = settings.SPECULATIVE_TEMPERATURES or [base_profile.temperature]
+    return [base_profile] + [replace(base_profile, temperature=temperatures[index % len(temperatures)]) for index in range(candidates - 1)]
 
+async def _generate_and_audit_candidate(index: int, profile: AgentProfile, product_name: str, product_info: dict) -> tuple[int, Dict[str, Any] | None, Dict[str, Any]]:
+    content = await _run_master_generator_agent_async(product_name, product_info, profile)
+    if content is None:
+        return index, None, {}
+    return index, content, await _run_seo_audit_async(content, product_name, SEO_MIN_SCORE_TARGET)
+
+async def run_seo_pipeline_stream(product_type: str, product_name: str, product_info: Dict[str, Any], speculative_candidates: int = 1) -> AsyncGenerator[str, None]:
+    """
+    Gera, audita e refina a página de um produto, emitindo eventos SSE.
+
+    Com `speculative_candidates` > 1, o primeiro ciclo gera e audita esse número de
+    candidatos em paralelo (temperaturas de settings.SPECULATIVE_TEMPERATURES) e
+    fica com o de maior score; assim que um deles atinge a meta, os demais são
+    cancelados. Troca tokens extras (limitados ao número de candidatos) por menos
+    ciclos de refino, que dobram a latência de um SKU.
+    """
     async def _send_event(event_type: str, data: dict) -> str:
         await asyncio.sleep(0.05)
         return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
@@ -139,22 +455,52 @@ async def run_seo_pipeline_stream(product_type: str, product_name: str, product_
         final_score = 0
         audit_results = {}
 
-        for attempt in range(1, MAX_ATTEMPTS + 1):
-            yield await _send_event("log", {"message": f"<b>--- Ciclo de Qualidade {attempt}/{MAX_ATTEMPTS} ---</b>", "type": "info"})
+        for attempt in range(1, SEO_MAX_ATTEMPTS + 1):
+            yield await _send_event("log", {"message": f"<b>--- Ciclo de Qualidade {attempt}/{SEO_MAX_ATTEMPTS} ---</b>", "type": "info"})
             
-            if attempt == 1:
+            candidate_audit = None
+            if attempt == 1 and speculative_candidates > 1:
+                yield await _send_event("log", {"message": f"<b>Etapa 1:</b> Agente Mestre (Master Generator) criando {speculative_candidates} candidatos em paralelo...", "type": "info"})
+                candidate_tasks = [
+                    asyncio.create_task(_generate_and_audit_candidate(index, profile, product_name, product_info))
+                    for index, profile in enumerate(_speculative_profiles(speculative_candidates))
+                ]
+                try:
+                    for next_candidate in asyncio.as_completed(candidate_tasks):
+                        index, content, audit = await next_candidate
+                        if content is None:
+                            yield await _send_event("log", {"message": f"⚠️ Candidato {index + 1} falhou.", "type": "warning"})
+                            continue
+                        score = audit.get("seo_score", 0)
+                        yield await _send_event("log", {"message": f"Candidato {index + 1}: score {score}/100.", "type": "info"})
+                        if candidate_audit is None or score > candidate_audit.get("seo_score", 0):
+                            current_content_data, candidate_audit = content, audit
+                        if score >= SEO_MIN_SCORE_TARGET:
+                            break
+                finally:
+                    pending = [task for task in candidate_tasks if not task.done()]
+                    for task in pending:
+                        task.cancel()
+                    await asyncio.gather(*pending, return_exceptions=True)
+                if pending:
+                    yield await _send_event("log", {"message": f"Meta atingida: {len(pending)} candidato(s) em andamento cancelado(s).", "type": "info"})
+            elif attempt == 1:
                 yield await _send_event("log", {"message": "<b>Etapa 1:</b> Agente Mestre (Master Generator) criando conteúdo...", "type": "info"})
-                current_content_data = await asyncio.to_thread(_run_master_generator_agent, product_name, product_info)
+                current_content_data = await _run_master_generator_agent_async(product_name, product_info)
             else:
                 yield await _send_event("log", {"message": "⚠️ Score baixo. Acionando <b>Agente Refinador (Refiner Agent)</b>...", "type": "warning"})
-                current_content_data = await asyncio.to_thread(_run_refiner_agent, product_name, product_info, current_content_data, audit_results)
+                current_content_data = await _run_refiner_agent_async(product_name, product_info, current_content_data, audit_results)
 
             if current_content_data is None:
                 yield await _send_event("log", {"message": "❌ Falha crítica do Agente. Acionando plano de contingência.", "type": "error"})
                 break
             
-            yield await _send_event("log", {"message": "<b>Etapa 2:</b> Agente de Qualidade (Auditor) inspecionando...", "type": "info"})
-            audit_results = await asyncio.to_thread(_run_seo_auditor_agent, current_content_data)
+            if candidate_audit is not None:
+                # Os candidatos já foram auditados: segue com a auditoria do melhor deles.
+                audit_results = candidate_audit
+            else:
+                yield await _send_event("log", {"message": "<b>Etapa 2:</b> Agente de Qualidade (Auditor) inspecionando...", "type": "info"})
+                audit_results = await _run_seo_audit_async(current_content_data, product_name, SEO_MIN_SCORE_TARGET)
             final_score = audit_results.get("seo_score", 0)
 
             score_breakdown = audit_results.get("score_breakdown", {})
@@ -166,14 +512,17 @@ async def run_seo_pipeline_stream(product_type: str, product_name: str, product_
 
             yield await _send_event("log", {"message": f"<b>Score da Tentativa {attempt}: {final_score}/100</b>", "type": "info"})
             
-            if final_score >= MIN_SCORE_TARGET:
+            if final_score >= SEO_MIN_SCORE_TARGET:
                 yield await _send_event("log", {"message": "<b>Qualidade Aprovada!</b>", "type": "success"})
                 break
 
+        # "fallback": o conteúdo veio do Agente Essencial; execuções em lote retentam esses SKUs ao retomar.
+        result_status = "ok"
         if current_content_data is None:
+            result_status = "fallback"
             yield await _send_event("log", {"message": "⚠️ <b>Aviso:</b> Geração principal falhou. Acionando Agente Essencial (Fallback)...", "type": "warning"})
-            current_content_data = await asyncio.to_thread(_run_essentials_generator_agent, product_name, product_info)
-            audit_results = await asyncio.to_thread(_run_seo_auditor_agent, current_content_data)
+            current_content_data = await _run_essentials_generator_agent_async(product_name, product_info)
+            audit_results = await _run_seo_audit_async(current_content_data, product_name, SEO_MIN_SCORE_TARGET)
             final_score = audit_results.get("seo_score", 0)
             yield await _send_event("log", {"message": f"<b>Score do Conteúdo Essencial: {final_score}/100</b>", "type": "info"})
 
@@ -182,6 +531,7 @@ async def run_seo_pipeline_stream(product_type: str, product_name: str, product_
         final_html_vtex_safe = SeoOptimizerAgent._finalize_for_vtex(current_content_data.get("html_content", "<p>Conteúdo não gerado.</p>"), product_name)
         
         final_data_for_review = {
+            "status": result_status,
             "final_score": final_score,
             "final_content": final_html_vtex_safe,
             "seo_title": str(current_content_data.get("seo_title", product_name)),
@@ -191,4 +541,191 @@ async def run_seo_pipeline_stream(product_type: str, product_name: str, product_
 
     except Exception as e:
         traceback.print_exc()
-        yield await _send_event("error", {"message": f"Erro crítico na pipeline para '{product_name}': {str(e)}", "type": "error"})
\ No newline at end of file
+        yield await _send_event("error", {"message": f"Erro crítico na pipeline para '{product_name}': {str(e)}", "type": "error"})
+
+# --- Execução Offline (Batch API) ---
+# Para catálogos grandes que não precisam de resposta interativa: cada etapa da
+# pipeline vira um único job da Batch API com os prompts de todos os SKUs que
+# chegaram até ela. As etapas reutilizam a renderização, a interpretação e os
+# planos de contingência dos agentes online, e passam pelo cache de respostas.
+_offline_batch_service = None
+
+def get_offline_batch_service():
+    global _offline_batch_service
+    if _offline_batch_service is None:
+        gemini_client = _get_gemini_client()
+        with _singleton_lock:
+            if _offline_batch_service is None:
+                from .gemini_batch import GeminiBatchService, LocalBatchService
+                if settings.OFFLINE_BATCH_SERVICE == "local":
+                    _offline_batch_service = LocalBatchService(lambda prompt_text, request: _execute_prompt_with_backoff(prompt_text))
+                else:
+                    _offline_batch_service = GeminiBatchService(gemini_client.client)
+    return _offline_batch_service
+
+async def _run_offline_stage(runner, stage: str, prompt_name: str, prompts: AsyncIterable[tuple[str, str]], parse: Callable[[str | None], Any],
+                             response_schema=None, on_status: Callable[[str], None] | None = None) -> Dict[str, Any]:
+    """
+    Executa um agente para vários SKUs em um único job. Prompts com resposta no
+    cache não são enviados; as respostas interpretadas com sucesso são gravadas nele.
+
+    Returns:
+        {chave: resultado de `parse`}, com None para as respostas que falharam.
+    """
+    results: Dict[str, Any] = {}
+    cache_keys: Dict[str, str] = {}
+
+    async def pending_requests():
+        async for key, prompt in prompts:
+            cache_key = _response_cache_key(prompt_name, prompt)
+            data = await asyncio.to_thread(_get_cached_result, cache_key, parse)
+            if data is not None:
+                results[key] = data
+                continue
+            cache_keys[key] = cache_key
+            yield key, prompt
+
+    responses = await runner.run(stage, pending_requests(), response_schema, on_status, profile=get_agent_profile(prompt_name))
+    for key, cache_key in cache_keys.items():
+        response_raw = responses.get(key)
+        data = parse(response_raw)
+        if data is not None:
+            await asyncio.to_thread(_store_result, cache_key, response_raw)
+        results[key] = data
+    return results
+
+async def run_offline_seo_pipeline(products: Dict[str, str], load_product_info: Callable[[str], Awaitable[Dict[str, Any]]], runner) -> AsyncGenerator[str, None]:
+    """
+    Versão em lote de run_seo_pipeline_stream para um catálogo inteiro: geração,
+    auditoria, refino dos SKUs abaixo da meta e fallback essencial, com uma
+    chamada à Batch API por etapa.
+
+    Args:
+        products: {chave do SKU: nome do produto}.
+        load_product_info: Corrotina que devolve o product_info ({"bula_text": ...}) de
+            uma chave. É chamada a cada etapa que usa a bula, que não fica em memória;
+            se falhar, apenas aquele SKU fica fora da etapa.
+        runner: OfflineBatchRunner do diretório da execução.
+
+    Emite eventos `log` e, ao final, um `done` por SKU com a chave em `key` e os
+    mesmos campos da pipeline online.
+    """
+    event_queue: asyncio.Queue = asyncio.Queue()
+    pages: Dict[str, Dict[str, Any]] = {}
+    audits: Dict[str, Dict[str, Any]] = {}
+
+    def _event(event_type: str, data: dict) -> str:
+        return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+    def log(message: str, message_type: str = "info"):
+        event_queue.put_nowait(_event("log", {"message": message, "type": message_type}))
+
+    async def run_stage(stage: str, prompt_name: str, prompts, parse, response_schema=None) -> Dict[str, Any]:
+        return await _run_offline_stage(runner, stage, prompt_name, prompts, parse, response_schema, log)
+
+    async def audit_pages(stage: str, keys: list):
+        if settings.SEO_AUDITOR_MODE == "llm":
+            async def auditor_prompts():
+                for key in keys:
+                    yield key, _render_seo_auditor_prompt(pages[key])
+            reports = await run_stage(stage, "auditor_seo_tecnico", auditor_prompts(), _parse_seo_auditor_response, SeoAuditReport)
+            for key in keys:
+                audits[key] = reports.get(key) or _audit_failure_result()
+            return
+
+        pending_audits = {}
+        subjective_prompts = []
+        for key in keys:
+            audit, checks = _start_local_audit(pages[key], products[key], SEO_MIN_SCORE_TARGET)
+            if checks:
+                pending_audits[key] = audit
+                subjective_prompts.append((key, _render_subjective_auditor_prompt(pages[key], products[key], checks)))
+            else:
+                audits[key] = seo_analyzer.credit_skipped_checks(audit)
+
+        async def iter_subjective_prompts():
+            for item in subjective_prompts:
+                yield item
+        verdicts = await run_stage(stage, "auditor_seo_subjetivo", iter_subjective_prompts(), _parse_subjective_auditor_response, SubjectiveAuditVerdicts)
+        for key, audit in pending_audits.items():
+            audits[key] = seo_analyzer.apply_subjective_verdicts(audit, verdicts.get(key))
+
+    async def try_load_product_info(key: str) -> Dict[str, Any] | None:
+        try:
+            return await load_product_info(key)
+        except Exception as e:
+            log(f"<b>[SKU: {key}]</b> Falha ao carregar a bula: {e}", "error")
+            return None
+
+    def below_target(keys) -> list:
+        return [key for key in keys if audits[key].get("seo_score", 0) < SEO_MIN_SCORE_TARGET]
+
+    async def run_stages():
+        try:
+            log(f"<b>Execução offline de {len(products)} SKUs:</b> cada etapa é enviada como um job da Batch API.")
+
+            async def generator_prompts():
+                for key, product_name in products.items():
+                    if (product_info := await try_load_product_info(key)) is not None:
+                        yield key, _render_master_generator_prompt(product_name, product_info)
+            generated = await run_stage("geracao", "medicamento_generator", generator_prompts(), _parse_master_generator_response, ProductPageContent)
+            pages.update({key: page for key, page in generated.items() if page is not None})
+            log(f"<b>Etapa 1:</b> {len(pages)}/{len(products)} páginas geradas.")
+
+            await audit_pages("auditoria-1", list(pages))
+            log(f"<b>Etapa 2:</b> Auditoria concluída; {len(pages) - len(below_target(pages))} páginas atingiram a meta de {SEO_MIN_SCORE_TARGET}.")
+
+            for attempt in range(2, SEO_MAX_ATTEMPTS + 1):
+                to_refine = below_target(pages)
+                if not to_refine:
+                    break
+                log(f"⚠️ {len(to_refine)} páginas abaixo da meta. Acionando o <b>Agente Refinador</b> (ciclo {attempt}/{SEO_MAX_ATTEMPTS})...", "warning")
+
+                async def refiner_prompts():
+                    for key in to_refine:
+                        if (product_info := await try_load_product_info(key)) is not None:
+                            yield key, _render_refiner_prompt(products[key], product_info, pages[key], audits[key])
+                refined = await run_stage(f"refino-{attempt}", "refinador_qualidade", refiner_prompts(), _parse_refiner_response, ProductPageContent)
+                for key in to_refine:
+                    pages[key] = refined.get(key) or pages[key]
+                await audit_pages(f"auditoria-{attempt}", to_refine)
+
+            failed = [key for key in products if key not in pages]
+            if failed:
+                log(f"⚠️ {len(failed)} SKUs sem conteúdo gerado. Acionando o Agente Essencial (Fallback)...", "warning")
+
+                async def essentials_prompts():
+                    for key in failed:
+                        if (product_info := await try_load_product_info(key)) is not None:
+                            yield key, _render_essentials_prompt(products[key], product_info)
+                essentials = await run_stage("essencial", "essentials_generator", essentials_prompts(), _parse_essentials_response)
+                for key in failed:
+                    pages[key] = _build_essentials_result(essentials.get(key), products[key])
+                await audit_pages("auditoria-essencial", failed)
+
+            for key, product_name in products.items():
+                page = pages[key]
+                event_queue.put_nowait(_event("done", {
+                    "key": key,
+                    "status": "fallback" if key in failed else "ok",
+                    "final_score": audits[key].get("seo_score", 0),
+                    "final_content": SeoOptimizerAgent._finalize_for_vtex(page.get("html_content", "<p>Conteúdo não gerado.</p>"), product_name),
+                    "seo_title": str(page.get("seo_title", product_name)),
+                    "meta_description": str(page.get("meta_description", "Descrição não gerada.")),
+                }))
+            # Só depois de concluída: uma falha no meio mantém os jobs para serem retomados.
+            runner.clear()
+        except Exception as e:
+            traceback.print_exc()
+            event_queue.put_nowait(_event("error", {"message": f"Erro crítico na execução offline: {e}", "type": "error"}))
+        finally:
+            event_queue.put_nowait(None)
+
+    supervisor = asyncio.create_task(run_stages())
+    try:
+        while (chunk := await event_queue.get()) is not None:
+            yield chunk
+        await supervisor
+    finally:
+        if not supervisor.done():
+            supervisor.cancel()
@@ -0,0 +1,80 @@
+# benchmarks/bench_seo_analyzer.py
+"""
+Compara o analisador de HTML original (BeautifulSoup, várias passadas) com o de
+passada única (lxml) e com o analyze_many em pool de processos, sobre um corpus
+sintético de descrições de produtos.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_seo_analyzer --size 50000 --workers 4
+"""
+import argparse
+import os
+import random
+import time
+
+from app.seo_analyzer import analyze_many, analyze_seo_performance_from_html, analyze_seo_performance_with_soup
+
+SECTIONS = [
+    "<h2>Para que é indicado e para que serve o {name}?</h2><p>O {name} é indicado para o alívio de dores e febre.</p>",
+    "<h2>Como o {name} funciona?</h2><p>Atua inibindo a síntese de prostaglandinas.</p>",
+    "<h2>Quais as contraindicações do {name}?</h2><ul><li>Gestantes</li><li>Alergia aos componentes</li></ul>",
+    "<h2>Como usar o {name}?</h2><h3>Adultos</h3><p>1 comprimido a cada 6 horas.</p>",
+    "<h2>Especificações</h2><table><tr><td>Fabricante</td><td>{maker}</td></tr><tr><td>Princípio Ativo</td><td>X</td></tr><tr><td>Registro MS</td><td>1.0000.0000</td></tr></table>",
+]
+FAQ = "<div class=\"faq-section\">{items}</div>"
+FAQ_ITEM = "<details open><summary><h2>Posso tomar {name} com álcool?</h2></summary><p>Não é recomendado.</p></details>"
+AUTHORITY = "<p>Nota de Transparência: conteúdo baseado na bula aprovada pela ANVISA. Registro ANVISA 1.0000 — Fabricante {maker}.</p>"
+GOV_LINK = "<p>Fonte: <a href=\"https://consultas.anvisa.gov.br/\">Anvisa</a></p>"
+NAMES = ["Dipirona", "Paracetamol", "Ibuprofeno", "Losartana", "Omeprazol", "Amoxicilina", "Nimesulida"]
+MAKERS = ["EMS", "Medley", "Neo Química", "Eurofarma", "Sanofi"]
+
+
+def build_corpus(size: int, seed: int = 42) -> list:
+    """Gera descrições variadas: seções, FAQ, sinais de autoridade e <h1> presentes ou não."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        name, maker = rng.choice(NAMES), rng.choice(MAKERS)
+        parts = [section.format(name=name, maker=maker) for section in SECTIONS if rng.random() > 0.1]
+        if rng.random() < 0.05:
+            parts.insert(0, f"<h1>{name}</h1>")
+        if rng.random() > 0.2:
+            parts.append(FAQ.format(items="".join(FAQ_ITEM.format(name=name) for _ in range(rng.randint(1, 5)))))
+        if rng.random() > 0.3:
+            parts.append(AUTHORITY.format(maker=maker))
+        if rng.random() > 0.5:
+            parts.append(GOV_LINK)
+        # Parágrafos extras deixam o tamanho próximo ao das descrições reais (alguns KB).
+        parts.extend("<p>Texto complementar sobre o uso do medicamento.</p>" for _ in range(rng.randint(5, 40)))
+        corpus.append("\n".join(parts))
+    return corpus
+
+
+def timed(label: str, func, corpus: list) -> list:
+    started_at = time.perf_counter()
+    results = func(corpus)
+    elapsed = time.perf_counter() - started_at
+    print(f"{label:<40} {elapsed:8.2f}s  {len(corpus) / elapsed:10.0f} descrições/s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=50_000, help="Quantidade de descrições no corpus sintético.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processos usados pelo analyze_many.")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.size)
+    average_kb = sum(len(html) for html in corpus) / len(corpus) / 1024
+    print(f"Corpus: {len(corpus)} descrições, {average_kb:.1f} KB em média.\n")
+
+    baseline = timed("Original (BeautifulSoup, várias passadas)", lambda c: [analyze_seo_performance_with_soup(h) for h in c], corpus)
+    single_pass = timed("Passada única (lxml)", lambda c: [analyze_seo_performance_from_html(h) for h in c], corpus)
+    pooled = timed(f"analyze_many ({args.workers} processos)", lambda c: list(analyze_many(c, max_workers=args.workers)), corpus)
+
+    mismatches = sum(1 for expected, *others in zip(baseline, single_pass, pooled) if any(other != expected for other in others))
+    print(f"\nResultados divergentes da implementação original: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
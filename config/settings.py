@@ -1,4 +1,5 @@
 # config/settings.py
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -13,6 +14,120 @@ API_KEY = os.getenv("GEMINI_API_KEY")
 DEFAULT_MODEL = "gemini-2.5-flash"
 REQUEST_TIMEOUT = 120
 
+# Perfis de modelo por agente (chave: nome do prompt): modelo, limite de tokens de saída,
+# orçamento de raciocínio (thinking_budget; 0 desativa), temperatura e timeout em segundos.
+# Agentes sem perfil usam DEFAULT_MODEL e REQUEST_TIMEOUT. AGENT_PROFILES_JSON sobrescreve
+# campos, ex: '{"auditor_seo_tecnico": {"model": "gemini-2.5-flash", "thinking_budget": 1024}}'.
+GEMINI_LIGHT_MODEL = os.getenv("GEMINI_LIGHT_MODEL", "gemini-2.5-flash-lite")
+AGENT_PROFILES = {
+    "auditor_seo_tecnico": {"model": GEMINI_LIGHT_MODEL, "max_output_tokens": 4096, "thinking_budget": 0, "temperature": 0.0, "timeout_seconds": 60},
+    "auditor_seo_subjetivo": {"model": GEMINI_LIGHT_MODEL, "max_output_tokens": 1024, "thinking_budget": 0, "temperature": 0.0, "timeout_seconds": 30},
+    "essentials_generator": {"model": GEMINI_LIGHT_MODEL, "max_output_tokens": 8192, "thinking_budget": 0, "temperature": 0.4, "timeout_seconds": 60},
+}
+for _prompt_name, _overrides in json.loads(os.getenv("AGENT_PROFILES_JSON", "{}")).items():
+    AGENT_PROFILES.setdefault(_prompt_name, {}).update(_overrides)
+
+# Pool de chaves do Gemini, separadas por vírgula (de preferência de projetos diferentes,
+# cada um com a sua cota). Sem a lista, é usada apenas a GEMINI_API_KEY.
+API_KEYS = [key.strip() for key in os.getenv("GEMINI_API_KEYS", "").split(",") if key.strip()] or ([API_KEY] if API_KEY else [])
+# Tempo mínimo fora do rodízio para uma chave que respondeu 429 (ResourceExhausted).
+GEMINI_KEY_QUARANTINE_SECONDS = float(os.getenv("GEMINI_KEY_QUARANTINE_SECONDS", "60"))
+
+# Orçamento de cota de cada chave do Gemini (um limitador adaptativo por chave)
+GEMINI_RPM_LIMIT = int(os.getenv("GEMINI_RPM_LIMIT", "1000"))
+GEMINI_TPM_LIMIT = int(os.getenv("GEMINI_TPM_LIMIT", "1000000"))
+GEMINI_INITIAL_CONCURRENCY = int(os.getenv("GEMINI_INITIAL_CONCURRENCY", "4"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "32"))
+
+# Saída estruturada (JSON com response_schema) para os agentes que respondem em JSON
+GEMINI_STRUCTURED_OUTPUT = os.getenv("GEMINI_STRUCTURED_OUTPUT", "true").lower() == "true"
+
+# Cache de contexto do Gemini para a parte fixa dos prompts (chave static_prefix dos YAML)
+CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE_ENABLED", "true").lower() == "true"
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+CONTEXT_CACHE_REFRESH_MARGIN_SECONDS = int(os.getenv("CONTEXT_CACHE_REFRESH_MARGIN_SECONDS", "300"))
+# Tamanho mínimo (tokens estimados) aceito pela API para um conteúdo em cache.
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "1024"))
+
 # Caminhos de diretório
 PROMPTS_DIR = BASE_DIR / "prompts"
-LOGS_DIR = BASE_DIR / "logs"
\ No newline at end of file
+# Intervalo mínimo entre verificações de alterações nos arquivos de prompt (negativo desativa).
+PROMPT_RELOAD_INTERVAL_SECONDS = float(os.getenv("PROMPT_RELOAD_INTERVAL_SECONDS", "2"))
+LOGS_DIR = BASE_DIR / "logs"
+
+# Processamento concorrente de SKUs
+# Quantidade máxima de SKUs processados simultaneamente em um mesmo upload.
+MAX_CONCURRENT_SKUS = int(os.getenv("MAX_CONCURRENT_SKUS", "4"))
+
+# Geração especulativa no fluxo interativo de revisão: número de candidatos gerados e
+# auditados em paralelo no primeiro ciclo (1 desativa) e as temperaturas dos candidatos
+# extras (o primeiro usa o perfil padrão do gerador).
+SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", "1"))
+SPECULATIVE_TEMPERATURES = [float(value) for value in os.getenv("SPECULATIVE_TEMPERATURES", "0.7,1.0,0.4").split(",") if value.strip()]
+
+# Auditoria de SEO: 'hybrid' pontua o checklist localmente e só chama a IA para itens
+# subjetivos não conclusivos; 'llm' usa o auditor de IA completo (comportamento anterior).
+SEO_AUDITOR_MODE = os.getenv("SEO_AUDITOR_MODE", "hybrid").lower()
+
+# Cache persistente de respostas do LLM
+CACHE_DIR = BASE_DIR / "cache"
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_PATH = CACHE_DIR / "llm_responses.sqlite3"
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# Cache do texto extraído das bulas (chave: SHA-256 do PDF)
+BULA_TEXT_CACHE_PATH = CACHE_DIR / "bula_texts.sqlite3"
+BULA_TEXT_CACHE_MAX_BYTES = int(os.getenv("BULA_TEXT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+BULA_TEXT_CACHE_TTL_SECONDS = int(os.getenv("BULA_TEXT_CACHE_TTL_SECONDS", str(90 * 24 * 3600)))
+# Validade do apelido link -> PDF: depois dela o link é baixado de novo (bula atualizada no mesmo endereço).
+BULA_LINK_ALIAS_TTL_SECONDS = int(os.getenv("BULA_LINK_ALIAS_TTL_SECONDS", str(24 * 3600)))
+
+# Pré-processamento das bulas antes da renderização dos prompts (normalização,
+# segmentação nas seções da ANVISA e corte em um orçamento de tokens por agente)
+BULA_PREPROCESSING_ENABLED = os.getenv("BULA_PREPROCESSING_ENABLED", "true").lower() == "true"
+BULA_TOKEN_BUDGETS = {
+    "medicamento_generator": int(os.getenv("BULA_TOKEN_BUDGET_GENERATOR", "12000")),
+    "refinador_qualidade": int(os.getenv("BULA_TOKEN_BUDGET_REFINER", "8000")),
+    "essentials_generator": int(os.getenv("BULA_TOKEN_BUDGET_ESSENTIALS", "4000")),
+}
+
+# Extração de PDFs em processos dedicados (um documento por processo, até PDF_EXTRACTION_WORKERS ao mesmo tempo)
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", str(os.cpu_count() or 2)))
+PDF_EXTRACTION_TIMEOUT_SECONDS = float(os.getenv("PDF_EXTRACTION_TIMEOUT_SECONDS", "60"))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "120"))
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", str(50 * 1024 * 1024)))
+PDF_WORKER_MEMORY_LIMIT_MB = int(os.getenv("PDF_WORKER_MEMORY_LIMIT_MB", "1024"))
+
+# Pipeline em estágios do processamento em lote (download -> extração -> geração)
+BATCH_FETCH_CONCURRENCY = int(os.getenv("BATCH_FETCH_CONCURRENCY", "4"))
+BATCH_GENERATE_CONCURRENCY = int(os.getenv("BATCH_GENERATE_CONCURRENCY", "4"))
+BATCH_PREFETCH_DEPTH = int(os.getenv("BATCH_PREFETCH_DEPTH", "8"))
+
+# Leitura de planilhas em streaming: 'auto' (calamine se instalado), 'openpyxl' ou 'calamine'
+SPREADSHEET_ENGINE = os.getenv("SPREADSHEET_ENGINE", "auto")
+
+# Jobs em segundo plano (estado e log de eventos persistidos em SQLite)
+JOBS_DB_PATH = CACHE_DIR / "jobs.sqlite3"
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "2"))
+# Jobs terminados (e os seus eventos, que podem conter planilhas em base64) são apagados após este prazo.
+JOBS_RETENTION_SECONDS = float(os.getenv("JOBS_RETENTION_SECONDS", str(7 * 24 * 3600)))
+JOBS_CLEANUP_INTERVAL_SECONDS = float(os.getenv("JOBS_CLEANUP_INTERVAL_SECONDS", "3600"))
+
+# Checkpoints das execuções em lote (log append-only de resultados por execução)
+BATCH_RUNS_DIR = CACHE_DIR / "batch_runs"
+
+# Modo offline do processamento em lote (cada etapa da pipeline vira um job da Batch API).
+# 'gemini' usa a Batch API; 'local' responde os lotes com chamadas online (sem desconto).
+OFFLINE_BATCH_SERVICE = os.getenv("OFFLINE_BATCH_SERVICE", "gemini").lower()
+OFFLINE_BATCH_POLL_SECONDS = float(os.getenv("OFFLINE_BATCH_POLL_SECONDS", "60"))
+# A Batch API conclui ou expira os jobs em até 24h; o limite inclui uma margem.
+OFFLINE_BATCH_TIMEOUT_SECONDS = float(os.getenv("OFFLINE_BATCH_TIMEOUT_SECONDS", str(26 * 3600)))
+
+# Ledger de estratégias de SEO: 'sqlite' (WAL, indexado), 'jsonl' (append) ou 'json' (arquivo original)
+STRATEGY_LEDGER_BACKEND = os.getenv("STRATEGY_LEDGER_BACKEND", "sqlite").lower()
+STRATEGY_LEDGER_PATH = Path(os.getenv("STRATEGY_LEDGER_PATH", str(BASE_DIR / ("estrategias_pharma_seo." + ("sqlite3" if STRATEGY_LEDGER_BACKEND == "sqlite" else "jsonl")))))
+
+# Ranking de estratégias: meia-vida do peso de cada registro e mínimo de registros para entrar no ranking
+STRATEGY_DECAY_HALF_LIFE_DAYS = float(os.getenv("STRATEGY_DECAY_HALF_LIFE_DAYS", "30"))
+STRATEGY_MIN_SAMPLES = int(os.getenv("STRATEGY_MIN_SAMPLES", "1"))
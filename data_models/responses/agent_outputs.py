@@ -0,0 +1,50 @@
+# data_models/responses/agent_outputs.py
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+# Formatos de saída dos agentes de IA. São enviados ao Gemini como response_schema
+# (saída estruturada) e usados pelos parsers de app/use_cases.py para validar as
+# respostas recebidas (respostas fora do formato contam como falha de interpretação).
+
+class ProductPageContent(BaseModel):
+    """Página de produto gerada pelo Master Generator ou pelo Refiner Agent."""
+    seo_title: str
+    meta_description: str
+    html_content: str
+
+
+class AuditCheckResult(BaseModel):
+    score: float
+    max_score: float
+    feedback: str
+
+
+class SeoAuditBreakdown(BaseModel):
+    """Itens do checklist do auditor técnico (prompts/auditor_seo_tecnico.yaml)."""
+    json_structure: AuditCheckResult
+    no_h1_tag: AuditCheckResult
+    section_order: AuditCheckResult
+    specifications_table: AuditCheckResult
+    faq_structure: AuditCheckResult
+    legal_notice: AuditCheckResult
+    transparency_note: AuditCheckResult
+    seo_title_format: AuditCheckResult
+    meta_description_format: AuditCheckResult
+
+
+class SeoAuditReport(BaseModel):
+    seo_score: float
+    score_breakdown: SeoAuditBreakdown
+
+
+class SubjectiveVerdict(BaseModel):
+    passed: bool
+    feedback: str
+
+
+class SubjectiveAuditVerdicts(BaseModel):
+    """Veredictos do auditor subjetivo; só vêm preenchidos os itens solicitados no prompt."""
+    seo_title_pattern: Optional[SubjectiveVerdict] = None
+    meta_description_cta: Optional[SubjectiveVerdict] = None